@@ -42,6 +42,28 @@ const DriverManagement = () => {
     }
   };
 
+  // The list leaves the photos out, load them with the driver detail
+  const openDriverDetail = async (driver) => {
+    setSelectedDriver(driver);
+    setDetailVisible(true);
+    try {
+      const response = await driverAPI.getById(driver.id_driver);
+      setSelectedDriver((current) =>
+        current && current.id_driver === driver.id_driver ? response.data : current
+      );
+    } catch (error) {
+      message.error('Gagal memuat foto driver');
+    }
+  };
+
+  const photoSrc = (driver, field) => {
+    const value = driver[field];
+    if (!value) return '';
+    if (value.startsWith('data:')) return value;
+    const contentType = (driver.photo_types && driver.photo_types[field]) || 'image/jpeg';
+    return `data:${contentType};base64,${value}`;
+  };
+
   const fetchOnlineDrivers = async () => {
     try {
       const response = await fetch('http://localhost:8080/drivers/online');
@@ -181,7 +203,7 @@ const DriverManagement = () => {
       case 'ktp':
         return {
           title: 'Data KTP',
-          image: driver.foto_ktp,
+          image: photoSrc(driver, 'foto_ktp'),
           data: [
             { label: 'NIK', value: driver.nik },
             { label: 'Nama Lengkap', value: driver.nama },
@@ -192,7 +214,7 @@ const DriverManagement = () => {
       case 'sim':
         return {
           title: 'Data SIM',
-          image: driver.foto_sim,
+          image: photoSrc(driver, 'foto_sim'),
           data: [
             { label: 'No SIM', value: driver.no_sim },
             { label: 'Jenis SIM', value: driver.jenis_sim },
@@ -203,7 +225,7 @@ const DriverManagement = () => {
       case 'bpjs':
         return {
           title: 'Data BPJS',
-          image: driver.foto_bpjs,
+          image: photoSrc(driver, 'foto_bpjs'),
           data: [
             { label: 'No BPJS', value: driver.no_bpjs },
             { label: 'Tanggal Kedaluarsa', value: driver.tanggal_kedaluarsa_bpjs },
@@ -213,7 +235,7 @@ const DriverManagement = () => {
       case 'sertifikat':
         return {
           title: 'Data Sertifikat',
-          image: driver.foto_sertifikat,
+          image: photoSrc(driver, 'foto_sertifikat'),
           data: [
             { label: 'No Sertifikat', value: driver.no_sertifikat },
             { label: 'Tanggal Kedaluarsa', value: driver.tanggal_kedaluarsa_sertifikat },
@@ -223,7 +245,7 @@ const DriverManagement = () => {
       case 'profil':
         return {
           title: 'Foto Profil',
-          image: driver.foto_profil,
+          image: photoSrc(driver, 'foto_profil'),
           data: [
             { label: 'Nama', value: driver.nama },
             { label: 'Email', value: driver.email },
@@ -277,10 +299,7 @@ const DriverManagement = () => {
         <Space>
           <Button 
             icon={<EyeOutlined />} 
-            onClick={() => {
-              setSelectedDriver(record);
-              setDetailVisible(true);
-            }}
+            onClick={() => openDriverDetail(record)}
           />
           {record.status === 'pending' ? (
             <>
@@ -436,7 +455,7 @@ const DriverManagement = () => {
                       width={150} 
                       height={100}
                       style={{ objectFit: 'cover', cursor: 'pointer' }}
-                      src={`data:image/jpeg;base64,${selectedDriver.foto_ktp}`}
+                      src={photoSrc(selectedDriver, 'foto_ktp')}
                       onClick={() => showPhotoDetail('ktp', selectedDriver)}
                     />
                   </div>
@@ -448,7 +467,7 @@ const DriverManagement = () => {
                       width={150} 
                       height={100}
                       style={{ objectFit: 'cover', cursor: 'pointer' }}
-                      src={`data:image/jpeg;base64,${selectedDriver.foto_sim}`}
+                      src={photoSrc(selectedDriver, 'foto_sim')}
                       onClick={() => showPhotoDetail('sim', selectedDriver)}
                     />
                   </div>
@@ -460,7 +479,7 @@ const DriverManagement = () => {
                       width={150} 
                       height={100}
                       style={{ objectFit: 'cover', cursor: 'pointer' }}
-                      src={`data:image/jpeg;base64,${selectedDriver.foto_profil}`}
+                      src={photoSrc(selectedDriver, 'foto_profil')}
                       onClick={() => showPhotoDetail('profil', selectedDriver)}
                     />
                   </div>
@@ -475,7 +494,7 @@ const DriverManagement = () => {
                       width={150} 
                       height={100}
                       style={{ objectFit: 'cover', cursor: 'pointer' }}
-                      src={`data:image/jpeg;base64,${selectedDriver.foto_sertifikat}`}
+                      src={photoSrc(selectedDriver, 'foto_sertifikat')}
                       onClick={() => showPhotoDetail('sertifikat', selectedDriver)}
                     />
                   </div>
@@ -487,7 +506,7 @@ const DriverManagement = () => {
                       width={150} 
                       height={100}
                       style={{ objectFit: 'cover', cursor: 'pointer' }}
-                      src={`data:image/jpeg;base64,${selectedDriver.foto_bpjs}`}
+                      src={photoSrc(selectedDriver, 'foto_bpjs')}
                       onClick={() => showPhotoDetail('bpjs', selectedDriver)}
                     />
                   </div>
@@ -610,7 +629,7 @@ const DriverManagement = () => {
             <div style={{ textAlign: 'center', marginBottom: 24 }}>
               <Image 
                 width={300}
-                src={`data:image/jpeg;base64,${getPhotoData(selectedPhoto.type, selectedPhoto.driver).image}`}
+                src={getPhotoData(selectedPhoto.type, selectedPhoto.driver).image}
               />
             </div>
             <div>
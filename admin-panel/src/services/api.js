@@ -27,6 +27,8 @@ export const authAPI = {
 // Driver API
 export const driverAPI = {
   getAll: () => api.get('/drivers/'),
+  // Cursor pagination: pass { page_size, cursor, fields } and follow `next`
+  getPage: (params = {}) => api.get('/drivers/', { params: { page_size: 50, ...params } }),
   getById: (id) => api.get(`/drivers/${id}/`),
   updateStatus: (id, status, reason = null) => api.patch(`/drivers/${id}/`, { 
     status, 
@@ -0,0 +1,242 @@
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+
+class DispatchError(Exception):
+    """driver-service could not be reached, the message may be sent again later"""
+
+
+class CircuitOpenError(DispatchError):
+    pass
+
+
+class CircuitBreaker:
+    """Stop calling driver-service for a while after repeated failures.
+
+    After ``failure_threshold`` failures in a row the circuit opens and calls
+    fail fast. Once ``reset_timeout`` seconds have passed one trial call is let
+    through (half open), its result closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def end_trial(self):
+        """Let the next call try again, for calls that ended without a result"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+
+class QueuedMessage:
+    __slots__ = ('path', 'payload', 'attempts')
+
+    def __init__(self, path, payload):
+        self.path = path
+        self.payload = payload
+        self.attempts = 0
+
+
+class DispatchClient:
+    """HTTP client for driver-service with a keep-alive connection pool.
+
+    ``post()`` sends synchronously with bounded retries and jittered
+    exponential backoff. ``send_async()`` puts the message in a local outbox
+    and returns at once, a background thread delivers it, so a slow
+    driver-service does not hold up the request worker.
+
+    The outbox only lives in this process's memory: queued messages are lost
+    when the process restarts, and a message that keeps failing is dropped
+    after ``outbox_max_attempts`` deliveries. Events that must not get lost
+    go through the database outbox (drivers/outbox.py) instead.
+    """
+
+    def __init__(self, base_url, connect_timeout=1, read_timeout=3, max_retries=2,
+                 backoff_base=0.2, backoff_max=2.0, pool_size=10, outbox_size=1000,
+                 outbox_max_attempts=5, breaker=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        # Retries are done here so they also go through the circuit breaker
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.outbox = deque(maxlen=outbox_size)
+        self.outbox_max_attempts = outbox_max_attempts
+        self._outbox_ready = threading.Condition()
+        self._worker = None
+
+    def backoff(self, attempt):
+        """Full jitter: random delay up to the exponential cap"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def post(self, path, payload):
+        """POST JSON to driver-service.
+
+        Returns True on a 2xx and False on any other non 5xx response. Raises
+        DispatchError when the service stays unreachable or keeps answering
+        with 5xx after all retries.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f'driver-service circuit open, skipping {path}')
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = self.session.post(f'{self.base_url}{path}', json=payload, timeout=self.timeout)
+                    if response.status_code < 500:
+                        # Driver-service is up, a 4xx will not get better with a retry
+                        self.breaker.record_success()
+                        return 200 <= response.status_code < 300
+                    print(f"driver-service {path} returned {response.status_code}")
+                except requests.RequestException as e:
+                    print(f"driver-service {path} failed: {e}")
+
+                if attempt < self.max_retries:
+                    time.sleep(self.backoff(attempt))
+
+            self.breaker.record_failure()
+            raise DispatchError(f'driver-service {path} failed after {self.max_retries + 1} attempts')
+        finally:
+            # Any other exception (e.g. a payload that is not JSON) must not
+            # leave a half-open trial running forever
+            self.breaker.end_trial()
+
+    def try_post(self, path, payload):
+        """Same as post() but returns False instead of raising"""
+        try:
+            return self.post(path, payload)
+        except DispatchError as e:
+            print(e)
+            return False
+
+    def send_async(self, path, payload):
+        """Queue a message for delivery in the background (fire and forget)"""
+        self._ensure_worker()
+        with self._outbox_ready:
+            if len(self.outbox) == self.outbox.maxlen:
+                dropped = self.outbox[0]
+                print(f"Dispatch outbox full, dropping oldest message for {dropped.path}: {dropped.payload}")
+            self.outbox.append(QueuedMessage(path, payload))
+            self._outbox_ready.notify()
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._drain_outbox, name='dispatch-outbox', daemon=True)
+            self._worker.start()
+
+    def _drain_outbox(self):
+        while True:
+            with self._outbox_ready:
+                while not self.outbox:
+                    self._outbox_ready.wait()
+            if not self._deliver_next():
+                # The circuit breaker spaces out the next tries as well
+                time.sleep(min(self.breaker.reset_timeout, 5))
+
+    def _deliver_next(self):
+        """Send the oldest outbox message once, False when it has to be tried again.
+
+        A message that fails goes to the back of the outbox, so it does not
+        hold up the others, until it has failed outbox_max_attempts times.
+        """
+        with self._outbox_ready:
+            if not self.outbox:
+                return True
+            message = self.outbox[0]
+
+        retry = False
+        try:
+            if not self.post(message.path, message.payload):
+                print(f"Dropping undeliverable message for {message.path}: {message.payload}")
+        except DispatchError as e:
+            message.attempts += 1
+            retry = message.attempts < self.outbox_max_attempts
+            if retry:
+                print(f"{e}, keeping message in outbox (attempt {message.attempts}/{self.outbox_max_attempts})")
+            else:
+                print(f"{e}, dropping message for {message.path} after {message.attempts} attempts: {message.payload}")
+        except Exception as e:
+            print(f"Dispatch outbox error for {message.path}, dropping message: {e}")
+
+        with self._outbox_ready:
+            # A full outbox may already have pushed this message out
+            if self.outbox and self.outbox[0] is message:
+                self.outbox.popleft()
+                if retry:
+                    self.outbox.append(message)
+        return not retry
+
+    # driver-service endpoints
+
+    def publish_driver_status(self, driver_data):
+        """Publish driver status to driver service"""
+        return self.try_post('/driver/status', driver_data)
+
+    def publish_order_request(self, order_data):
+        """Publish order request to driver service in the background"""
+        self.send_async('/order/request', order_data)
+
+    def publish_order_response(self, response_data):
+        """Publish driver order response to driver service in the background"""
+        self.send_async('/order/response', response_data)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_dispatch_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = DispatchClient(
+                getattr(settings, 'DRIVER_SERVICE_URL', 'http://driver-service:8080'),
+                connect_timeout=getattr(settings, 'DRIVER_SERVICE_CONNECT_TIMEOUT', 1),
+                read_timeout=getattr(settings, 'DRIVER_SERVICE_READ_TIMEOUT', 3),
+                max_retries=getattr(settings, 'DRIVER_SERVICE_MAX_RETRIES', 2),
+                outbox_max_attempts=getattr(settings, 'DRIVER_SERVICE_OUTBOX_MAX_ATTEMPTS', 5),
+            )
+        return _client
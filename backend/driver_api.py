@@ -1,12 +1,25 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.http import condition, require_http_methods
+import hashlib
 import json
-from kafka_producer import KafkaProducer
-from drivers.models import Order, Driver
+from functools import wraps
+from datetime import timedelta, timezone as dt_timezone
+from dispatch_client import get_dispatch_client
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
 from django.utils import timezone
-
-kafka_producer = KafkaProducer()
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from drivers.models import Order, Driver
+from drivers.pagination import OrderKeysetPagination, OrderUpdatesPagination
+from drivers.outbox import send_order_event
+from drivers.dispatch import accept_order, advance_waves_if_due, offer_next_wave, record_response
+from drivers.presence import get_presence_registry
+from drivers.geo import get_geo_index, parse_coordinates
+from drivers.ids import new_order_id
+from drivers.order_stream import async_event_stream, event_stream
 
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -20,6 +33,9 @@ def driver_online(request):
         if not driver_id or not kota:
             return JsonResponse({'error': 'driver_id and kota required'}, status=400)
         
+        # Presence comes from the token-authenticated /api/drivers/heartbeat/,
+        # this endpoint takes driver_id from the body
+        
         # Publish to Kafka
         status_data = {
             'driver_id': driver_id,
@@ -27,7 +43,7 @@ def driver_online(request):
             'status': 'online'
         }
         
-        success = kafka_producer.publish_driver_status(status_data)
+        success = get_dispatch_client().publish_driver_status(status_data)
         
         if success:
             return JsonResponse({'message': 'Driver is now online'})
@@ -48,13 +64,16 @@ def driver_offline(request):
         if not driver_id:
             return JsonResponse({'error': 'driver_id required'}, status=400)
         
+        get_presence_registry().remove(int(driver_id))
+        get_geo_index().remove(int(driver_id))
+        
         # Publish to Kafka
         status_data = {
             'driver_id': driver_id,
             'status': 'offline'
         }
         
-        success = kafka_producer.publish_driver_status(status_data)
+        success = get_dispatch_client().publish_driver_status(status_data)
         
         if success:
             return JsonResponse({'message': 'Driver is now offline'})
@@ -76,18 +95,27 @@ def create_order(request):
         if not all([barang, kota]):
             return JsonResponse({'error': 'barang and kota required'}, status=400)
         
-        # Generate order ID
-        order_id = f"order_{int(timezone.now().timestamp())}"
-        
-        # Create order in database
-        order = Order.objects.create(
-            order_id=order_id,
-            barang=barang,
-            pickup='Alamat Pickup Dummy',
-            tujuan=f'{barang} ke {kota}',
-            kota=kota,
-            status='menunggu_konfirmasi'
-        )
+        # Create order in database, the event is committed together with it.
+        # IDs are time ordered and unique across workers (drivers/ids.py), a
+        # clash would need a misconfigured ORDER_ID_WORKER, retry once anyway.
+        for attempt in range(2):
+            order_id = new_order_id()
+            try:
+                with transaction.atomic():
+                    order = Order.objects.create(
+                        order_id=order_id,
+                        barang=barang,
+                        pickup='Alamat Pickup Dummy',
+                        tujuan=f'{barang} ke {kota}',
+                        kota=kota,
+                        status='menunggu_konfirmasi'
+                    )
+                    send_order_event('order_created', order)
+                break
+            except IntegrityError:
+                if attempt:
+                    raise
+                print("Order ID already taken, retrying with a new one")
         
         return JsonResponse({
             'order_id': order.order_id,
@@ -104,65 +132,48 @@ def order_confirmed(request):
     """API endpoint when seller confirms order"""
     try:
         data = json.loads(request.body)
-        order_id = data.get('order_id')
+        # Orders confirmed without going through create_order get a new ID
+        order_id = data.get('order_id') or new_order_id()
         pickup = data.get('pickup', 'Alamat Pickup')
         tujuan = data.get('tujuan')
         kota = data.get('kota')
         
-        if not all([order_id, tujuan, kota]):
-            return JsonResponse({'error': 'order_id, tujuan, and kota required'}, status=400)
-        
-        # Update or create order in database
-        order, created = Order.objects.get_or_create(
-            order_id=order_id,
-            defaults={
-                'barang': 'Barang',
-                'pickup': pickup,
-                'tujuan': tujuan,
-                'kota': kota,
-                'status': 'menunggu_driver'
-            }
-        )
-        
-        if not created:
-            order.status = 'menunggu_driver'
-            order.pickup = pickup
-            order.tujuan = tujuan
-            order.save()
-        
-        # Publish order request to Kafka
-        order_data = {
-            'order_id': order_id,
-            'pickup': pickup,
-            'tujuan': tujuan,
-            'ongkos': order.ongkos,
-            'kota': kota
-        }
+        if not all([tujuan, kota]):
+            return JsonResponse({'error': 'tujuan and kota required'}, status=400)
         
-        # Try Kafka first, then fallback to direct HTTP
-        success = kafka_producer.publish_order_request(order_data)
-        print(f"Kafka publish result: {success}")
+        # Optional, without them the order goes to the best drivers in the kota
+        pickup_lat, pickup_lng = parse_coordinates(data.get('pickup_lat'), data.get('pickup_lng')) or (None, None)
         
-        if not success:
-            # Fallback: send directly to driver-service
-            try:
-                import requests
-                print(f"Sending order to driver-service: {order_data}")
-                response = requests.post(
-                    'http://driver-service:8080/order/request',
-                    json=order_data,
-                    timeout=5
-                )
-                print(f"Driver-service response: {response.status_code}")
-                success = response.status_code == 200
-            except Exception as e:
-                print(f"Direct HTTP to driver-service failed: {e}")
-                success = False
+        # Update or create order in database
+        with transaction.atomic():
+            order, created = Order.objects.get_or_create(
+                order_id=order_id,
+                defaults={
+                    'barang': 'Barang',
+                    'pickup': pickup,
+                    'pickup_lat': pickup_lat,
+                    'pickup_lng': pickup_lng,
+                    'tujuan': tujuan,
+                    'kota': kota,
+                    'status': 'menunggu_driver'
+                }
+            )
+            
+            if not created:
+                order.status = 'menunggu_driver'
+                order.pickup = pickup
+                order.pickup_lat = pickup_lat
+                order.pickup_lng = pickup_lng
+                order.tujuan = tujuan
+                order.broadcast_at = None
+                order.save()
+            send_order_event('order_confirmed', order)
         
-        if success:
-            return JsonResponse({'message': 'Order sent to drivers'})
-        else:
-            return JsonResponse({'error': 'Failed to send order'}, status=500)
+        # Offer to the best ranked drivers first, run_dispatcher (or
+        # advance_waves_if_due on driver requests) sends the next waves.
+        # Delivery to driver-service happens in the background.
+        driver_ids = offer_next_wave(order)
+        return JsonResponse({'message': 'Order sent to drivers', 'offered_to': len(driver_ids)})
             
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -180,17 +191,19 @@ def order_response(request):
         if not all([driver_id, order_id, action]):
             return JsonResponse({'error': 'driver_id, order_id, and action required'}, status=400)
         
-        # Update order in database if accepted
+        # First driver to accept wins, the others get 409
         if action == 'terima':
-            try:
-                order = Order.objects.get(order_id=order_id)
-                driver = Driver.objects.get(id_driver=driver_id)
-                order.driver = driver
-                order.status = 'sedang_dikirim'
-                order.save()
-                print(f"Order {order_id} assigned to driver {driver.nama}")
-            except (Order.DoesNotExist, Driver.DoesNotExist) as e:
-                print(f"Error updating order: {e}")
+            if not Driver.objects.filter(id_driver=driver_id).exists():
+                return JsonResponse({'error': 'Driver not found'}, status=404)
+            accepted, winner_id = accept_order(order_id, int(driver_id))
+            if not accepted:
+                if winner_id is None:
+                    return JsonResponse({'error': 'Order tidak tersedia'}, status=404)
+                return JsonResponse({'error': 'Order sudah diambil driver lain', 'driver_id': winner_id}, status=409)
+            print(f"Order {order_id} assigned to driver {driver_id}")
+        else:
+            record_response(order_id, int(driver_id), action)
+            advance_waves_if_due()
         
         # Publish response to Kafka
         response_data = {
@@ -199,34 +212,89 @@ def order_response(request):
             'action': action
         }
         
-        # Send to Go service via HTTP (since it handles Kafka publishing)
-        import requests
-        try:
-            response = requests.post(
-                'http://driver-service:8080/order/response',
-                json=response_data,
-                timeout=5
-            )
-            if response.status_code == 200:
-                return JsonResponse({'message': f'Order {action} successfully'})
-            else:
-                return JsonResponse({'error': 'Failed to process response'}, status=500)
-        except Exception as e:
-            return JsonResponse({'error': f'Service unavailable: {str(e)}'}, status=503)
+        # Send to Go service (it handles Kafka publishing) in the background
+        get_dispatch_client().publish_order_response(response_data)
+        return JsonResponse({'message': f'Order {action} successfully'})
             
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def advancing_waves(view):
+    """Advance timed-out dispatch waves before the view, also on 304 answers"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        advance_waves_if_due(request.GET.get('kota'))
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def order_board_queryset(request):
+    """Orders for the board, raises ValueError on a bad updated_since.
+
+    Without updated_since the board lists one status, newest first. With it,
+    only orders changed after that time are listed, oldest change first and
+    in every status unless status is given, so the client also sees orders
+    that left its board. updated_at is set when a row is saved, not when it
+    commits, so a change can become visible after a poll that already moved
+    past it. The last ORDER_UPDATES_OVERLAP_SECONDS before updated_since are
+    listed again, clients replace orders they have by order_id.
+    """
+    orders = Order.objects.select_related('driver')
+    kota = request.GET.get('kota')
+    if kota:
+        orders = orders.filter(kota=kota)
+
+    updated_since = request.GET.get('updated_since')
+    if updated_since:
+        # An unencoded + in the offset arrives as a space
+        since = parse_datetime(updated_since.replace(' ', '+'))
+        if since is None:
+            raise ValueError('updated_since must be an ISO 8601 datetime')
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, dt_timezone.utc)
+        overlap = timedelta(seconds=getattr(settings, 'ORDER_UPDATES_OVERLAP_SECONDS', 10))
+        orders = orders.filter(updated_at__gt=since - overlap)
+        if 'status' in request.GET:
+            orders = orders.filter(status=request.GET['status'])
+    else:
+        orders = orders.filter(status=request.GET.get('status', 'menunggu_konfirmasi'))
+    return orders
+
+
+def order_board_etag(request):
+    """Changes whenever an order enters, leaves or changes on the requested page"""
+    try:
+        orders = order_board_queryset(request)
+    except ValueError:
+        return None
+    state = orders.aggregate(total=Count('pk'), latest=Max('updated_at'))
+    raw = f"{request.GET.urlencode()}|{state['total']}|{state['latest']}"
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
 @csrf_exempt
 @require_http_methods(["GET"])
+@advancing_waves
+@condition(etag_func=order_board_etag)
 def get_orders(request):
-    """API endpoint to get orders by status"""
+    """API endpoint to get orders by status, cursor paginated.
+
+    Query params: status, kota, updated_since, cursor, page_size. Sends an
+    ETag, an unchanged board answers If-None-Match with 304.
+    """
     try:
-        status_filter = request.GET.get('status', 'menunggu_konfirmasi')
-        orders = Order.objects.filter(status=status_filter).order_by('-created_at')
+        # Taken before the query, everything committed up to here is listed
+        polled_at = timezone.now()
+        try:
+            orders = order_board_queryset(request)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        paginator = OrderUpdatesPagination() if request.GET.get('updated_since') else OrderKeysetPagination()
+        page = paginator.paginate_queryset(orders, request)
         
         orders_data = []
-        for order in orders:
+        for order in page:
             orders_data.append({
                 'order_id': order.order_id,
                 'barang': order.barang,
@@ -240,7 +308,44 @@ def get_orders(request):
                 'updated_at': order.updated_at.isoformat()
             })
         
-        return JsonResponse({'orders': orders_data})
+        next_link = paginator.get_next_link()
+        updated_until = None
+        if request.GET.get('updated_since'):
+            # Pass as updated_since on the next poll, after the last page
+            updated_until = orders_data[-1]['updated_at'] if next_link else polled_at.isoformat()
+        return JsonResponse({
+            'orders': orders_data,
+            'next': next_link,
+            'updated_until': updated_until
+        })
         
+    except NotFound as e:
+        return JsonResponse({'error': str(e.detail)}, status=400)
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@require_http_methods(["GET"])
+def order_stream(request):
+    """Server-Sent Events stream of order status changes.
+
+    Query params: kota, order_id (repeatable). Browsers reconnect with
+    Last-Event-ID and get the events they missed. Under ASGI an open stream
+    costs no worker thread, under WSGI it holds one.
+    """
+    kota = request.GET.get('kota')
+    order_ids = set(request.GET.getlist('order_id')) or None
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid Last-Event-ID'}, status=400)
+    
+    stream = async_event_stream if hasattr(request, 'scope') else event_stream
+    response = StreamingHttpResponse(
+        stream(last_event_id, kota, order_ids),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
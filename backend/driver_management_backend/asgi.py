@@ -0,0 +1,14 @@
+import os
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'driver_management_backend.settings')
+
+# Serves the order streams (api/orders/stream/) without a thread per open
+# page, e.g. uvicorn driver_management_backend.asgi:application
+application = get_asgi_application()
+
+if settings.DEBUG:
+    # Static files (admin, dashboard) the way runserver serves them in development
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+    application = ASGIStaticFilesHandler(application)
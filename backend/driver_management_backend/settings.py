@@ -67,7 +67,7 @@ DATABASES = {
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'drivers.auth_backends.DriverTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -75,6 +75,15 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Token cache used by DriverTokenAuthentication. By default only the
+# per-process LRU is used. AUTH_TOKEN_SHARED_CACHE may name a cache alias that
+# all processes share (Redis, Memcached, database); a LocMemCache alias is
+# ignored because revoking a token there would not reach other processes.
+AUTH_TOKEN_CACHE_SIZE = config('AUTH_TOKEN_CACHE_SIZE', default=2048, cast=int)
+AUTH_TOKEN_LOCAL_TTL = config('AUTH_TOKEN_LOCAL_TTL', default=5, cast=int)
+AUTH_TOKEN_SHARED_CACHE = config('AUTH_TOKEN_SHARED_CACHE', default='')
+AUTH_TOKEN_SHARED_TTL = config('AUTH_TOKEN_SHARED_TTL', default=60, cast=int)
+
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 
@@ -92,7 +101,58 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Content-addressed storage for driver document photos
+BLOB_STORAGE_ROOT = config('BLOB_STORAGE_ROOT', default=os.path.join(MEDIA_ROOT, 'blobs'))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Kafka Configuration
-KAFKA_BOOTSTRAP_SERVERS = config('KAFKA_BOOTSTRAP_SERVERS', default='localhost:9092')
\ No newline at end of file
+KAFKA_BOOTSTRAP_SERVERS = config('KAFKA_BOOTSTRAP_SERVERS', default='localhost:9092')
+# Used by the relay_outbox command, see drivers/kafka_producer.py
+KAFKA_LINGER_MS = config('KAFKA_LINGER_MS', default=50, cast=int)
+KAFKA_BATCH_SIZE = config('KAFKA_BATCH_SIZE', default=65536, cast=int)
+KAFKA_COMPRESSION_TYPE = config('KAFKA_COMPRESSION_TYPE', default='gzip')
+# Outbox messages that failed this many publishes get failed_at and are skipped
+OUTBOX_MAX_ATTEMPTS = config('OUTBOX_MAX_ATTEMPTS', default=10, cast=int)
+
+# Driver-service (Go) used for realtime dispatch, see dispatch_client.py
+DRIVER_SERVICE_URL = config('DRIVER_SERVICE_URL', default='http://driver-service:8080')
+DRIVER_SERVICE_CONNECT_TIMEOUT = config('DRIVER_SERVICE_CONNECT_TIMEOUT', default=1, cast=float)
+DRIVER_SERVICE_READ_TIMEOUT = config('DRIVER_SERVICE_READ_TIMEOUT', default=3, cast=float)
+DRIVER_SERVICE_MAX_RETRIES = config('DRIVER_SERVICE_MAX_RETRIES', default=2, cast=int)
+# Background sends (order requests/responses) are kept in memory only, lost
+# on restart, and dropped after this many failed deliveries
+DRIVER_SERVICE_OUTBOX_MAX_ATTEMPTS = config('DRIVER_SERVICE_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+
+# Online driver presence (drivers/presence.py). Without DRIVER_PRESENCE_CACHE
+# every worker process keeps its own registry, set it to a shared cache alias
+# when running more than one worker.
+DRIVER_PRESENCE_TTL = config('DRIVER_PRESENCE_TTL', default=20, cast=int)
+DRIVER_PRESENCE_CACHE = config('DRIVER_PRESENCE_CACHE', default='')
+
+# Order dispatch in waves (drivers/dispatch.py, manage.py run_dispatcher). The
+# dispatcher reads the presence registry from its own process, so it refuses
+# to start unless DRIVER_PRESENCE_CACHE names a cache shared with the web
+# workers (Redis, Memcached or the database cache, not LocMemCache). Without
+# it the web workers advance the waves themselves on order board polls and
+# driver responses, every DISPATCH_REQUEST_ADVANCE_INTERVAL seconds (0 = off).
+DISPATCH_WAVE_SIZE = config('DISPATCH_WAVE_SIZE', default=3, cast=int)
+DISPATCH_OFFER_TIMEOUT = config('DISPATCH_OFFER_TIMEOUT', default=15, cast=int)
+DISPATCH_REJECTION_WINDOW = config('DISPATCH_REJECTION_WINDOW', default=3600, cast=int)
+DISPATCH_REQUEST_ADVANCE_INTERVAL = config('DISPATCH_REQUEST_ADVANCE_INTERVAL', default=5, cast=int)
+# Orders without ranked candidates left go to the whole kota, repeated after
+# this many seconds until a driver accepts
+DISPATCH_BROADCAST_COOLDOWN = config('DISPATCH_BROADCAST_COOLDOWN', default=60, cast=int)
+# Orders with pickup coordinates are offered to the nearest drivers, positions
+# come from heartbeats and are forgotten after DRIVER_LOCATION_TTL seconds
+DISPATCH_NEAREST_CANDIDATES = config('DISPATCH_NEAREST_CANDIDATES', default=30, cast=int)
+DRIVER_LOCATION_TTL = config('DRIVER_LOCATION_TTL', default=60, cast=int)
+
+# Order board polls with updated_since list the changes of this many seconds
+# before it again, rows are stamped at save and may commit later (driver_api.py)
+ORDER_UPDATES_OVERLAP_SECONDS = config('ORDER_UPDATES_OVERLAP_SECONDS', default=10, cast=int)
+
+# Order IDs (drivers/ids.py). Every process leases its own worker number
+# from the database. ORDER_ID_WORKER (0-1023) pins it instead, only for
+# setups with a single process per value.
+ORDER_ID_WORKER = config('ORDER_ID_WORKER', default=None, cast=lambda value: None if value in (None, '') else int(value))
\ No newline at end of file
@@ -6,6 +6,7 @@ from django.http import JsonResponse
 urlpatterns = [
     path('', lambda request: JsonResponse({'message': 'Driver Management API', 'admin_panel': 'http://localhost:3001'})),
     path('api/', include('drivers.urls')),
+    path('', include('drivers.admin_urls')),
 ]
 
 # Serve media files during development
@@ -1,7 +1,29 @@
 from django.contrib import admin
 from django.contrib import messages
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
 from django.utils.html import format_html
 from .models import *
+from .auth_backends import revoke_user_tokens
+
+admin.site.unregister(User)
+
+@admin.register(User)
+class TokenRevokingUserAdmin(UserAdmin):
+    """Deleting or deactivating a user in the admin revokes the cached tokens"""
+    
+    def save_model(self, request, obj, form, change):
+        if change and not obj.is_active:
+            revoke_user_tokens([obj.pk])
+        super().save_model(request, obj, form, change)
+    
+    def delete_model(self, request, obj):
+        revoke_user_tokens([obj.pk])
+        super().delete_model(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        revoke_user_tokens(queryset.values_list('pk', flat=True))
+        super().delete_queryset(request, queryset)
 
 @admin.register(Driver)
 class DriverAdmin(admin.ModelAdmin):
@@ -18,42 +40,37 @@ class DriverAdmin(admin.ModelAdmin):
     has_photos.short_description = 'Photos'
     
     def foto_ktp_preview(self, obj):
-        if obj.foto_ktp and obj.foto_ktp.startswith('data:image'):
-            return format_html('<img src="{}" style="max-width: 200px; max-height: 200px;" />', obj.foto_ktp)
-        elif obj.foto_ktp:
-            return format_html('<img src="data:image/jpeg;base64,{}" style="max-width: 200px; max-height: 200px;" />', obj.foto_ktp)
+        photo = obj.get_photo_data_url('foto_ktp')
+        if photo:
+            return format_html('<img src="{}" style="max-width: 200px; max-height: 200px;" />', photo)
         return "No photo"
     foto_ktp_preview.short_description = 'KTP Preview'
     
     def foto_sim_preview(self, obj):
-        if obj.foto_sim and obj.foto_sim.startswith('data:image'):
-            return format_html('<img src="{}" style="max-width: 200px; max-height: 200px;" />', obj.foto_sim)
-        elif obj.foto_sim:
-            return format_html('<img src="data:image/jpeg;base64,{}" style="max-width: 200px; max-height: 200px;" />', obj.foto_sim)
+        photo = obj.get_photo_data_url('foto_sim')
+        if photo:
+            return format_html('<img src="{}" style="max-width: 200px; max-height: 200px;" />', photo)
         return "No photo"
     foto_sim_preview.short_description = 'SIM Preview'
     
     def foto_profil_preview(self, obj):
-        if obj.foto_profil and obj.foto_profil.startswith('data:image'):
-            return format_html('<img src="{}" style="max-width: 200px; max-height: 200px;" />', obj.foto_profil)
-        elif obj.foto_profil:
-            return format_html('<img src="data:image/jpeg;base64,{}" style="max-width: 200px; max-height: 200px;" />', obj.foto_profil)
+        photo = obj.get_photo_data_url('foto_profil')
+        if photo:
+            return format_html('<img src="{}" style="max-width: 200px; max-height: 200px;" />', photo)
         return "No photo"
     foto_profil_preview.short_description = 'Profile Photo Preview'
     
     def foto_sertifikat_preview(self, obj):
-        if obj.foto_sertifikat and obj.foto_sertifikat.startswith('data:image'):
-            return format_html('<img src="{}" style="max-width: 200px; max-height: 200px;" />', obj.foto_sertifikat)
-        elif obj.foto_sertifikat:
-            return format_html('<img src="data:image/jpeg;base64,{}" style="max-width: 200px; max-height: 200px;" />', obj.foto_sertifikat)
+        photo = obj.get_photo_data_url('foto_sertifikat')
+        if photo:
+            return format_html('<img src="{}" style="max-width: 200px; max-height: 200px;" />', photo)
         return "No photo"
     foto_sertifikat_preview.short_description = 'Certificate Preview'
     
     def foto_bpjs_preview(self, obj):
-        if obj.foto_bpjs and obj.foto_bpjs.startswith('data:image'):
-            return format_html('<img src="{}" style="max-width: 200px; max-height: 200px;" />', obj.foto_bpjs)
-        elif obj.foto_bpjs:
-            return format_html('<img src="data:image/jpeg;base64,{}" style="max-width: 200px; max-height: 200px;" />', obj.foto_bpjs)
+        photo = obj.get_photo_data_url('foto_bpjs')
+        if photo:
+            return format_html('<img src="{}" style="max-width: 200px; max-height: 200px;" />', photo)
         return "No photo"
     foto_bpjs_preview.short_description = 'BPJS Preview'
     
@@ -158,6 +175,11 @@ class RatingDriverAdmin(admin.ModelAdmin):
     list_display = ['id_driver', 'id_pelanggan', 'rating', 'timestamp']
     list_filter = ['rating', 'timestamp']
 
+@admin.register(DriverRatingSummary)
+class DriverRatingSummaryAdmin(admin.ModelAdmin):
+    list_display = ['driver', 'rating_count', 'rating_sum', 'last_rating_at']
+    readonly_fields = ['rating_count', 'rating_sum', 'count_1', 'count_2', 'count_3', 'count_4', 'count_5', 'last_rating_at']
+
 @admin.register(RiwayatPerjalanan)
 class RiwayatPerjalananAdmin(admin.ModelAdmin):
     list_display = ['id_delivery_order', 'tanggal', 'jarak_tempuh_km']
@@ -187,6 +209,10 @@ class TrainingModuleAdmin(admin.ModelAdmin):
     search_fields = ['title', 'instructor']
     inlines = [TrainingContentInline, TrainingQuizInline]
     list_editable = ['is_active']
+    
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        TrainingCatalogVersion.bump()
 
 @admin.register(TrainingContent)
 class TrainingContentAdmin(admin.ModelAdmin):
@@ -208,6 +234,13 @@ class TrainingContentAdmin(admin.ModelAdmin):
             'classes': ['collapse']
         })
     ]
+    
+    def delete_queryset(self, request, queryset):
+        # Bulk delete skips the model delete(), refresh the module totals here
+        module_ids = set(queryset.values_list('module_id', flat=True))
+        super().delete_queryset(request, queryset)
+        TrainingModuleSummary.refresh(module_ids)
+        TrainingCatalogVersion.bump()
 
 @admin.register(TrainingQuiz)
 class TrainingQuizAdmin(admin.ModelAdmin):
@@ -216,6 +249,13 @@ class TrainingQuizAdmin(admin.ModelAdmin):
     search_fields = ['question', 'module__title']
     list_editable = ['points']
     readonly_fields = ['created_at']
+    
+    def delete_queryset(self, request, queryset):
+        # Bulk delete skips the model delete(), refresh the module totals here
+        module_ids = set(queryset.values_list('module_id', flat=True))
+        super().delete_queryset(request, queryset)
+        TrainingModuleSummary.refresh(module_ids)
+        TrainingCatalogVersion.bump()
 
 @admin.register(DriverTrainingProgress)
 class DriverTrainingProgressAdmin(admin.ModelAdmin):
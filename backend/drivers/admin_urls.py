@@ -0,0 +1,24 @@
+from django.urls import path
+from . import admin_views
+
+urlpatterns = [
+    path('login/', admin_views.admin_login, name='admin_login'),
+    path('logout/', admin_views.admin_logout, name='admin_logout'),
+    path('dashboard/', admin_views.admin_dashboard, name='admin_dashboard'),
+    path('dashboard/drivers/<int:driver_id>/', admin_views.driver_detail, name='driver_detail'),
+    path('dashboard/drivers/<int:driver_id>/status/', admin_views.update_driver_status, name='update_driver_status'),
+    path('dashboard/drivers/<int:driver_id>/delete/', admin_views.delete_driver, name='delete_driver'),
+    path('dashboard/drivers/<int:driver_id>/photo/<str:field>/', admin_views.driver_document_photo, name='driver_document_photo'),
+    
+    # Training content management
+    path('training/', admin_views.training_management, name='training_management'),
+    path('training/create/', admin_views.create_training_module, name='create_training_module'),
+    path('training/<int:module_id>/', admin_views.training_module_detail, name='training_module_detail'),
+    path('training/<int:module_id>/delete/', admin_views.delete_training_module, name='delete_training_module'),
+    path('training/<int:module_id>/contents/add/', admin_views.add_training_content, name='add_training_content'),
+    path('training/<int:module_id>/quizzes/add/', admin_views.add_training_quiz, name='add_training_quiz'),
+    path('training/contents/<int:content_id>/edit/', admin_views.edit_training_content, name='edit_training_content'),
+    path('training/contents/<int:content_id>/delete/', admin_views.delete_training_content, name='delete_training_content'),
+    path('training/quizzes/<int:quiz_id>/edit/', admin_views.edit_training_quiz, name='edit_training_quiz'),
+    path('training/quizzes/<int:quiz_id>/delete/', admin_views.delete_training_quiz, name='delete_training_quiz'),
+]
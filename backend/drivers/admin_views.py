@@ -2,9 +2,14 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, Http404, HttpResponseNotModified
 from django.urls import reverse
+from django.core.paginator import Paginator
 from .models import Driver, TrainingModule, TrainingContent, TrainingQuiz
+from .blobstore import get_blob_store, is_blob_ref, decode_base64, data_url_content_type, sniff_content_type
+from .auth_backends import revoke_user_tokens
+
+DASHBOARD_PAGE_SIZE = 25
 
 def is_admin(user):
     return user.is_staff and user.is_superuser
@@ -26,8 +31,66 @@ def admin_login(request):
 @login_required
 @user_passes_test(is_admin)
 def admin_dashboard(request):
-    drivers = Driver.objects.all().order_by('-wkt_daftar')
-    return render(request, 'admin/dashboard.html', {'drivers': drivers})
+    status_filter = request.GET.get('status', '')
+    kota_filter = request.GET.get('kota', '')
+    
+    # Photos are loaded on demand through driver_document_photo
+    drivers = Driver.objects.defer(*Driver.PHOTO_FIELDS).order_by('-wkt_daftar', '-id_driver')
+    if status_filter:
+        drivers = drivers.filter(status=status_filter)
+    if kota_filter:
+        drivers = drivers.filter(kota=kota_filter)
+    
+    paginator = Paginator(drivers, DASHBOARD_PAGE_SIZE)
+    page = paginator.get_page(request.GET.get('page'))
+    
+    kota_list = (Driver.objects.exclude(kota__isnull=True).exclude(kota='')
+                 .values_list('kota', flat=True).distinct().order_by('kota'))
+    
+    return render(request, 'admin/dashboard.html', {
+        'drivers': page,
+        'page': page,
+        'total_drivers': paginator.count,
+        'status_filter': status_filter,
+        'kota_filter': kota_filter,
+        'status_choices': Driver.STATUS_CHOICES,
+        'kota_list': kota_list,
+    })
+
+@login_required
+@user_passes_test(is_admin)
+def driver_document_photo(request, driver_id, field):
+    """Serve a single driver document photo so pages can load it lazily"""
+    if field not in Driver.PHOTO_FIELDS:
+        raise Http404('Unknown document')
+    
+    value = Driver.objects.filter(id_driver=driver_id).values_list(field, flat=True).first()
+    if not value:
+        raise Http404('Photo not found')
+    
+    if is_blob_ref(value):
+        # Blob references are content hashes, so they make a stable ETag
+        etag = f'"{value}"'
+        if request.headers.get('If-None-Match') == etag:
+            return HttpResponseNotModified()
+        store = get_blob_store()
+        data = store.get(value)
+        content_type = store.content_type(value, data)
+    else:
+        etag = None
+        try:
+            data = decode_base64(value)
+        except ValueError:
+            data = None
+        content_type = data_url_content_type(value) or sniff_content_type(data or b'')
+    if data is None:
+        raise Http404('Photo not found')
+    
+    response = HttpResponse(data, content_type=content_type)
+    response['Cache-Control'] = 'private, max-age=86400'
+    if etag:
+        response['ETag'] = etag
+    return response
 
 @login_required
 @user_passes_test(is_admin)
@@ -85,6 +148,7 @@ def delete_driver(request, driver_id):
             from django.contrib.auth.models import User
             try:
                 user = User.objects.get(email=driver.email)
+                revoke_user_tokens([user.id])
                 user.delete()
             except User.DoesNotExist:
                 pass
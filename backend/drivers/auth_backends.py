@@ -0,0 +1,86 @@
+from django.contrib.auth.models import User
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from .models import Driver
+from .cache import get_cached_token, set_cached_token, revoke_cached_tokens, get_cached_driver_id, set_cached_driver_id
+
+class DriverTokenAuthentication(TokenAuthentication):
+    """Token authentication with a two level cache of token key -> user ID.
+
+    Lookups go to a small in-process LRU first, then to the shared cache (if
+    AUTH_TOKEN_SHARED_CACHE names one), and only then to the token table. The
+    user is loaded by primary key on every request, so deleted or deactivated
+    users are rejected right away. Code that deletes tokens or users must go
+    through revoke_tokens() so the token stops working right away in this
+    process and within AUTH_TOKEN_LOCAL_TTL seconds in the others.
+    """
+    def authenticate_credentials(self, key):
+        user_id = get_cached_token(key)
+        if user_id is None:
+            try:
+                token = Token.objects.select_related('user').get(key=key)
+            except Token.DoesNotExist:
+                raise AuthenticationFailed('Invalid token.')
+            set_cached_token(token.key, token.user_id)
+            user = token.user
+        else:
+            try:
+                user = User.objects.get(pk=user_id)
+            except User.DoesNotExist:
+                revoke_cached_tokens([key])
+                raise AuthenticationFailed('User inactive or deleted.')
+            token = Token(key=key, user=user)
+        
+        if not user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        
+        return (user, token)
+
+def revoke_tokens(tokens):
+    """Delete a Token queryset and drop the tokens from the auth cache"""
+    revoke_cached_tokens(list(tokens.values_list('key', flat=True)))
+    return tokens.delete()
+
+def revoke_user_tokens(user_ids):
+    """Revoke all tokens of these users, call before deleting or deactivating them"""
+    return revoke_tokens(Token.objects.filter(user_id__in=list(user_ids)))
+
+def resolve_driver_id(user):
+    """ID of the driver linked to a user by email, None for admins and unknown users"""
+    if not user or not user.is_authenticated or not user.email:
+        return None
+    driver_id = get_cached_driver_id(user.email)
+    if driver_id is None:
+        driver_id = Driver.objects.filter(email=user.email).values_list('id_driver', flat=True).first()
+        if driver_id is None:
+            return None
+        set_cached_driver_id(user.email, driver_id)
+    return driver_id
+
+def get_request_driver_id(request):
+    """ID of the authenticated user's driver, without loading the driver row.
+
+    Raises Driver.DoesNotExist like Driver.objects.get(email=...) did.
+    """
+    driver_id = resolve_driver_id(request.user)
+    if driver_id is None:
+        raise Driver.DoesNotExist('Driver matching query does not exist.')
+    return driver_id
+
+def get_request_driver(request, for_update=False):
+    """Driver for the authenticated user, read from the database once per request.
+
+    Photos are deferred, views that change a driver pass for_update=True
+    inside a transaction to lock and re-read the row, and save with
+    update_fields. Raises Driver.DoesNotExist like Driver.objects.get(email=...) did.
+    """
+    driver = None if for_update else getattr(request, 'driver', None)
+    if driver is None:
+        drivers = Driver.objects.defer(*Driver.PHOTO_FIELDS)
+        if for_update:
+            drivers = drivers.select_for_update()
+        driver = drivers.get(pk=get_request_driver_id(request))
+        # Store on the Django request, DRF's Request proxies attribute access to it
+        getattr(request, '_request', request).driver = driver
+    return driver
@@ -0,0 +1,170 @@
+import base64
+import binascii
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+
+BLOB_REF_PREFIX = 'sha256:'
+DEFAULT_CONTENT_TYPE = 'image/jpeg'
+
+
+def is_blob_ref(value):
+    """Check if a stored value is a blob reference instead of inline base64"""
+    return bool(value) and value.startswith(BLOB_REF_PREFIX)
+
+
+def sniff_content_type(data):
+    """Guess the image type from the magic bytes, JPEG when unknown"""
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data.startswith(b'RIFF') and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return 'image/gif'
+    return DEFAULT_CONTENT_TYPE
+
+
+def data_url_content_type(value):
+    """Content type of a data URL (``data:image/png;base64,...``), None otherwise"""
+    if not value.startswith('data:') or ',' not in value:
+        return None
+    content_type = value[len('data:'):value.index(',')].split(';', 1)[0].strip()
+    return content_type or None
+
+
+def decode_base64(value):
+    """Decode base64 string from the mobile app, with or without data URL prefix"""
+    if value.startswith('data:') and ',' in value:
+        value = value.split(',', 1)[1]
+    value = ''.join(value.split())
+    # Some clients strip the padding
+    value += '=' * (-len(value) % 4)
+    return base64.b64decode(value, validate=True)
+
+
+class BlobStore:
+    """Content-addressed file storage for driver documents.
+
+    Blobs are stored under ``<root>/<aa>/<bb>/<sha256>`` so identical uploads
+    share one file and a reference is only ``sha256:<hex>`` in the database.
+    The content type is kept next to the blob in ``<sha256>.type``.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or getattr(settings, 'BLOB_STORAGE_ROOT', os.path.join(settings.MEDIA_ROOT, 'blobs'))
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, ref):
+        return is_blob_ref(ref) and os.path.exists(self.path(ref[len(BLOB_REF_PREFIX):]))
+
+    def _write(self, path, data):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temp file first so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put(self, data, content_type=None):
+        """Store raw bytes and return the blob reference"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            self._write(path, data)
+        type_path = path + '.type'
+        if not os.path.exists(type_path):
+            self._write(type_path, (content_type or sniff_content_type(data)).encode('ascii'))
+        return BLOB_REF_PREFIX + digest
+
+    def get(self, ref):
+        """Read raw bytes for a blob reference, None if it is missing"""
+        if not is_blob_ref(ref):
+            return None
+        try:
+            with open(self.path(ref[len(BLOB_REF_PREFIX):]), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def content_type(self, ref, data=None):
+        """Content type stored with a blob, sniffed for blobs written without one"""
+        if is_blob_ref(ref):
+            try:
+                with open(self.path(ref[len(BLOB_REF_PREFIX):]) + '.type') as f:
+                    return f.read().strip() or DEFAULT_CONTENT_TYPE
+            except FileNotFoundError:
+                pass
+            if data is None:
+                data = self.get(ref)
+        return sniff_content_type(data or b'')
+
+    def put_base64(self, value):
+        """Store a base64 photo and return its reference.
+
+        Values that are already references are returned unchanged, values
+        that are not valid base64 are kept inline so nothing gets lost.
+        """
+        if not value or is_blob_ref(value):
+            return value
+        try:
+            data = decode_base64(value)
+        except (binascii.Error, ValueError):
+            return value
+        return self.put(data, data_url_content_type(value))
+
+    def get_base64(self, value):
+        """Resolve a stored photo value back to a plain base64 string"""
+        if not is_blob_ref(value):
+            return value
+        data = self.get(value)
+        if data is None:
+            return None
+        return base64.b64encode(data).decode('ascii')
+
+    def get_data_url(self, value):
+        """Resolve a stored photo value to a data URL with its content type"""
+        if not value:
+            return None
+        if not is_blob_ref(value):
+            if value.startswith('data:'):
+                return value
+            return f'data:{self.get_content_type(value)};base64,{value}'
+        data = self.get(value)
+        if data is None:
+            return None
+        content_type = self.content_type(value, data)
+        return f'data:{content_type};base64,{base64.b64encode(data).decode("ascii")}'
+
+    def get_content_type(self, value):
+        """Content type of a stored photo value, reference or inline base64"""
+        if not value:
+            return None
+        if is_blob_ref(value):
+            return self.content_type(value)
+        content_type = data_url_content_type(value)
+        if content_type:
+            return content_type
+        try:
+            return sniff_content_type(decode_base64(value))
+        except (binascii.Error, ValueError):
+            return DEFAULT_CONTENT_TYPE
+
+
+_default_store = None
+
+
+def get_blob_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = BlobStore()
+    return _default_store
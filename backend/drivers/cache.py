@@ -0,0 +1,194 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+DRIVER_STATS_TIMEOUT = 300  # seconds
+
+
+def driver_stats_key(driver_id):
+    return f'driver_stats:{driver_id}'
+
+
+def get_driver_stats(driver_id):
+    return cache.get(driver_stats_key(driver_id))
+
+
+def set_driver_stats(driver_id, data):
+    cache.set(driver_stats_key(driver_id), data, DRIVER_STATS_TIMEOUT)
+
+
+def invalidate_driver_stats(driver_id):
+    """Drop cached statistics once the current transaction commits"""
+    transaction.on_commit(lambda: cache.delete(driver_stats_key(driver_id)))
+
+
+def invalidate_drivers_stats(driver_ids):
+    """Same as invalidate_driver_stats for bulk updates"""
+    keys = [driver_stats_key(driver_id) for driver_id in set(driver_ids)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+# Email -> driver ID for get_request_driver (see auth_backends.py)
+REQUEST_AUTH_TIMEOUT = 30  # seconds
+
+
+class LocalLRUCache:
+    """Small thread-safe in-process LRU with a TTL per entry"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def is_shared_cache(backend):
+    """False for cache backends that only live inside one process"""
+    return not isinstance(backend, (LocMemCache, DummyCache))
+
+
+# Tokens are checked on every API call, so token key -> user ID sits in a
+# process-local LRU in front of the shared cache. The user itself is loaded on
+# every request, so deleted and deactivated users are rejected right away. A
+# revoked token (logout) keeps working in other processes for at most
+# AUTH_TOKEN_LOCAL_TTL seconds.
+_local_tokens = LocalLRUCache(
+    max_size=getattr(settings, 'AUTH_TOKEN_CACHE_SIZE', 2048),
+    ttl=getattr(settings, 'AUTH_TOKEN_LOCAL_TTL', 5),
+)
+
+
+def get_token_shared_cache():
+    """Shared cache for tokens, None when AUTH_TOKEN_SHARED_CACHE is empty.
+
+    A process-local backend (LocMemCache) is ignored, revoking a token there
+    would not reach the other processes.
+    """
+    alias = getattr(settings, 'AUTH_TOKEN_SHARED_CACHE', '')
+    if not alias or not is_shared_cache(caches[alias]):
+        return None
+    return caches[alias]
+
+
+def auth_token_key(key):
+    return f'auth_token:{key}'
+
+
+def request_driver_key(email):
+    return f'request_driver:{email}'
+
+
+def get_cached_token(key):
+    """User ID of a token key, None when it is not cached"""
+    cache_key = auth_token_key(key)
+    user_id = _local_tokens.get(cache_key)
+    if user_id is None:
+        shared = get_token_shared_cache()
+        user_id = shared.get(cache_key) if shared else None
+        if user_id is not None:
+            _local_tokens.set(cache_key, user_id)
+    return user_id
+
+
+def set_cached_token(key, user_id):
+    cache_key = auth_token_key(key)
+    _local_tokens.set(cache_key, user_id)
+    shared = get_token_shared_cache()
+    if shared:
+        shared.set(cache_key, user_id, getattr(settings, 'AUTH_TOKEN_SHARED_TTL', 60))
+
+
+def revoke_cached_tokens(keys):
+    """Drop tokens from both cache layers now and again after commit.
+
+    The second pass catches a request that re-cached the token from the
+    database before the delete was committed.
+    """
+    cache_keys = [auth_token_key(key) for key in keys]
+    if not cache_keys:
+        return
+
+    def revoke():
+        _local_tokens.delete_many(cache_keys)
+        shared = get_token_shared_cache()
+        if shared:
+            shared.delete_many(cache_keys)
+
+    revoke()
+    transaction.on_commit(revoke)
+
+
+# Only email -> driver ID is cached. The driver row itself is always read
+# from the database, so status changes need no invalidation.
+def get_cached_driver_id(email):
+    return cache.get(request_driver_key(email))
+
+
+def set_cached_driver_id(email, driver_id):
+    cache.set(request_driver_key(email), driver_id, REQUEST_AUTH_TIMEOUT)
+
+
+def invalidate_cached_driver(email):
+    """Forget the driver ID of an email once the current transaction commits"""
+    transaction.on_commit(lambda: cache.delete(request_driver_key(email)))
+
+
+# Training catalog blobs (drivers/training_catalog.py), keyed by the version
+# in TrainingCatalogVersion. Old versions simply expire.
+TRAINING_CATALOG_TIMEOUT = 24 * 3600  # seconds
+
+
+def training_catalog_key(version):
+    return f'training_catalog:{version}'
+
+
+def get_cached_training_catalog(version):
+    return cache.get(training_catalog_key(version))
+
+
+def set_cached_training_catalog(version, catalog):
+    cache.set(training_catalog_key(version), catalog, TRAINING_CATALOG_TIMEOUT)
+
+
+# Follow-up dispatch waves started from requests (see dispatch.advance_waves_if_due)
+def claim_wave_advance(kota, interval):
+    """True for the first caller per kota and interval seconds"""
+    # Hashed, city names contain spaces that memcached keys may not
+    suffix = hashlib.md5(kota.encode('utf-8')).hexdigest() if kota else 'all'
+    return cache.add(f'dispatch_advance:{suffix}', 1, interval)
@@ -0,0 +1,283 @@
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from dispatch_client import get_dispatch_client
+from .cache import claim_wave_advance
+from .models import Driver, DriverArmada, Order, OrderOffer
+from .outbox import send_order_event
+from .geo import get_geo_index
+from .presence import get_presence_registry, PresenceRegistry
+
+# Ranking weights, the score of a driver is between
+# -(REJECTION_WEIGHT + DISTANCE_WEIGHT) and 1
+RATING_WEIGHT = 0.5
+IDLE_WEIGHT = 0.3
+REJECTION_WEIGHT = 0.2
+DISTANCE_WEIGHT = 0.4  # only for orders with pickup coordinates
+IDLE_CAP = 3600  # seconds, idle time above this counts the same
+REJECTION_CAP = 5
+DISTANCE_CAP_KM = 10
+UNRATED_DRIVER_RATING = 3.0  # new drivers are ranked as average, not as 0 stars
+
+PENALIZED_RESPONSES = ['abaikan', 'timeout']
+
+
+def dispatch_setting(name, default):
+    return getattr(settings, name, default)
+
+
+def kota_shard(kota, shard_count):
+    """Stable shard number for a kota, so one dispatcher owns each city"""
+    return zlib.crc32(kota.strip().lower().encode('utf-8')) % shard_count
+
+
+def nearest_online(order, online):
+    """{driver_id: distance_km} of the online drivers closest to the pickup point"""
+    index = get_geo_index()
+    registry = get_presence_registry()
+    if not isinstance(registry, PresenceRegistry):
+        # Heartbeats may have reached another worker, take their positions
+        # from the shared presence entries
+        for entry in online:
+            if 'lat' in entry:
+                index.update(entry['driver_id'], entry['lat'], entry['lng'], entry['last_seen'])
+    nearest = index.nearest(
+        order.pickup_lat, order.pickup_lng,
+        k=dispatch_setting('DISPATCH_NEAREST_CANDIDATES', 30),
+        allowed_ids={entry['driver_id'] for entry in online},
+    )
+    return {driver_id: distance for distance, driver_id in nearest}
+
+
+def find_candidates(order, exclude_ids=()):
+    """Active drivers online in the order's kota with a vehicle and no running order.
+
+    For orders with pickup coordinates only the nearest drivers are considered
+    and each candidate gets distance_km. Without them, or when no online
+    driver sent a position, the whole kota is considered.
+    """
+    exclude_ids = set(exclude_ids)
+    online = [
+        entry for entry in get_presence_registry().online(kota=order.kota, status='online')
+        if entry['driver_id'] not in exclude_ids
+    ]
+    distances = {}
+    if order.pickup_lat is not None and order.pickup_lng is not None:
+        distances = nearest_online(order, online)
+    driver_ids = set(distances) or {entry['driver_id'] for entry in online}
+    if not driver_ids:
+        return []
+
+    since = timezone.now() - timedelta(seconds=dispatch_setting('DISPATCH_REJECTION_WINDOW', 3600))
+    last_order_at = Order.objects.filter(driver=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+    recent_rejections = (
+        OrderOffer.objects.filter(driver=OuterRef('pk'), offered_at__gte=since, response__in=PENALIZED_RESPONSES)
+        .values('driver').annotate(total=Count('id')).values('total')
+    )
+    drivers = list(
+        Driver.objects.filter(id_driver__in=driver_ids, status='active')
+        .filter(Exists(DriverArmada.objects.filter(id_driver=OuterRef('pk'))))
+        .exclude(Exists(Order.objects.filter(driver=OuterRef('pk'), status='sedang_dikirim')))
+        .select_related('rating_summary')
+        .only('id_driver', 'wkt_daftar', 'rating_summary__rating_sum', 'rating_summary__rating_count')
+        .annotate(
+            last_order_at=Subquery(last_order_at),
+            recent_rejections=Coalesce(Subquery(recent_rejections, output_field=IntegerField()), Value(0)),
+        )
+    )
+    for driver in drivers:
+        driver.distance_km = distances.get(driver.id_driver)
+    return drivers
+
+
+def score_candidate(driver, now):
+    summary = getattr(driver, 'rating_summary', None)
+    rating = summary.get_average() if summary and summary.rating_count else UNRATED_DRIVER_RATING
+    idle_since = driver.last_order_at or driver.wkt_daftar
+    idle = max(0, (now - idle_since).total_seconds())
+    distance = getattr(driver, 'distance_km', None)
+    return (
+        RATING_WEIGHT * rating / 5
+        + IDLE_WEIGHT * min(idle, IDLE_CAP) / IDLE_CAP
+        - REJECTION_WEIGHT * min(driver.recent_rejections, REJECTION_CAP) / REJECTION_CAP
+        - (DISTANCE_WEIGHT * min(distance, DISTANCE_CAP_KM) / DISTANCE_CAP_KM if distance is not None else 0)
+    )
+
+
+def rank_candidates(drivers, now=None):
+    """Best drivers first: high rating, long idle, few recent rejections, close by"""
+    now = now or timezone.now()
+    return sorted(drivers, key=lambda driver: (-score_candidate(driver, now), driver.id_driver))
+
+
+def order_request_data(order, driver_ids=None, wave=None):
+    """Payload for driver-service, without driver_ids it broadcasts to the kota"""
+    data = {
+        'order_id': order.order_id,
+        'pickup': order.pickup,
+        'tujuan': order.tujuan,
+        'ongkos': order.ongkos,
+        'kota': order.kota,
+    }
+    if driver_ids:
+        data['driver_ids'] = [str(driver_id) for driver_id in driver_ids]
+    if wave:
+        data['wave'] = wave
+    return data
+
+
+def offer_next_wave(order):
+    """Offer an order waiting for a driver to the next top-K candidates.
+
+    Drivers that already got this order are skipped. When no candidate is
+    left (nobody online in the registry, or every online driver was already
+    offered the order) the order is broadcast to every online driver in its
+    kota instead, again every DISPATCH_BROADCAST_COOLDOWN seconds until
+    somebody accepts it. Returns the driver IDs of the new wave, empty when
+    the order is taken, broadcast or waiting for the cooldown. The order is
+    sent to driver-service after commit.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(pk=order.pk)
+        if order.status != 'menunggu_driver' or order.driver_id:
+            return []
+
+        offered = list(order.offers.values_list('driver_id', 'wave'))
+        candidates = rank_candidates(find_candidates(order, exclude_ids=[driver_id for driver_id, wave in offered]))
+        candidates = candidates[:dispatch_setting('DISPATCH_WAVE_SIZE', 3)]
+        if not candidates:
+            broadcast_order(order)
+            return []
+
+        wave = max((wave for driver_id, wave in offered), default=0) + 1
+        OrderOffer.objects.bulk_create([
+            OrderOffer(order=order, driver_id=driver.id_driver, wave=wave) for driver in candidates
+        ])
+        driver_ids = [driver.id_driver for driver in candidates]
+        order_data = order_request_data(order, driver_ids, wave)
+        transaction.on_commit(lambda: get_dispatch_client().publish_order_request(order_data))
+
+    print(f"Order {order.order_id} wave {wave} offered to drivers {driver_ids}")
+    return driver_ids
+
+
+def broadcast_order(order):
+    """Send a locked waiting order to the whole kota, at most once per cooldown"""
+    now = timezone.now()
+    cooldown = timedelta(seconds=dispatch_setting('DISPATCH_BROADCAST_COOLDOWN', 60))
+    if order.broadcast_at and order.broadcast_at > now - cooldown:
+        return False
+    # update() so the broadcast does not touch updated_at and the order board
+    Order.objects.filter(pk=order.pk).update(broadcast_at=now)
+    order_data = order_request_data(order)
+    transaction.on_commit(lambda: get_dispatch_client().publish_order_request(order_data))
+    print(f"Order {order.order_id} broadcast to kota {order.kota}, no ranked candidates left")
+    return True
+
+
+def accept_order(order_id, driver_id):
+    """Give the order to the first driver that accepts it, returns (accepted, winner_id).
+
+    One conditional UPDATE decides the winner: the order only changes while it
+    is still waiting without a driver, so of several parallel accepts exactly
+    one updates the row and the others see 0 rows. No lock is held outside
+    this short transaction, the caller talks to driver-service afterwards.
+    winner_id is None when the order does not exist or is not waiting.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        accepted = Order.objects.filter(
+            order_id=order_id, status='menunggu_driver', driver__isnull=True
+        ).update(driver_id=driver_id, status='sedang_dikirim', updated_at=now)
+        if accepted:
+            order = Order.objects.get(order_id=order_id)
+            send_order_event('order_accepted', order)
+            OrderOffer.objects.filter(order_id=order_id, driver_id=driver_id).update(response='terima', responded_at=now)
+            # Close the other open offers without counting them as rejections
+            OrderOffer.objects.filter(order_id=order_id, response__isnull=True).update(response='diambil', responded_at=now)
+            return True, driver_id
+
+    OrderOffer.objects.filter(order_id=order_id, driver_id=driver_id, response__isnull=True).update(
+        response='diambil', responded_at=now
+    )
+    winner_id = Order.objects.filter(order_id=order_id).values_list('driver_id', flat=True).first()
+    return False, winner_id
+
+
+def record_response(order_id, driver_id, action):
+    """Store a driver declining an offer, start the next wave when needed.
+
+    Accepting goes through accept_order().
+    """
+    OrderOffer.objects.filter(order_id=order_id, driver_id=driver_id, response__isnull=True).update(
+        response='abaikan', responded_at=timezone.now()
+    )
+    if not OrderOffer.objects.filter(order_id=order_id, response__isnull=True).exists():
+        # Everybody in this wave declined, no need to wait for the timeout
+        try:
+            offer_next_wave(Order.objects.get(order_id=order_id))
+        except Order.DoesNotExist:
+            pass
+
+
+def waiting_orders(kotas=None, shard_index=None, shard_count=1):
+    """Orders waiting for a driver in this dispatcher's kota shard"""
+    orders = Order.objects.filter(status='menunggu_driver', driver__isnull=True)
+    if kotas:
+        orders = orders.filter(kota__in=kotas)
+    if shard_index is not None and shard_count > 1:
+        shard_kotas = [
+            kota for kota in orders.values_list('kota', flat=True).distinct()
+            if kota_shard(kota, shard_count) == shard_index
+        ]
+        orders = orders.filter(kota__in=shard_kotas)
+    return orders
+
+
+def advance_waves(kotas=None, shard_index=None, shard_count=1, batch_size=200):
+    """Time out unanswered offers and dispatch the next wave where needed.
+
+    Returns (expired offers, orders offered to a new wave).
+    """
+    now = timezone.now()
+    orders = waiting_orders(kotas, shard_index, shard_count)
+    cutoff = now - timedelta(seconds=dispatch_setting('DISPATCH_OFFER_TIMEOUT', 15))
+    expired = OrderOffer.objects.filter(
+        order__in=orders, response__isnull=True, offered_at__lt=cutoff
+    ).update(response='timeout', responded_at=now)
+    # Offers of orders that were taken or cancelled meanwhile
+    OrderOffer.objects.filter(response__isnull=True).exclude(order__status='menunggu_driver').update(
+        response='diambil', responded_at=now
+    )
+
+    pending = OrderOffer.objects.filter(order=OuterRef('pk'), response__isnull=True)
+    dispatched = 0
+    for order in orders.exclude(Exists(pending)).order_by('created_at')[:batch_size]:
+        if offer_next_wave(order):
+            dispatched += 1
+    return expired, dispatched
+
+
+def advance_waves_if_due(kota=None):
+    """advance_waves() from the request path, throttled per kota.
+
+    run_dispatcher only runs with a shared presence cache. Without it, or
+    while it is down, orders would stall after their first wave, so order
+    board polls and driver responses advance the waves too, at most once per
+    DISPATCH_REQUEST_ADVANCE_INTERVAL seconds per kota (per process with the
+    default LocMemCache). 0 turns this off. Errors are logged, never raised.
+    """
+    interval = dispatch_setting('DISPATCH_REQUEST_ADVANCE_INTERVAL', 5)
+    if interval <= 0 or not claim_wave_advance(kota, interval):
+        return 0, 0
+    try:
+        return advance_waves([kota] if kota else None, batch_size=dispatch_setting('DISPATCH_REQUEST_ADVANCE_BATCH', 20))
+    except Exception as e:
+        print(f"Advancing dispatch waves failed: {e}")
+        return 0, 0
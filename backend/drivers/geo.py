@@ -0,0 +1,174 @@
+import heapq
+import math
+import threading
+import time
+
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def parse_coordinates(lat, lng):
+    """(lat, lng) as floats, None when missing or out of range"""
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def location_ttl():
+    return getattr(settings, 'DRIVER_LOCATION_TTL', 60)
+
+
+class GeoIndex:
+    """Latest driver positions in a uniform lat/lng grid.
+
+    nearest() searches rings of cells around the point and stops as soon as
+    no unvisited cell can hold a closer driver, so a query only touches the
+    cells near the pickup point instead of every driver in the city.
+    """
+
+    def __init__(self, cell_size=0.01, ttl=None):
+        self.cell_size = cell_size  # degrees, about 1.1 km
+        self.ttl = ttl
+        self._positions = {}  # driver_id -> (lat, lng, cell, updated_at)
+        self._cells = {}  # cell -> set of driver_id
+        self._last_prune = 0
+        self._lock = threading.Lock()
+
+    def get_ttl(self):
+        return self.ttl or location_ttl()
+
+    def cell(self, lat, lng):
+        return (math.floor(lat / self.cell_size), math.floor(lng / self.cell_size))
+
+    def update(self, driver_id, lat, lng, updated_at=None):
+        updated_at = updated_at or time.time()
+        cell = self.cell(lat, lng)
+        with self._lock:
+            previous = self._positions.get(driver_id)
+            if previous and previous[3] > updated_at:
+                return
+            if previous and previous[2] != cell:
+                self._discard(previous[2], driver_id)
+            self._positions[driver_id] = (lat, lng, cell, updated_at)
+            self._cells.setdefault(cell, set()).add(driver_id)
+        self.prune()
+
+    def remove(self, driver_id):
+        with self._lock:
+            previous = self._positions.pop(driver_id, None)
+            if previous:
+                self._discard(previous[2], driver_id)
+
+    def _discard(self, cell, driver_id):
+        ids = self._cells.get(cell)
+        if ids is not None:
+            ids.discard(driver_id)
+            if not ids:
+                del self._cells[cell]
+
+    def prune(self, force=False):
+        """Drop positions older than the TTL, at most once per second"""
+        now = time.time()
+        if not force and now - self._last_prune < 1:
+            return 0
+        with self._lock:
+            self._last_prune = now
+            cutoff = now - self.get_ttl()
+            expired = [driver_id for driver_id, position in self._positions.items() if position[3] < cutoff]
+            for driver_id in expired:
+                self._discard(self._positions.pop(driver_id)[2], driver_id)
+        return len(expired)
+
+    def get(self, driver_id):
+        position = self._positions.get(driver_id)
+        if position and position[3] >= time.time() - self.get_ttl():
+            return position[0], position[1]
+        return None
+
+    def nearest(self, lat, lng, k=10, max_km=None, allowed_ids=None):
+        """Up to k (distance_km, driver_id) pairs closest to the point"""
+        cell_lat, cell_lng = self.cell(lat, lng)
+        # Smallest cell side in km around this latitude, for the stop condition
+        cell_km = self.cell_size * KM_PER_DEGREE * max(math.cos(math.radians(min(abs(lat) + self.cell_size, 89.9))), 0.01)
+        max_ring = int(max_km / cell_km) + 1 if max_km else None
+        cutoff = time.time() - self.get_ttl()
+
+        best = []  # max heap of (-distance, driver_id)
+
+        def consider(driver_id):
+            if allowed_ids is not None and driver_id not in allowed_ids:
+                return
+            p_lat, p_lng, _, updated_at = self._positions[driver_id]
+            if updated_at < cutoff:
+                return
+            distance = haversine_km(lat, lng, p_lat, p_lng)
+            if max_km is not None and distance > max_km:
+                return
+            if len(best) < k:
+                heapq.heappush(best, (-distance, driver_id))
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, driver_id))
+
+        ring = 0
+        with self._lock:
+            while True:
+                if ring and (2 * ring + 1) ** 2 > len(self._cells):
+                    # The rings cover more cells than are occupied, scanning the
+                    # occupied cells beyond them directly is cheaper
+                    for (other_lat, other_lng), ids in self._cells.items():
+                        if max(abs(other_lat - cell_lat), abs(other_lng - cell_lng)) >= ring:
+                            for driver_id in ids:
+                                consider(driver_id)
+                    break
+                for cell in self._ring_cells(cell_lat, cell_lng, ring):
+                    for driver_id in self._cells.get(cell, ()):
+                        consider(driver_id)
+                # Anything in a further ring is at least ring * cell_km away
+                if len(best) == k and -best[0][0] <= ring * cell_km:
+                    break
+                if max_ring is not None and ring >= max_ring:
+                    break
+                ring += 1
+        return sorted((-negative, driver_id) for negative, driver_id in best)
+
+    def _ring_cells(self, cell_lat, cell_lng, ring):
+        if ring == 0:
+            return [(cell_lat, cell_lng)]
+        cells = []
+        for d in range(-ring, ring + 1):
+            cells.append((cell_lat - ring, cell_lng + d))
+            cells.append((cell_lat + ring, cell_lng + d))
+        for d in range(-ring + 1, ring):
+            cells.append((cell_lat + d, cell_lng - ring))
+            cells.append((cell_lat + d, cell_lng + ring))
+        return cells
+
+
+_index = None
+
+
+def get_geo_index():
+    global _index
+    if _index is None:
+        _index = GeoIndex()
+    return _index
+
+
+def record_location(driver_id, data):
+    """Store the lat/lng sent with a heartbeat, returns (lat, lng) or None"""
+    location = parse_coordinates(data.get('lat'), data.get('lng'))
+    if location:
+        get_geo_index().update(driver_id, *location)
+    return location
@@ -0,0 +1,142 @@
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils import timezone
+
+# Snowflake style layout: 41 bits milliseconds since EPOCH_MS, 10 bits worker,
+# 12 bits sequence. IDs of one worker always increase, IDs of different
+# workers are roughly ordered by creation time, so new orders land at the end
+# of the primary key index.
+EPOCH_MS = 1704067200000  # 2024-01-01 UTC
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+ID_DIGITS = 19  # fixed width so string order matches numeric order
+
+
+class IdGenerator:
+    """Unique, time ordered 63-bit IDs, up to 4096 per millisecond per worker"""
+
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f'worker_id must be between 0 and {MAX_WORKER_ID}')
+        self.worker_id = worker_id
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def _now_ms(self):
+        return int(time.time() * 1000)
+
+    def next_id(self):
+        with self._lock:
+            now = self._now_ms()
+            # Never go back in time, when the clock is adjusted backwards keep
+            # counting on the last timestamp
+            if now <= self._last_ms:
+                now = self._last_ms
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Sequence exhausted, borrow the next millisecond
+                    now += 1
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return ((now - EPOCH_MS) << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+
+# Worker numbers are leased from OrderIdWorker rows. A lease is renewed after
+# LEASE_RENEW_SECONDS and IDs are only generated before that, so a lease
+# that runs out (LEASE_SECONDS) is never still in use, even with some clock
+# skew between hosts.
+LEASE_SECONDS = 600
+LEASE_RENEW_SECONDS = 300
+
+
+class WorkerLease:
+    """Worker number of this process, leased from the database"""
+
+    def __init__(self, holder):
+        self.holder = holder
+        self.worker_id = None
+        self._renew_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self.worker_id is None or time.monotonic() >= self._renew_at:
+                self.worker_id = self._acquire()
+                self._renew_at = time.monotonic() + LEASE_RENEW_SECONDS
+            return self.worker_id
+
+    def _acquire(self):
+        from .models import OrderIdWorker
+
+        now = timezone.now()
+        # durable: the lease must not roll back with the caller's transaction
+        with transaction.atomic(durable=True):
+            lease = (
+                OrderIdWorker.objects.select_for_update(skip_locked=True)
+                .filter(Q(holder=self.holder) | Q(expires_at__isnull=True) | Q(expires_at__lt=now))
+                # Keep our own number while we still hold it
+                .order_by(Case(When(holder=self.holder, then=Value(0)), default=Value(1), output_field=IntegerField()), 'worker_id')
+                .first()
+            )
+            if lease is None:
+                raise RuntimeError('No free order ID worker, all OrderIdWorker rows are leased')
+            lease.holder = self.holder
+            lease.expires_at = now + timedelta(seconds=LEASE_SECONDS)
+            lease.save(update_fields=['holder', 'expires_at'])
+        return lease.worker_id
+
+
+def lease_holder():
+    return f"{socket.gethostname()}:{os.getpid()}"[:100]
+
+
+_lease = None
+_generator = None
+_pid = None
+_state_lock = threading.Lock()
+
+
+def worker_id():
+    """ORDER_ID_WORKER when set, a worker number leased from the database otherwise.
+
+    Only set ORDER_ID_WORKER for a single process per value, worker processes
+    forked from one environment would share it.
+    """
+    global _lease, _pid
+    configured = getattr(settings, 'ORDER_ID_WORKER', None)
+    if configured is not None:
+        if not 0 <= configured <= MAX_WORKER_ID:
+            raise ValueError(f'ORDER_ID_WORKER must be between 0 and {MAX_WORKER_ID}')
+        return configured
+    with _state_lock:
+        # A forked worker must not keep its parent's lease
+        if _lease is None or _pid != os.getpid():
+            _lease = WorkerLease(lease_holder())
+            _pid = os.getpid()
+        lease = _lease
+    return lease.get()
+
+
+def get_id_generator():
+    global _generator
+    current = worker_id()
+    with _state_lock:
+        if _generator is None or _generator.worker_id != current:
+            _generator = IdGenerator(current)
+        return _generator
+
+
+def new_order_id():
+    """Call outside transactions, renewing the worker lease needs its own"""
+    return f"order_{get_id_generator().next_id():0{ID_DIGITS}d}"
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from drivers.models import Driver
+from drivers.outbox import send_driver_batch_event
+from drivers.training_progress import complete_training_for
+
+class Command(BaseCommand):
+    help = 'Mark all active training modules as completed for drivers trained offline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--driver', type=int, action='append', dest='driver_ids', default=[],
+                            help='Driver ID to complete (can be repeated)')
+        parser.add_argument('--email', action='append', dest='emails', default=[],
+                            help='Driver email to complete (can be repeated)')
+        parser.add_argument('--file', dest='file',
+                            help='File with one driver ID or email per line')
+        parser.add_argument('--set-pending', action='store_true',
+                            help='Move drivers in training status to pending')
+
+    def handle(self, *args, **options):
+        driver_ids = list(options['driver_ids'])
+        emails = list(options['emails'])
+        if options['file']:
+            with open(options['file']) as f:
+                for line in f:
+                    value = line.strip()
+                    if not value:
+                        continue
+                    if value.isdigit():
+                        driver_ids.append(int(value))
+                    else:
+                        emails.append(value)
+        if not driver_ids and not emails:
+            raise CommandError('Give at least one --driver, --email or --file')
+
+        found = dict(
+            Driver.objects.filter(Q(id_driver__in=driver_ids) | Q(email__in=emails))
+            .values_list('id_driver', 'email')
+        )
+        missing = (set(driver_ids) - set(found)) | (set(emails) - set(found.values()))
+        for value in sorted(map(str, missing)):
+            self.stdout.write(self.style.WARNING(f'No driver found for {value}'))
+
+        with transaction.atomic():
+            count = complete_training_for(list(found))
+            moved = []
+            if options['set_pending']:
+                moved = [driver_id for driver_id, email in Driver.bulk_set_status(list(found), 'pending', from_status='training')]
+                if moved:
+                    send_driver_batch_event('drivers_training_completed', moved)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Completed training for {len(found)} drivers ({count} progress rows written, '
+                f'{len(moved)} moved to pending)'
+            )
+        )
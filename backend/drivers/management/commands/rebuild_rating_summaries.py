@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from drivers.models import RatingDriver, DriverRatingSummary
+from drivers.rating_summary import rebuild_rating_summaries
+
+class Command(BaseCommand):
+    help = 'Rebuild driver rating summaries from RatingDriver'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--driver', type=int, action='append', dest='driver_ids',
+                            help='Only rebuild this driver ID (can be repeated)')
+
+    def handle(self, *args, **options):
+        count = rebuild_rating_summaries(RatingDriver, DriverRatingSummary, options['driver_ids'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt rating summaries for {count} drivers')
+        )
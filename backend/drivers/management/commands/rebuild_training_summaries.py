@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from drivers.models import TrainingModule, TrainingContent, TrainingQuiz, TrainingModuleSummary
+from drivers.training_summary import rebuild_training_summaries
+
+class Command(BaseCommand):
+    help = 'Rebuild training module point totals from contents and quizzes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', type=int, action='append', dest='module_ids',
+                            help='Only rebuild this module ID (can be repeated)')
+
+    def handle(self, *args, **options):
+        count = rebuild_training_summaries(
+            TrainingModule, TrainingContent, TrainingQuiz, TrainingModuleSummary, options['module_ids']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt training summaries for {count} modules')
+        )
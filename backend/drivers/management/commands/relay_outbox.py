@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from drivers.kafka_producer import get_producer
+from drivers.outbox import OUTBOX_MAX_ATTEMPTS, relay_batch, purge_published
+
+class Command(BaseCommand):
+    help = 'Publish pending outbox messages to Kafka in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Messages per batch (default 500)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait when the outbox is empty (default 1)')
+        parser.add_argument('--retention-hours', type=int, default=72,
+                            help='Delete published messages older than this (default 72)')
+        parser.add_argument('--max-attempts', type=int, default=OUTBOX_MAX_ATTEMPTS,
+                            help=f'Give up on a message after this many failed publishes (default {OUTBOX_MAX_ATTEMPTS})')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the outbox once and exit')
+
+    def handle(self, *args, **options):
+        producer = get_producer()
+        if producer is None:
+            raise CommandError('Kafka is not available')
+
+        retention = timedelta(hours=options['retention_hours'])
+        self.stdout.write('Outbox relay started')
+        while True:
+            sent, failed = relay_batch(producer, options['batch_size'], max_attempts=options['max_attempts'])
+            if sent or failed:
+                self.stdout.write(f'Published {sent} messages, {failed} failed')
+
+            # A full batch means there is probably more waiting
+            if sent == 0 or sent + failed < options['batch_size']:
+                purged = purge_published(timezone.now() - retention)
+                if purged:
+                    self.stdout.write(f'Purged {purged} published messages')
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS('Outbox drained'))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from drivers.cache import is_shared_cache
+from drivers.dispatch import advance_waves
+from drivers.presence import CachePresenceRegistry, get_presence_registry
+
+class Command(BaseCommand):
+    help = 'Offer waiting orders to drivers in waves and time out unanswered offers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kota', action='append', dest='kotas',
+                            help='Only dispatch orders in this kota (can be repeated)')
+        parser.add_argument('--shard-count', type=int, default=1,
+                            help='Total number of dispatcher processes splitting the cities')
+        parser.add_argument('--shard-index', type=int, default=0,
+                            help='Shard handled by this process, 0 based')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds between rounds (default 1)')
+        parser.add_argument('--once', action='store_true',
+                            help='Run one round and exit')
+
+    def handle(self, *args, **options):
+        shard_count = options['shard_count']
+        shard_index = options['shard_index']
+        if not 0 <= shard_index < shard_count:
+            raise CommandError('--shard-index must be between 0 and --shard-count - 1')
+        # Heartbeats reach the web workers, an in-process registry here would
+        # always be empty and no follow-up wave would ever be sent
+        registry = get_presence_registry()
+        if not isinstance(registry, CachePresenceRegistry) or not is_shared_cache(registry.cache):
+            raise CommandError(
+                'run_dispatcher needs DRIVER_PRESENCE_CACHE set to a cache shared with the '
+                'web workers (Redis, Memcached or database cache)'
+            )
+
+        self.stdout.write(f'Dispatcher started (shard {shard_index + 1}/{shard_count})')
+        while True:
+            expired, dispatched = advance_waves(options['kotas'], shard_index, shard_count)
+            if expired or dispatched:
+                self.stdout.write(f'{expired} offers timed out, {dispatched} orders sent to a new wave')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
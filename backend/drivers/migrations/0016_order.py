@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0015_driver_kota'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('order_id', models.CharField(max_length=50, primary_key=True, serialize=False, unique=True)),
+                ('barang', models.CharField(max_length=100)),
+                ('pickup', models.CharField(max_length=255)),
+                ('tujuan', models.CharField(max_length=255)),
+                ('kota', models.CharField(max_length=50)),
+                ('ongkos', models.IntegerField(default=20000)),
+                ('status', models.CharField(choices=[('menunggu_konfirmasi', 'Menunggu Konfirmasi Penjual'), ('menunggu_driver', 'Menunggu Driver'), ('sedang_dikirim', 'Sedang Dikirim'), ('selesai', 'Selesai'), ('dibatalkan', 'Dibatalkan')], default='menunggu_konfirmasi', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('driver', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='drivers.driver')),
+            ],
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+from drivers.blobstore import BlobStore
+
+PHOTO_FIELDS = ['foto_ktp', 'foto_sim', 'foto_profil', 'foto_sertifikat', 'foto_bpjs']
+
+
+def move_photos_to_blob_store(apps, schema_editor):
+    Driver = apps.get_model('drivers', 'Driver')
+    store = BlobStore()
+    for driver in Driver.objects.only('id_driver', *PHOTO_FIELDS).iterator(chunk_size=100):
+        changed = []
+        for field in PHOTO_FIELDS:
+            value = getattr(driver, field)
+            ref = store.put_base64(value)
+            if ref != value:
+                setattr(driver, field, ref)
+                changed.append(field)
+        if changed:
+            driver.save(update_fields=changed)
+
+
+def restore_inline_photos(apps, schema_editor):
+    Driver = apps.get_model('drivers', 'Driver')
+    store = BlobStore()
+    for driver in Driver.objects.only('id_driver', *PHOTO_FIELDS).iterator(chunk_size=100):
+        changed = []
+        for field in PHOTO_FIELDS:
+            value = getattr(driver, field)
+            inline = store.get_base64(value)
+            if inline is not None and inline != value:
+                setattr(driver, field, inline)
+                changed.append(field)
+        if changed:
+            driver.save(update_fields=changed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0016_order'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_photos_to_blob_store, restore_inline_photos),
+    ]
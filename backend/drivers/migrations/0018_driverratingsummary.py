@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from drivers.rating_summary import rebuild_rating_summaries
+
+
+def backfill_rating_summaries(apps, schema_editor):
+    rebuild_rating_summaries(apps.get_model('drivers', 'RatingDriver'), apps.get_model('drivers', 'DriverRatingSummary'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0017_driver_photos_to_blob_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriverRatingSummary',
+            fields=[
+                ('driver', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='drivers.driver')),
+                ('rating_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('count_1', models.IntegerField(default=0)),
+                ('count_2', models.IntegerField(default=0)),
+                ('count_3', models.IntegerField(default=0)),
+                ('count_4', models.IntegerField(default=0)),
+                ('count_5', models.IntegerField(default=0)),
+                ('last_rating_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_rating_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('drivers', '0018_driverratingsummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deliveryorder',
+            index=models.Index(fields=['id_driver', 'status', '-tanggal_kirim'], name='do_driver_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['email'], name='driver_email_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['status', '-wkt_daftar'], name='driver_status_wkt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['-wkt_daftar', '-id_driver'], name='driver_wkt_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['kota', 'status'], name='driver_kota_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['kota'], name='driver_active_kota_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['kota', 'status'], name='order_kota_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'menunggu_driver')), fields=['kota', 'created_at'], name='order_waiting_kota_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ratingdriver',
+            index=models.Index(fields=['id_driver', '-timestamp'], name='rating_driver_time_idx'),
+        ),
+        # Login and token views look users up by email, auth_user is not ours to add Meta.indexes to
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS auth_user_email_idx ON auth_user (email);',
+            'DROP INDEX IF EXISTS auth_user_email_idx;',
+        ),
+    ]
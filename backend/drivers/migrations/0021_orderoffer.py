@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0020_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderOffer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wave', models.IntegerField()),
+                ('offered_at', models.DateTimeField(auto_now_add=True)),
+                ('response', models.CharField(blank=True, choices=[('terima', 'Terima'), ('abaikan', 'Abaikan'), ('timeout', 'Timeout'), ('diambil', 'Diambil Driver Lain')], max_length=10, null=True)),
+                ('responded_at', models.DateTimeField(blank=True, null=True)),
+                ('driver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_offers', to='drivers.driver')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='offers', to='drivers.order')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['driver', '-offered_at'], name='offer_driver_time_idx')],
+                'unique_together': {('order', 'driver')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0021_orderoffer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='pickup_lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='pickup_lng',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from drivers.training_summary import rebuild_training_summaries
+
+
+def backfill_training_summaries(apps, schema_editor):
+    rebuild_training_summaries(
+        apps.get_model('drivers', 'TrainingModule'),
+        apps.get_model('drivers', 'TrainingContent'),
+        apps.get_model('drivers', 'TrainingQuiz'),
+        apps.get_model('drivers', 'TrainingModuleSummary'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0023_order_updated_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainingModuleSummary',
+            fields=[
+                ('module', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='drivers.trainingmodule')),
+                ('content_count', models.IntegerField(default=0)),
+                ('content_points', models.IntegerField(default=0)),
+                ('quiz_count', models.IntegerField(default=0)),
+                ('quiz_points', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_training_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0024_trainingmodulesummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='drivertrainingprogress',
+            name='quiz_results',
+            field=models.JSONField(default=dict),
+        ),
+    ]
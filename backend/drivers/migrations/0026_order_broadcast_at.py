@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0025_drivertrainingprogress_quiz_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='broadcast_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
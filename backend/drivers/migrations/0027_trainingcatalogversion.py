@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0026_order_broadcast_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainingCatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=1)),
+            ],
+        ),
+    ]
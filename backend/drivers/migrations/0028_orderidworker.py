@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:55
+
+from django.db import migrations, models
+
+WORKER_COUNT = 1024  # drivers.ids.MAX_WORKER_ID + 1
+
+
+def create_workers(apps, schema_editor):
+    OrderIdWorker = apps.get_model('drivers', 'OrderIdWorker')
+    OrderIdWorker.objects.bulk_create([OrderIdWorker(worker_id=worker_id) for worker_id in range(WORKER_COUNT)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('drivers', '0027_trainingcatalogversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderIdWorker',
+            fields=[
+                ('worker_id', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('holder', models.CharField(blank=True, max_length=100)),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(create_workers, migrations.RunPython.noop),
+    ]
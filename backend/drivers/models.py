@@ -1,5 +1,15 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
+from .blobstore import get_blob_store
+from .cache import invalidate_driver_stats, invalidate_drivers_stats, invalidate_cached_driver
+from .training_summary import rebuild_training_summaries
+
+COMPLETED_TRIP_STATUSES = ['completed', 'delivered', 'selesai']
+BULK_STATUS_CHUNK_SIZE = 1000
 
 class Driver(models.Model):
     STATUS_CHOICES = [
@@ -11,6 +21,8 @@ class Driver(models.Model):
         ('rejected', 'Rejected'),
     ]
     
+    PHOTO_FIELDS = ['foto_ktp', 'foto_sim', 'foto_profil', 'foto_sertifikat', 'foto_bpjs']
+    
     id_driver = models.AutoField(primary_key=True)
     no_hp = models.CharField(max_length=15)
     nama = models.CharField(max_length=100)
@@ -32,7 +44,7 @@ class Driver(models.Model):
     hubungan_kontak_darurat = models.CharField(max_length=20)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     
-    # Photo fields
+    # Photo fields, stored as blob references (see blobstore.py)
     foto_ktp = models.TextField(blank=True, null=True)
     foto_sim = models.TextField(blank=True, null=True)
     foto_profil = models.TextField(blank=True, null=True)
@@ -45,23 +57,90 @@ class Driver(models.Model):
     
     # Rejection reason
     alasan_penolakan = models.TextField(blank=True, null=True)
+    
+    class Meta:
+        indexes = [
+            # Every authenticated endpoint resolves the driver by email
+            models.Index(fields=['email'], name='driver_email_idx'),
+            models.Index(fields=['status', '-wkt_daftar'], name='driver_status_wkt_idx'),
+            models.Index(fields=['-wkt_daftar', '-id_driver'], name='driver_wkt_id_idx'),
+            models.Index(fields=['kota', 'status'], name='driver_kota_status_idx'),
+            models.Index(fields=['kota'], name='driver_active_kota_idx', condition=models.Q(status='active')),
+        ]
 
     def __str__(self):
         return f"{self.nama} - {self.no_sim}"
     
+    def save(self, *args, **kwargs):
+        # Move inline base64 photos into the blob store, keep only the reference
+        store = get_blob_store()
+        # Fields left out by only()/defer() are not saved, loading them here
+        # would cost a query each
+        deferred = self.get_deferred_fields()
+        for field in self.PHOTO_FIELDS:
+            if field in deferred:
+                continue
+            value = getattr(self, field)
+            if value:
+                setattr(self, field, store.put_base64(value))
+        super().save(*args, **kwargs)
+        invalidate_driver_stats(self.id_driver)
+        invalidate_cached_driver(self.email)
+    
+    def delete(self, *args, **kwargs):
+        invalidate_cached_driver(self.email)
+        return super().delete(*args, **kwargs)
+    
+    @classmethod
+    def bulk_set_status(cls, driver_ids, new_status, from_status=None, chunk_size=BULK_STATUS_CHUNK_SIZE):
+        """Set status for many drivers with UPDATE ... RETURNING, chunk by chunk.
+
+        Drivers that already have new_status (or not from_status, when given)
+        are left alone. Returns [(id_driver, email)] of the drivers that changed.
+        """
+        qn = connection.ops.quote_name
+        table = qn(cls._meta.db_table)
+        id_column = qn(cls._meta.get_field('id_driver').column)
+        email_column = qn(cls._meta.get_field('email').column)
+        status_column = qn(cls._meta.get_field('status').column)
+        
+        driver_ids = list(dict.fromkeys(driver_ids))
+        changed = []
+        with connection.cursor() as cursor:
+            for start in range(0, len(driver_ids), chunk_size):
+                chunk = driver_ids[start:start + chunk_size]
+                sql = (
+                    f"UPDATE {table} SET {status_column} = %s "
+                    f"WHERE {id_column} IN ({', '.join(['%s'] * len(chunk))}) AND {status_column} <> %s"
+                )
+                params = [new_status, *chunk, new_status]
+                if from_status:
+                    sql += f" AND {status_column} = %s"
+                    params.append(from_status)
+                cursor.execute(sql + f" RETURNING {id_column}, {email_column}", params)
+                changed.extend(cursor.fetchall())
+        return changed
+    
+    def get_photo(self, field):
+        """Get photo as base64 string from the blob store"""
+        return get_blob_store().get_base64(getattr(self, field))
+    
+    def get_photo_data_url(self, field):
+        """Get photo as a data URL with its stored content type"""
+        return get_blob_store().get_data_url(getattr(self, field))
+    
     def get_average_rating(self):
-        """Calculate average rating for this driver"""
-        ratings = RatingDriver.objects.filter(id_driver=self)
-        if ratings.exists():
-            total_rating = sum(r.rating for r in ratings)
-            return round(total_rating / ratings.count(), 1)
-        return 0.0
+        """Get average rating for this driver from the precomputed summary"""
+        try:
+            return self.rating_summary.get_average()
+        except DriverRatingSummary.DoesNotExist:
+            return 0.0
     
     def get_total_trips(self):
         """Get total completed trips for this driver"""
         return DeliveryOrder.objects.filter(
             id_driver=self, 
-            status__in=['completed', 'delivered', 'selesai']
+            status__in=COMPLETED_TRIP_STATUSES
         ).count()
     
     def get_experience_years(self):
@@ -135,6 +214,17 @@ class SalesOrder(models.Model):
     def __str__(self):
         return f"SO-{self.id_sales_order}"
 
+class DeliveryOrderQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Bulk changes skip save(), drop the statistics of every driver touched
+        with transaction.atomic():
+            driver_ids = set(self.values_list('id_driver', flat=True))
+            updated = super().update(**kwargs)
+            if 'id_driver' in kwargs:
+                driver_ids.add(getattr(kwargs['id_driver'], 'pk', kwargs['id_driver']))
+            invalidate_drivers_stats(driver_ids)
+        return updated
+
 class DeliveryOrder(models.Model):
     id_delivery_order = models.AutoField(primary_key=True)
     id_sales_order = models.ForeignKey(SalesOrder, on_delete=models.CASCADE)
@@ -144,8 +234,21 @@ class DeliveryOrder(models.Model):
     gps_log = models.JSONField()
     status = models.CharField(max_length=20)
 
+    objects = DeliveryOrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id_driver', 'status', '-tanggal_kirim'], name='do_driver_status_date_idx'),
+        ]
+
     def __str__(self):
         return f"DO-{self.id_delivery_order}"
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Completed trips are counted in the driver statistics
+        if self.status in COMPLETED_TRIP_STATUSES:
+            invalidate_driver_stats(self.id_driver_id)
 
 class Notifikasi(models.Model):
     id_notifikasi = models.AutoField(primary_key=True)
@@ -219,6 +322,95 @@ class RatingDriver(models.Model):
     rating = models.IntegerField()
     ulasan = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['id_driver', '-timestamp'], name='rating_driver_time_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        # Rating and summary update commit together
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = RatingDriver.objects.select_for_update().filter(pk=self.pk).only('rating', 'id_driver').first()
+            super().save(*args, **kwargs)
+            if previous is None:
+                DriverRatingSummary.add_rating(self)
+            elif (previous.id_driver_id, previous.rating) != (self.id_driver_id, self.rating):
+                DriverRatingSummary.change_rating(previous, self)
+                invalidate_driver_stats(previous.id_driver_id)
+            invalidate_driver_stats(self.id_driver_id)
+    
+    # Deletes update the summary in remove_rating_on_delete() below, which
+    # also catches queryset and admin bulk deletes
+
+class DriverRatingSummary(models.Model):
+    """Rating aggregate per driver, kept in sync by RatingDriver.save() (edits
+    included) and the RatingDriver post_delete receiver.
+
+    Rebuild with: python manage.py rebuild_rating_summaries
+    """
+    driver = models.OneToOneField(Driver, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    count_1 = models.IntegerField(default=0)
+    count_2 = models.IntegerField(default=0)
+    count_3 = models.IntegerField(default=0)
+    count_4 = models.IntegerField(default=0)
+    count_5 = models.IntegerField(default=0)
+    last_rating_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.driver_id} - {self.get_average()} ({self.rating_count})"
+    
+    def get_average(self):
+        if self.rating_count == 0:
+            return 0.0
+        return round(self.rating_sum / self.rating_count, 1)
+    
+    def get_histogram(self):
+        return {star: getattr(self, f'count_{star}') for star in range(1, 6)}
+    
+    @classmethod
+    def add_rating(cls, rating):
+        cls.objects.get_or_create(driver_id=rating.id_driver_id)
+        changes = {
+            'rating_count': F('rating_count') + 1,
+            'rating_sum': F('rating_sum') + rating.rating,
+            'last_rating_at': Greatest(Coalesce('last_rating_at', Value(rating.timestamp)), Value(rating.timestamp)),
+        }
+        if 1 <= rating.rating <= 5:
+            field = f'count_{rating.rating}'
+            changes[field] = F(field) + 1
+        cls.objects.filter(driver_id=rating.id_driver_id).update(**changes)
+    
+    @classmethod
+    def remove_rating(cls, rating):
+        changes = {
+            'rating_count': F('rating_count') - 1,
+            'rating_sum': F('rating_sum') - rating.rating,
+        }
+        if 1 <= rating.rating <= 5:
+            field = f'count_{rating.rating}'
+            changes[field] = F(field) - 1
+        # last_rating_at is left as is, a rebuild recomputes it
+        cls.objects.filter(driver_id=rating.id_driver_id).update(**changes)
+    
+    @classmethod
+    def change_rating(cls, old, new):
+        """Apply an edited rating as a delta, old and new are RatingDriver values"""
+        if old.id_driver_id != new.id_driver_id:
+            cls.remove_rating(old)
+            cls.add_rating(new)
+            return
+        changes = {'rating_sum': F('rating_sum') + (new.rating - old.rating)}
+        if 1 <= old.rating <= 5:
+            changes[f'count_{old.rating}'] = F(f'count_{old.rating}') - 1
+        if 1 <= new.rating <= 5:
+            field = f'count_{new.rating}'
+            changes[field] = changes.get(field, F(field)) + 1
+        cls.objects.filter(driver_id=new.id_driver_id).update(**changes)
 
 class RiwayatPerjalanan(models.Model):
     id_perjalanan = models.AutoField(primary_key=True)
@@ -347,6 +539,19 @@ class TrainingModule(models.Model):
     class Meta:
         ordering = ['created_at']
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        TrainingCatalogVersion.bump()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        TrainingCatalogVersion.bump()
+        return result
+    
+    def get_summary(self):
+        """Point totals of this module, built on first use"""
+        return TrainingModuleSummary.for_module(self.id)
+    
     def __str__(self):
         return self.title
 
@@ -373,6 +578,23 @@ class TrainingContent(models.Model):
     
     def __str__(self):
         return f"{self.module.title} - {self.title}"
+    
+    def save(self, *args, **kwargs):
+        previous_module_id = None
+        if not self._state.adding:
+            previous_module_id = type(self).objects.filter(pk=self.pk).values_list('module_id', flat=True).first()
+        # Row and module totals commit together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            TrainingModuleSummary.refresh({self.module_id, previous_module_id} - {None})
+            TrainingCatalogVersion.bump()
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            TrainingModuleSummary.refresh([self.module_id])
+            TrainingCatalogVersion.bump()
+        return result
 
 class TrainingQuiz(models.Model):
     module = models.ForeignKey(TrainingModule, on_delete=models.CASCADE, related_name='quizzes')
@@ -391,12 +613,86 @@ class TrainingQuiz(models.Model):
     
     def __str__(self):
         return f"{self.module.title} - Quiz"
+    
+    def save(self, *args, **kwargs):
+        previous_module_id = None
+        if not self._state.adding:
+            previous_module_id = type(self).objects.filter(pk=self.pk).values_list('module_id', flat=True).first()
+        # Row and module totals commit together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            TrainingModuleSummary.refresh({self.module_id, previous_module_id} - {None})
+            TrainingCatalogVersion.bump()
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            TrainingModuleSummary.refresh([self.module_id])
+            TrainingCatalogVersion.bump()
+        return result
+
+class TrainingModuleSummary(models.Model):
+    """Point totals per training module, kept in sync by TrainingContent and
+    TrainingQuiz save()/delete().
+
+    Rebuild with: python manage.py rebuild_training_summaries
+    """
+    module = models.OneToOneField(TrainingModule, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    content_count = models.IntegerField(default=0)
+    content_points = models.IntegerField(default=0)
+    quiz_count = models.IntegerField(default=0)
+    quiz_points = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.module_id} - {self.get_total_points()} points"
+    
+    def get_total_points(self):
+        return self.content_points + self.quiz_points
+    
+    @classmethod
+    def refresh(cls, module_ids):
+        rebuild_training_summaries(TrainingModule, TrainingContent, TrainingQuiz, cls, list(module_ids))
+    
+    @classmethod
+    def for_module(cls, module_id):
+        try:
+            return cls.objects.get(module_id=module_id)
+        except cls.DoesNotExist:
+            cls.refresh([module_id])
+            # Still missing when the module does not exist
+            return cls.objects.filter(module_id=module_id).first() or cls(module_id=module_id)
+
+class TrainingCatalogVersion(models.Model):
+    """Single row counting edits of training modules, contents and quizzes.
+
+    Kept in the database so every worker process sees an edit right away.
+    The bump is part of the editing transaction and rolls back with it.
+    """
+    version = models.BigIntegerField(default=1)
+    
+    def __str__(self):
+        return f"Training catalog v{self.version}"
+    
+    @classmethod
+    def current(cls):
+        version = cls.objects.filter(pk=1).values_list('version', flat=True).first()
+        if version is None:
+            version = cls.objects.get_or_create(pk=1)[0].version
+        return version
+    
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(pk=1).update(version=models.F('version') + 1):
+            cls.objects.get_or_create(pk=1)
+            cls.objects.filter(pk=1).update(version=models.F('version') + 1)
 
 class DriverTrainingProgress(models.Model):
     driver = models.ForeignKey(Driver, on_delete=models.CASCADE)
     module = models.ForeignKey(TrainingModule, on_delete=models.CASCADE)
     completed_contents = models.JSONField(default=list)  # List of content IDs
     quiz_answers = models.JSONField(default=dict)  # Quiz answers with points
+    quiz_results = models.JSONField(default=dict)  # {quiz_id: answered correctly}
     current_points = models.IntegerField(default=0)
     total_points = models.IntegerField(default=0)
     is_completed = models.BooleanField(default=False)
@@ -410,9 +706,7 @@ class DriverTrainingProgress(models.Model):
         return f"{self.driver.nama} - {self.module.title}"
     
     def calculate_total_points(self):
-        content_points = sum([content.points for content in self.module.contents.all()])
-        quiz_points = sum([quiz.points for quiz in self.module.quizzes.all()])
-        return content_points + quiz_points
+        return TrainingModuleSummary.for_module(self.module_id).get_total_points()
     
     def get_progress_percentage(self):
         if self.total_points == 0:
@@ -432,13 +726,111 @@ class Order(models.Model):
     order_id = models.CharField(max_length=50, unique=True, primary_key=True)
     barang = models.CharField(max_length=100)
     pickup = models.CharField(max_length=255)
+    pickup_lat = models.FloatField(null=True, blank=True)
+    pickup_lng = models.FloatField(null=True, blank=True)
     tujuan = models.CharField(max_length=255)
     kota = models.CharField(max_length=50)
     ongkos = models.IntegerField(default=20000)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='menunggu_konfirmasi')
     driver = models.ForeignKey(Driver, on_delete=models.SET_NULL, null=True, blank=True)
+    # Last broadcast to the whole kota, when no ranked candidates were left
+    broadcast_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+            models.Index(fields=['kota', 'status'], name='order_kota_status_idx'),
+            # Orders waiting for a driver are looked up per city on every dispatch
+            models.Index(fields=['kota', 'created_at'], name='order_waiting_kota_idx', condition=models.Q(status='menunggu_driver')),
+            # Order board polling for changes (updated_since)
+            models.Index(fields=['updated_at', 'order_id'], name='order_updated_idx'),
+        ]
+    
     def __str__(self):
-        return f"Order {self.order_id} - {self.barang}"
\ No newline at end of file
+        return f"Order {self.order_id} - {self.barang}"
+
+class OrderOffer(models.Model):
+    """Order offered to one driver by the dispatcher (drivers/dispatch.py)"""
+    RESPONSE_CHOICES = [
+        ('terima', 'Terima'),
+        ('abaikan', 'Abaikan'),
+        ('timeout', 'Timeout'),
+        ('diambil', 'Diambil Driver Lain'),
+    ]
+    
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='offers')
+    driver = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name='order_offers')
+    wave = models.IntegerField()
+    offered_at = models.DateTimeField(auto_now_add=True)
+    response = models.CharField(max_length=10, choices=RESPONSE_CHOICES, null=True, blank=True)
+    responded_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ('order', 'driver')
+        indexes = [
+            # Recent rejections per driver are counted when ranking candidates
+            models.Index(fields=['driver', '-offered_at'], name='offer_driver_time_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.order_id} -> {self.driver_id} (wave {self.wave})"
+
+class OutboxMessage(models.Model):
+    """Event waiting to be published to Kafka by the relay_outbox command.
+
+    Rows are written in the same transaction as the change they describe, so
+    an event is only published when that change was committed.
+    """
+    id = models.BigAutoField(primary_key=True)
+    topic = models.CharField(max_length=100)
+    key = models.CharField(max_length=100, null=True, blank=True)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    # Claimed by a relay (or waiting for a retry) until then
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    # Given up after max_attempts failed publishes, clear to retry
+    failed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            # The relay only ever scans pending rows in insert order
+            models.Index(
+                fields=['id'], name='outbox_pending_idx',
+                condition=models.Q(published_at__isnull=True, failed_at__isnull=True),
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.topic} #{self.id}"
+
+class OrderIdWorker(models.Model):
+    """Lease of one order ID worker number (drivers/ids.py).
+
+    A process leases a free row before it generates order IDs and renews it
+    while running, so no two live processes share a worker number.
+    """
+    worker_id = models.PositiveSmallIntegerField(primary_key=True)
+    holder = models.CharField(max_length=100, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"Worker {self.worker_id} - {self.holder or 'free'}"
+
+
+# Deletes that skip Model.delete(): queryset.delete(), admin bulk delete and
+# cascades. Connecting a receiver also makes Django delete these row by row.
+@receiver(post_delete, sender=DeliveryOrder)
+@receiver(post_delete, sender=RatingDriver)
+def invalidate_stats_on_delete(sender, instance, **kwargs):
+    invalidate_driver_stats(instance.id_driver_id)
+
+
+@receiver(post_delete, sender=RatingDriver)
+def remove_rating_on_delete(sender, instance, **kwargs):
+    # Runs inside the delete's transaction, the summary row may already be
+    # gone when the driver itself is being deleted, then nothing is updated
+    DriverRatingSummary.remove_rating(instance)
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import queue
+import select
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import connection, connections, transaction
+from django.db.models import Q
+
+from .models import OutboxMessage
+
+ORDER_EVENTS_CHANNEL = 'order_events'
+SUBSCRIBER_QUEUE_SIZE = 100  # events a slow client may fall behind before it is dropped
+REPLAY_LIMIT = 500
+# Outbox IDs are assigned at insert, not at commit, so an event can commit
+# after one with a higher ID. Reconnects replay this far back before the
+# last seen event, streams and pages drop IDs they already have.
+REPLAY_LOOKBACK_SECONDS = 60
+REPLAY_LOOKBACK_IDS = 1000
+SENT_IDS_SIZE = 1000
+KEEPALIVE_SECONDS = 15
+# Streams end after this and the browser reconnects with Last-Event-ID, so a
+# stream of a client that disappeared without closing does not live forever
+STREAM_MAX_SECONDS = 300
+RECONNECT_MILLISECONDS = 3000
+
+
+def publish_order_event(message):
+    """Push an order outbox message to the open streams once it commits.
+
+    On PostgreSQL this is a NOTIFY inside the caller's transaction, delivered
+    to every process listening on ORDER_EVENTS_CHANNEL on commit and dropped
+    on rollback. Other databases only reach streams of this process.
+    """
+    event = {'id': message.id, **message.payload}
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [ORDER_EVENTS_CHANNEL, json.dumps(event)])
+    else:
+        transaction.on_commit(lambda: get_order_event_hub().dispatch(event))
+
+
+def event_matches(event, kota=None, order_ids=None):
+    if kota and event.get('kota') != kota:
+        return False
+    if order_ids and event.get('order_id') not in order_ids:
+        return False
+    return True
+
+
+class Subscriber:
+    """One open stream, filled by the hub thread and read by the response"""
+
+    def __init__(self, kota=None, order_ids=None):
+        self.kota = kota
+        self.order_ids = order_ids
+        self.closed = False
+
+    def matches(self, event):
+        return event_matches(event, self.kota, self.order_ids)
+
+    def close(self):
+        self.closed = True
+
+
+class SyncSubscriber(Subscriber):
+    def __init__(self, **filters):
+        super().__init__(**filters)
+        self.queue = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.close()
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscriber(Subscriber):
+    def __init__(self, **filters):
+        super().__init__(**filters)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def put(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.close()
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class OrderEventHub:
+    """Fans order events out to all open streams of this process.
+
+    On PostgreSQL one background thread LISTENs on ORDER_EVENTS_CHANNEL with
+    its own connection, so a process serves any number of streams with a
+    single database connection and no polling.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def subscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if connection.vendor == 'postgresql' and (self._listener is None or not self._listener.is_alive()):
+                self._listener = threading.Thread(target=self._listen, name='order-events-listener', daemon=True)
+                self._listener.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def dispatch(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.closed:
+                self.unsubscribe(subscriber)
+            elif subscriber.matches(event):
+                subscriber.put(event)
+
+    def _listen(self):
+        listen_connection = connections.create_connection('default')
+        try:
+            listen_connection.ensure_connection()
+            raw = listen_connection.connection
+            raw.autocommit = True
+            with raw.cursor() as cursor:
+                cursor.execute(f'LISTEN {ORDER_EVENTS_CHANNEL}')
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._listener = None
+                        return
+                if select.select([raw], [], [], 5) == ([], [], []):
+                    continue
+                raw.poll()
+                while raw.notifies:
+                    notify = raw.notifies.pop(0)
+                    try:
+                        self.dispatch(json.loads(notify.payload))
+                    except ValueError:
+                        print(f"Invalid order event payload: {notify.payload}")
+        except Exception as e:
+            # Streams notice the missing listener and reconnect through the client
+            print(f"Order event listener stopped: {e}")
+            with self._lock:
+                self._listener = None
+                subscribers = list(self._subscribers)
+            for subscriber in subscribers:
+                subscriber.close()
+        finally:
+            listen_connection.close()
+
+
+def missed_events(last_event_id, kota=None, order_ids=None):
+    """Order events a client that saw last_event_id may have missed, from the outbox.
+
+    Besides everything after last_event_id this includes lower IDs written
+    up to REPLAY_LOOKBACK_SECONDS before it, they may have committed later.
+    Some of them were already delivered, clients skip known IDs.
+    """
+    from .outbox import ORDER_EVENTS_TOPIC  # outbox imports this module
+
+    messages = OutboxMessage.objects.filter(topic=ORDER_EVENTS_TOPIC, id__gt=last_event_id)
+    last_created_at = OutboxMessage.objects.filter(id=last_event_id).values_list('created_at', flat=True).first()
+    if last_created_at is not None:
+        messages = OutboxMessage.objects.filter(
+            Q(id__gt=last_event_id) | Q(created_at__gte=last_created_at - timedelta(seconds=REPLAY_LOOKBACK_SECONDS)),
+            topic=ORDER_EVENTS_TOPIC, id__gt=last_event_id - REPLAY_LOOKBACK_IDS,
+        )
+    # Filter in the query, so REPLAY_LIMIT counts only this client's events
+    if kota:
+        messages = messages.filter(payload__kota=kota)
+    if order_ids:
+        messages = messages.filter(payload__order_id__in=list(order_ids))
+    return [
+        {'id': message['id'], **message['payload']}
+        for message in messages.order_by('id').values('id', 'payload')[:REPLAY_LIMIT]
+    ]
+
+
+class SentEvents:
+    """IDs a stream already sent, so replayed and live events go out once.
+
+    A lower ID than the last one sent can still be a new event (see
+    REPLAY_LOOKBACK_SECONDS), so this remembers recent IDs instead of a high
+    water mark. last_id, the highest ID sent, is the SSE id clients resume
+    from.
+    """
+
+    def __init__(self, last_id=0):
+        self.last_id = last_id
+        self._ids = set()
+        self._order = deque()
+
+    def add(self, event):
+        """False when the event was sent already"""
+        event_id = event['id']
+        if event_id in self._ids:
+            return False
+        self._ids.add(event_id)
+        self._order.append(event_id)
+        if len(self._order) > SENT_IDS_SIZE:
+            self._ids.discard(self._order.popleft())
+        self.last_id = max(self.last_id, event_id)
+        return True
+
+
+def format_event(event, cursor=None):
+    return (
+        f"id: {cursor or event['id']}\nevent: {event.get('event_type', 'message')}\n"
+        f"data: {json.dumps(event)}\n\n"
+    )
+
+
+def event_stream(last_event_id=None, kota=None, order_ids=None):
+    """SSE stream for WSGI servers, holds one thread while open"""
+    hub = get_order_event_hub()
+    # Subscribe before the replay so nothing falls between the two
+    subscriber = hub.subscribe(SyncSubscriber(kota=kota, order_ids=order_ids))
+    try:
+        yield f"retry: {RECONNECT_MILLISECONDS}\n\n"
+        sent = SentEvents(last_event_id or 0)
+        if last_event_id:
+            for event in missed_events(last_event_id, kota, order_ids):
+                if sent.add(event):
+                    yield format_event(event, sent.last_id)
+
+        ends_at = time.monotonic() + STREAM_MAX_SECONDS
+        while not subscriber.closed and time.monotonic() < ends_at:
+            event = subscriber.get(KEEPALIVE_SECONDS)
+            if event is None:
+                yield ": keepalive\n\n"
+            elif sent.add(event):
+                yield format_event(event, sent.last_id)
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+async def async_event_stream(last_event_id=None, kota=None, order_ids=None):
+    """SSE stream for ASGI servers, an open stream costs no thread"""
+    hub = get_order_event_hub()
+    subscriber = hub.subscribe(AsyncSubscriber(kota=kota, order_ids=order_ids))
+    try:
+        yield f"retry: {RECONNECT_MILLISECONDS}\n\n"
+        sent = SentEvents(last_event_id or 0)
+        if last_event_id:
+            for event in await sync_to_async(missed_events)(last_event_id, kota, order_ids):
+                if sent.add(event):
+                    yield format_event(event, sent.last_id)
+
+        ends_at = time.monotonic() + STREAM_MAX_SECONDS
+        while not subscriber.closed and time.monotonic() < ends_at:
+            event = await subscriber.get(KEEPALIVE_SECONDS)
+            if event is None:
+                yield ": keepalive\n\n"
+            elif sent.add(event):
+                yield format_event(event, sent.last_id)
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+_hub = None
+
+
+def get_order_event_hub():
+    global _hub
+    if _hub is None:
+        _hub = OrderEventHub()
+    return _hub
@@ -0,0 +1,137 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import OutboxMessage
+from .order_stream import publish_order_event
+
+DRIVER_EVENTS_TOPIC = 'driver_events'
+ORDER_EVENTS_TOPIC = 'order_events'
+
+CLAIM_SECONDS = 60  # longer than a flush, a dead relay's rows come back after this
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 10)
+RETRY_DELAY_SECONDS = 5
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_event(topic, payload, key=None):
+    """Write an event to the outbox, part of the caller's transaction"""
+    return OutboxMessage.objects.create(topic=topic, key=key, payload=payload)
+
+
+def send_driver_event(event_type, driver_id):
+    enqueue_event(DRIVER_EVENTS_TOPIC, {
+        'event_type': event_type,
+        'driver_id': driver_id,
+        'timestamp': str(timezone.now())
+    }, key=str(driver_id))
+
+
+def send_driver_batch_event(event_type, driver_ids):
+    """One event for a bulk change instead of one per driver"""
+    enqueue_event(DRIVER_EVENTS_TOPIC, {
+        'event_type': event_type,
+        'driver_ids': list(driver_ids),
+        'count': len(driver_ids),
+        'timestamp': str(timezone.now())
+    })
+
+
+def send_order_event(event_type, order):
+    """Outbox event for Kafka, also pushed to the open order streams"""
+    message = enqueue_event(ORDER_EVENTS_TOPIC, {
+        'event_type': event_type,
+        'order_id': order.order_id,
+        'barang': order.barang,
+        'kota': order.kota,
+        'status': order.status,
+        'driver_id': order.driver_id,
+        'timestamp': str(timezone.now())
+    }, key=order.order_id)
+    publish_order_event(message)
+
+
+def claim_batch(batch_size, lease=CLAIM_SECONDS):
+    """Claim pending messages for this relay in a short transaction.
+
+    SKIP LOCKED keeps parallel relays from waiting on each other, and the
+    claim keeps them off these rows after commit, until the lease runs out
+    (e.g. because this relay died).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        messages = list(
+            OutboxMessage.objects.select_for_update(skip_locked=True)
+            .filter(published_at__isnull=True, failed_at__isnull=True)
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now))
+            .order_by('id')[:batch_size]
+        )
+        if messages:
+            OutboxMessage.objects.filter(id__in=[message.id for message in messages]).update(
+                claimed_until=now + timedelta(seconds=lease)
+            )
+    return messages
+
+
+def relay_batch(producer, batch_size=500, timeout=10, max_attempts=OUTBOX_MAX_ATTEMPTS, retry_delay=RETRY_DELAY_SECONDS):
+    """Publish one batch of pending outbox messages, returns (sent, failed).
+
+    Messages are claimed first, the Kafka send and flush happen outside that
+    transaction so no row locks are held while waiting for the broker. All
+    messages of the batch go to the producer before a single flush, so linger
+    and compression apply across the batch. A message is only marked
+    published after the broker acknowledged it (at-least-once). A failed
+    message is retried after retry_delay seconds, after max_attempts
+    failures it gets failed_at and is no longer picked up.
+    """
+    messages = claim_batch(batch_size)
+    if not messages:
+        return 0, 0
+
+    futures = [
+        (message, producer.send(
+            message.topic,
+            key=message.key.encode('utf-8') if message.key else None,
+            value=message.payload,
+        ))
+        for message in messages
+    ]
+    producer.flush(timeout=timeout)
+
+    sent_ids, failed_ids = [], []
+    for message, future in futures:
+        try:
+            future.get(timeout=0)
+            sent_ids.append(message.id)
+        except Exception as e:
+            logger.warning('Outbox message %s to %s failed: %s', message.id, message.topic, e)
+            failed_ids.append(message.id)
+
+    now = timezone.now()
+    with transaction.atomic():
+        if sent_ids:
+            OutboxMessage.objects.filter(id__in=sent_ids).update(
+                published_at=now, attempts=F('attempts') + 1, claimed_until=None
+            )
+        if failed_ids:
+            OutboxMessage.objects.filter(id__in=failed_ids).update(
+                attempts=F('attempts') + 1, claimed_until=now + timedelta(seconds=retry_delay)
+            )
+            dead = OutboxMessage.objects.filter(id__in=failed_ids, attempts__gte=max_attempts)
+            for message_id, topic in dead.values_list('id', 'topic'):
+                logger.error('Outbox message %s to %s failed %s times, giving up', message_id, topic, max_attempts)
+            dead.update(failed_at=now)
+    return len(sent_ids), len(failed_ids)
+
+
+def purge_published(older_than):
+    """Delete messages published before older_than, returns the number deleted"""
+    deleted, _ = OutboxMessage.objects.filter(
+        published_at__isnull=False, published_at__lt=older_than
+    ).delete()
+    return deleted
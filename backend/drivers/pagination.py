@@ -0,0 +1,113 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Keyset pagination on a (timestamp, id) pair, newest rows first.
+
+    Only used when the client sends ``cursor`` or ``page_size``, so existing
+    clients that expect a plain list keep working. Also works on a plain
+    Django request, for the views in driver_api.py.
+    """
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    keyset_fields = None  # (timestamp field, id field)
+    id_type = int
+    descending = True
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_params(self, request):
+        return getattr(request, 'query_params', request.GET)
+
+    def is_requested(self, request):
+        params = self.get_params(request)
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(self.get_params(request).get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, obj):
+        time_field, id_field = self.keyset_fields
+        raw = f"{getattr(obj, time_field).isoformat()}|{getattr(obj, id_field)}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = self.get_params(request).get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8')
+            timestamp, obj_id = raw.rsplit('|', 1)
+            return datetime.fromisoformat(timestamp), self.id_type(obj_id)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        time_field, id_field = self.keyset_fields
+        prefix, after = ('-', 'lt') if self.descending else ('', 'gt')
+        queryset = queryset.order_by(f'{prefix}{time_field}', f'{prefix}{id_field}')
+
+        position = self.decode_cursor(request)
+        if position:
+            timestamp, obj_id = position
+            queryset = queryset.filter(
+                Q(**{f'{time_field}__{after}': timestamp}) | Q(**{time_field: timestamp, f'{id_field}__{after}': obj_id})
+            )
+
+        # Fetch one extra row to know if there is a next page
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class DriverKeysetPagination(KeysetPagination):
+    keyset_fields = ('wkt_daftar', 'id_driver')
+
+
+class TripKeysetPagination(KeysetPagination):
+    page_size = 20
+    keyset_fields = ('tanggal_kirim', 'id_delivery_order')
+
+
+class OrderKeysetPagination(KeysetPagination):
+    keyset_fields = ('created_at', 'order_id')
+    id_type = str
+
+    def is_requested(self, request):
+        return True
+
+
+class OrderUpdatesPagination(OrderKeysetPagination):
+    """Oldest change first, so a poller can continue from the last page"""
+    keyset_fields = ('updated_at', 'order_id')
+    descending = False
@@ -0,0 +1,204 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+PRESENCE_STATUSES = ['online', 'busy']
+
+
+def presence_ttl():
+    """Seconds without heartbeat after which a driver counts as offline"""
+    return getattr(settings, 'DRIVER_PRESENCE_TTL', 20)
+
+
+def presence_entry(driver_id, kota, status, last_seen, location=None):
+    entry = {'driver_id': driver_id, 'kota': kota, 'status': status, 'last_seen': last_seen}
+    if location:
+        entry['lat'], entry['lng'] = location
+    return entry
+
+
+class PresenceRegistry:
+    """In-memory registry of online drivers, indexed by kota and by status.
+
+    Each heartbeat refreshes last_seen. Entries older than the TTL are ignored
+    by queries and dropped by sweep(), which runs at most once per second.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._drivers = {}  # driver_id -> entry
+        self._by_kota = {}  # kota -> set of driver_id
+        self._by_status = {}  # status -> set of driver_id
+        self._last_sweep = 0
+        self._lock = threading.Lock()
+
+    def get_ttl(self):
+        return self.ttl or presence_ttl()
+
+    def heartbeat(self, driver_id, kota, status='online', location=None):
+        self.sweep()
+        now = time.time()
+        with self._lock:
+            self._remove(driver_id)
+            self._drivers[driver_id] = presence_entry(driver_id, kota, status, now, location)
+            self._by_kota.setdefault(kota, set()).add(driver_id)
+            self._by_status.setdefault(status, set()).add(driver_id)
+
+    def remove(self, driver_id):
+        with self._lock:
+            self._remove(driver_id)
+
+    def _remove(self, driver_id):
+        entry = self._drivers.pop(driver_id, None)
+        if entry:
+            self._discard(self._by_kota, entry['kota'], driver_id)
+            self._discard(self._by_status, entry['status'], driver_id)
+
+    def _discard(self, index, key, driver_id):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(driver_id)
+            if not ids:
+                del index[key]
+
+    def get(self, driver_id):
+        entry = self._drivers.get(driver_id)
+        if entry and entry['last_seen'] >= time.time() - self.get_ttl():
+            return dict(entry)
+        return None
+
+    def sweep(self, force=False):
+        """Drop expired drivers, returns how many were removed"""
+        now = time.time()
+        if not force and now - self._last_sweep < 1:
+            return 0
+        with self._lock:
+            self._last_sweep = now
+            cutoff = now - self.get_ttl()
+            expired = [driver_id for driver_id, entry in self._drivers.items() if entry['last_seen'] < cutoff]
+            for driver_id in expired:
+                self._remove(driver_id)
+        return len(expired)
+
+    def online(self, kota=None, status=None):
+        """Drivers seen within the TTL, optionally filtered by kota and status"""
+        self.sweep()
+        with self._lock:
+            if kota is not None and status is not None:
+                ids = self._by_kota.get(kota, set()) & self._by_status.get(status, set())
+            elif kota is not None:
+                ids = set(self._by_kota.get(kota, ()))
+            elif status is not None:
+                ids = set(self._by_status.get(status, ()))
+            else:
+                ids = set(self._drivers)
+            cutoff = time.time() - self.get_ttl()
+            entries = [dict(self._drivers[driver_id]) for driver_id in ids]
+        return [entry for entry in entries if entry['last_seen'] >= cutoff]
+
+
+class CachePresenceRegistry:
+    """Presence registry on a shared Django cache, for several workers.
+
+    Every driver has its own entry, so a heartbeat is one read and one write.
+    Per kota an index lists the driver IDs seen there. It only changes when a
+    driver enters the kota, under a short cache.add() lock so concurrent
+    joins are not lost, and drops expired or moved drivers while at it.
+    online() reads the index and then the driver entries with get_many().
+    """
+    kotas_key = 'presence:kotas'
+    lock_timeout = 2  # seconds, a crashed holder blocks the index at most this long
+
+    def __init__(self, alias, ttl=None):
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    def get_ttl(self):
+        return self.ttl or presence_ttl()
+
+    def kota_key(self, kota):
+        return f'presence:kota:{kota}'
+
+    def driver_key(self, driver_id):
+        return f'presence:driver:{driver_id}'
+
+    def heartbeat(self, driver_id, kota, status='online', location=None):
+        key = self.driver_key(driver_id)
+        previous = self.cache.get(key)
+        self.cache.set(key, presence_entry(driver_id, kota, status, time.time(), location), self.get_ttl() * 3)
+        if previous is None or previous['kota'] != kota:
+            self._join(kota, driver_id)
+
+    def remove(self, driver_id):
+        # The kota index forgets the driver on its next change
+        self.cache.delete(self.driver_key(driver_id))
+
+    def _join(self, kota, driver_id):
+        key = self.kota_key(kota)
+        if driver_id in (self.cache.get(key) or ()):
+            return
+        with self._locked(key):
+            ids = set(self.cache.get(key) or ())
+            entries = self.cache.get_many([self.driver_key(i) for i in ids])
+            ids = {
+                i for i in ids
+                if entries.get(self.driver_key(i), {}).get('kota') == kota
+            }
+            self.cache.set(key, ids | {driver_id}, None)
+        if kota not in (self.cache.get(self.kotas_key) or ()):
+            with self._locked(self.kotas_key):
+                kotas = self.cache.get(self.kotas_key) or set()
+                self.cache.set(self.kotas_key, kotas | {kota}, None)
+
+    @contextmanager
+    def _locked(self, key):
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + self.lock_timeout
+        acquired = self.cache.add(lock_key, 1, self.lock_timeout)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(0.01)
+            acquired = self.cache.add(lock_key, 1, self.lock_timeout)
+        try:
+            yield
+        finally:
+            if acquired:
+                self.cache.delete(lock_key)
+
+    def get(self, driver_id):
+        entry = self.cache.get(self.driver_key(driver_id))
+        if entry and entry['last_seen'] >= time.time() - self.get_ttl():
+            return entry
+        return None
+
+    def sweep(self, force=False):
+        # Driver entries expire in the cache, indexes are pruned on join
+        return 0
+
+    def online(self, kota=None, status=None):
+        kotas = [kota] if kota is not None else sorted(self.cache.get(self.kotas_key) or ())
+        indexes = self.cache.get_many([self.kota_key(k) for k in kotas])
+        keys = {
+            self.driver_key(driver_id): k for k in kotas
+            for driver_id in indexes.get(self.kota_key(k), ())
+        }
+        cutoff = time.time() - self.get_ttl()
+        return [
+            entry for key, entry in self.cache.get_many(list(keys)).items()
+            if entry['kota'] == keys[key] and entry['last_seen'] >= cutoff
+            and (status is None or entry['status'] == status)
+        ]
+
+
+_registry = None
+
+
+def get_presence_registry():
+    """Shared-cache registry when DRIVER_PRESENCE_CACHE is set, in-memory otherwise"""
+    global _registry
+    if _registry is None:
+        alias = getattr(settings, 'DRIVER_PRESENCE_CACHE', '')
+        _registry = CachePresenceRegistry(alias) if alias else PresenceRegistry()
+    return _registry
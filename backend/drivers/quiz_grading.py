@@ -0,0 +1,65 @@
+from .cache import LocalLRUCache
+from .models import TrainingCatalogVersion, TrainingQuiz
+
+
+class AnswerKey:
+    """Quizzes of one module as parallel tuples, graded in a single pass"""
+
+    def __init__(self, quizzes):
+        quizzes = list(quizzes)  # (id, correct_answer, points, explanation)
+        self.quiz_ids = tuple(str(quiz_id) for quiz_id, _, _, _ in quizzes)
+        self.correct = tuple(answer for _, answer, _, _ in quizzes)
+        self.points = tuple(points for _, _, points, _ in quizzes)
+        self.explanations = tuple(explanation for _, _, _, explanation in quizzes)
+        self.total_points = sum(self.points)
+
+    def __len__(self):
+        return len(self.quiz_ids)
+
+    def grade(self, answers):
+        """Grade {quiz_id: answer}, returns points, correct count and per-question results"""
+        # Clients send the quiz IDs as JSON keys, accept numbers as well
+        answers = {str(quiz_id): answer for quiz_id, answer in (answers or {}).items()}
+        quiz_points = 0
+        results = {}
+        for quiz_id, correct_answer, points in zip(self.quiz_ids, self.correct, self.points):
+            is_correct = answers.get(quiz_id) == correct_answer
+            results[quiz_id] = is_correct
+            if is_correct:
+                quiz_points += points
+        return {
+            'quiz_points': quiz_points,
+            'correct_answers': sum(results.values()),
+            'total_questions': len(self.quiz_ids),
+            'results': results,
+        }
+
+    def feedback(self, results):
+        """Per-question result for the client, explanations included"""
+        return [
+            {'quiz_id': int(quiz_id), 'correct': results[quiz_id], 'explanation': explanation}
+            for quiz_id, explanation in zip(self.quiz_ids, self.explanations)
+        ]
+
+
+def load_answer_key(module_id):
+    return AnswerKey(
+        TrainingQuiz.objects.filter(module_id=module_id)
+        .order_by('created_at', 'id')
+        .values_list('id', 'correct_answer', 'points', 'explanation')
+    )
+
+
+# Keyed by the catalog version from the database, which changes on every quiz
+# edit in any process, so a stale key is never used and old versions fall out
+# of the LRU
+_answer_keys = LocalLRUCache(max_size=256, ttl=3600)
+
+
+def get_answer_key(module_id):
+    cache_key = (int(module_id), TrainingCatalogVersion.current())
+    answer_key = _answer_keys.get(cache_key)
+    if answer_key is None:
+        answer_key = load_answer_key(module_id)
+        _answer_keys.set(cache_key, answer_key)
+    return answer_key
@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+
+
+def rebuild_rating_summaries(rating_model, summary_model, driver_ids=None):
+    """Recompute DriverRatingSummary rows from RatingDriver in one aggregate query.
+
+    Takes the model classes as arguments so migrations can pass historical models.
+    Returns the number of summaries written.
+    """
+    ratings = rating_model.objects.all()
+    summaries = summary_model.objects.all()
+    if driver_ids is not None:
+        ratings = ratings.filter(id_driver_id__in=driver_ids)
+        summaries = summaries.filter(driver_id__in=driver_ids)
+
+    histogram = {f'count_{star}': Count('id_rating', filter=Q(rating=star)) for star in range(1, 6)}
+    rows = ratings.values('id_driver_id').annotate(
+        rating_count=Count('id_rating'),
+        rating_sum=Sum('rating'),
+        last_rating_at=Max('timestamp'),
+        **histogram
+    ).order_by()
+
+    new_summaries = [
+        summary_model(
+            driver_id=row.pop('id_driver_id'),
+            **row
+        )
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        summaries.delete()
+        summary_model.objects.bulk_create(new_summaries, batch_size=1000)
+    return len(new_summaries)
@@ -1,10 +1,53 @@
 from rest_framework import serializers
 from .models import *
+from .blobstore import get_blob_store
+
+class BlobPhotoField(serializers.CharField):
+    """Photo stored in the blob store, exposed to clients as base64"""
+    def __init__(self, **kwargs):
+        kwargs.setdefault('required', False)
+        kwargs.setdefault('allow_null', True)
+        kwargs.setdefault('allow_blank', True)
+        kwargs.setdefault('trim_whitespace', False)
+        super().__init__(**kwargs)
+    
+    def to_representation(self, value):
+        return get_blob_store().get_base64(value)
 
 class DriverSerializer(serializers.ModelSerializer):
+    foto_ktp = BlobPhotoField()
+    foto_sim = BlobPhotoField()
+    foto_profil = BlobPhotoField()
+    foto_sertifikat = BlobPhotoField()
+    foto_bpjs = BlobPhotoField()
+    # {photo field: content type}, the photos themselves are plain base64
+    photo_types = serializers.SerializerMethodField()
+    
     class Meta:
         model = Driver
         fields = '__all__'
+    
+    def get_photo_types(self, obj):
+        store = get_blob_store()
+        return {
+            field: store.get_content_type(getattr(obj, field))
+            for field in Driver.PHOTO_FIELDS
+            if field in self.fields and getattr(obj, field)
+        }
+    
+    def __init__(self, *args, **kwargs):
+        # Optional projection, e.g. DriverSerializer(drivers, many=True, fields=['id_driver', 'nama'])
+        # or exclude=Driver.PHOTO_FIELDS
+        fields = kwargs.pop('fields', None)
+        exclude = kwargs.pop('exclude', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+        for field_name in exclude or ():
+            self.fields.pop(field_name, None)
+        if not any(field in self.fields for field in Driver.PHOTO_FIELDS):
+            self.fields.pop('photo_types', None)
 
 class VehicleSerializer(serializers.ModelSerializer):
     class Meta:
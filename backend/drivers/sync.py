@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .auth_backends import revoke_user_tokens
+from .models import Driver
+
+CLEANUP_BATCH_SIZE = 1000
+SYNC_SAMPLE_PAGE_SIZE = 50
+SYNC_SAMPLE_MAX_PAGE_SIZE = 500
+
+
+def orphaned_users():
+    """Non-admin users without a driver with the same email (NOT EXISTS)"""
+    return User.objects.filter(is_staff=False).filter(
+        ~Exists(Driver.objects.filter(email=OuterRef('email')))
+    )
+
+
+def drivers_without_users():
+    """Drivers without a user account with the same email (NOT EXISTS)"""
+    return Driver.objects.filter(
+        ~Exists(User.objects.filter(email=OuterRef('email')))
+    )
+
+
+def delete_orphaned_users(batch_size=CLEANUP_BATCH_SIZE, sample_size=100):
+    """Delete orphaned users in batches, each batch in its own transaction.
+
+    Returns (deleted_count, sample of deleted emails). Tokens of a batch are
+    deleted and revoked in the same transaction as the users.
+    """
+    deleted_count = 0
+    sample = []
+    while True:
+        with transaction.atomic():
+            batch = list(
+                orphaned_users().order_by('id').values_list('id', 'email')[:batch_size]
+            )
+            if not batch:
+                break
+            user_ids = [user_id for user_id, email in batch]
+            revoke_user_tokens(user_ids)
+            User.objects.filter(id__in=user_ids).delete()
+
+        deleted_count += len(batch)
+        sample.extend(email for user_id, email in batch[:sample_size - len(sample)])
+        if len(batch) < batch_size:
+            break
+    return deleted_count, sample
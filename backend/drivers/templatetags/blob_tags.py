@@ -0,0 +1,14 @@
+from django import template
+from ..blobstore import get_blob_store
+
+register = template.Library()
+
+@register.filter
+def blob_base64(value):
+    """Resolve a blob reference to base64 for data:image URLs"""
+    return get_blob_store().get_base64(value) or ''
+
+@register.filter
+def blob_data_url(value):
+    """Resolve a blob reference to a data URL with the stored content type"""
+    return get_blob_store().get_data_url(value) or ''
@@ -0,0 +1,942 @@
+import base64
+import gzip
+import json
+import random
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from dispatch_client import CircuitBreaker, DispatchClient, DispatchError, QueuedMessage
+
+from .auth_backends import DriverTokenAuthentication
+from . import blobstore, training_catalog
+from .blobstore import BlobStore
+from .dispatch import accept_order, offer_next_wave
+from .geo import GeoIndex, haversine_km
+from .ids import WorkerLease
+from .quiz_grading import AnswerKey, get_answer_key
+from .presence import CachePresenceRegistry
+from .models import Armada, SalesOrder, Driver, DeliveryOrder, DriverRatingSummary, OutboxMessage, DriverTrainingProgress, Pelanggan, RatingDriver, Order, OrderOffer, TrainingCatalogVersion, TrainingContent, TrainingModule, TrainingModuleSummary, TrainingQuiz, COMPLETED_TRIP_STATUSES
+from .order_stream import REPLAY_LIMIT, missed_events
+from .cache import get_driver_stats
+from .outbox import ORDER_EVENTS_TOPIC, relay_batch
+from .sync import delete_orphaned_users
+from .training_progress import complete_training_for, finish_training
+
+
+def create_driver(**kwargs):
+    data = {
+        'nama': 'Test Driver',
+        'email': 'driver@test.com',
+        'no_hp': '08123456789',
+        'alamat': 'Jakarta',
+        'ttl': date(1990, 1, 1),
+        'nik': '1234567890123456',
+        'no_sim': 'SIM123',
+        'jenis_sim': 'A',
+        'no_bpjs': 'BPJS123',
+        'nama_kontak_darurat': 'Kontak',
+        'nomor_kontak_darurat': '08123456780',
+        'hubungan_kontak_darurat': 'Keluarga',
+        'status': 'active',
+    }
+    data.update(kwargs)
+    return Driver.objects.create(**data)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'EXPLAIN checks need PostgreSQL')
+class HotQueryIndexTest(TestCase):
+    """Hot lookups must be able to use their indexes (see migration 0019)"""
+
+    def setUp(self):
+        # Test tables are tiny, so force the planner to pick an index when one fits
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        """Plan must not scan the table, and must use one of index_names when given"""
+        plan = queryset.explain()
+        self.assertNotIn('Seq Scan', plan, plan)
+        self.assertIn('Index', plan, plan)
+        if index_names:
+            self.assertTrue(any(name in plan for name in index_names), f'Expected one of {index_names} in plan:\n{plan}')
+
+    def test_driver_by_email(self):
+        self.assertUsesIndex(Driver.objects.filter(email='driver@test.com'), 'driver_email_idx')
+
+    def test_user_by_email(self):
+        self.assertUsesIndex(User.objects.filter(email='driver@test.com'), 'auth_user_email_idx')
+
+    def test_drivers_by_status(self):
+        queryset = Driver.objects.filter(status='pending').order_by('-wkt_daftar')
+        self.assertUsesIndex(queryset, 'driver_status_wkt_idx')
+
+    def test_active_drivers_by_kota(self):
+        queryset = Driver.objects.filter(status='active', kota='Jakarta')
+        self.assertUsesIndex(queryset, 'driver_active_kota_idx', 'driver_kota_status_idx')
+
+    def test_orders_by_status(self):
+        queryset = Order.objects.filter(status='menunggu_konfirmasi').order_by('-created_at')
+        self.assertUsesIndex(queryset, 'order_status_created_idx')
+
+    def test_waiting_orders_by_kota(self):
+        queryset = Order.objects.filter(status='menunggu_driver', kota='Jakarta').order_by('created_at')
+        self.assertUsesIndex(queryset, 'order_waiting_kota_idx', 'order_kota_status_idx')
+
+    def test_orders_updated_since(self):
+        queryset = Order.objects.filter(updated_at__gt=timezone.now()).order_by('updated_at', 'order_id')
+        self.assertUsesIndex(queryset, 'order_updated_idx')
+
+    def test_driver_trips(self):
+        driver = create_driver()
+        queryset = DeliveryOrder.objects.filter(
+            id_driver=driver,
+            status__in=COMPLETED_TRIP_STATUSES
+        ).order_by('-tanggal_kirim')
+        # The planner may also pick the plain id_driver foreign key index here
+        self.assertUsesIndex(queryset)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Parallel writes need PostgreSQL')
+class ConcurrentAcceptTest(TransactionTestCase):
+    """Parallel accepts of one order must have exactly one winner"""
+    drivers_count = 16
+    rounds = 5
+
+    def setUp(self):
+        self.drivers = [
+            create_driver(email=f'driver{i}@test.com', nik=f'{i:016d}')
+            for i in range(self.drivers_count)
+        ]
+
+    def accept_in_parallel(self, order_id):
+        barrier = threading.Barrier(len(self.drivers))
+        results = {}
+
+        def accept(driver):
+            try:
+                barrier.wait()
+                results[driver.id_driver] = accept_order(order_id, driver.id_driver)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=accept, args=(driver,)) for driver in self.drivers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_one_winner(self):
+        for round_number in range(self.rounds):
+            order = Order.objects.create(
+                order_id=f'order_race_{round_number}', barang='Barang', pickup='A',
+                tujuan='B', kota='Jakarta', status='menunggu_driver'
+            )
+            OrderOffer.objects.bulk_create([OrderOffer(order=order, driver=driver, wave=1) for driver in self.drivers])
+
+            results = self.accept_in_parallel(order.order_id)
+
+            self.assertEqual(len(results), len(self.drivers))
+            winners = [driver_id for driver_id, (accepted, winner_id) in results.items() if accepted]
+            self.assertEqual(len(winners), 1)
+            # Every loser is told who won
+            self.assertEqual({winner_id for accepted, winner_id in results.values()}, {winners[0]})
+
+            order.refresh_from_db()
+            self.assertEqual(order.driver_id, winners[0])
+            self.assertEqual(order.status, 'sedang_dikirim')
+            self.assertEqual(order.offers.filter(response='terima').count(), 1)
+            self.assertEqual(order.offers.filter(response='diambil').count(), len(self.drivers) - 1)
+
+    def test_order_not_waiting(self):
+        Order.objects.create(
+            order_id='order_race_done', barang='Barang', pickup='A',
+            tujuan='B', kota='Jakarta', status='selesai'
+        )
+        self.assertEqual(accept_order('order_race_done', self.drivers[0].id_driver), (False, None))
+        self.assertEqual(accept_order('order_missing', self.drivers[0].id_driver), (False, None))
+
+
+class FinishTrainingTest(TestCase):
+    """Status polling decides training completion in one query and writes only on change"""
+
+    def setUp(self):
+        self.driver = create_driver(status='training')
+        self.modules = [
+            TrainingModule.objects.create(title=f'Modul {i}', description='Modul', order=i)
+            for i in range(3)
+        ]
+        TrainingModule.objects.create(title='Modul lama', description='Modul', order=9, is_active=False)
+
+    def test_incomplete_training_is_not_written(self):
+        DriverTrainingProgress.objects.create(driver=self.driver, module=self.modules[0], is_completed=True)
+        DriverTrainingProgress.objects.create(driver=self.driver, module=self.modules[1])
+        with self.assertNumQueries(1):
+            self.assertFalse(finish_training(self.driver))
+        self.driver.refresh_from_db()
+        self.assertEqual(self.driver.status, 'training')
+
+    def test_completed_training_moves_to_pending_once(self):
+        complete_training_for([self.driver.id_driver])
+        self.assertEqual(DriverTrainingProgress.objects.filter(driver=self.driver, is_completed=True).count(), 3)
+
+        self.assertTrue(finish_training(self.driver))
+        self.assertEqual(self.driver.status, 'pending')
+        self.driver.refresh_from_db()
+        self.assertEqual(self.driver.status, 'pending')
+
+        stale = Driver.objects.get(pk=self.driver.pk)
+        stale.status = 'training'
+        self.assertFalse(finish_training(stale))
+
+    def test_complete_training_keeps_completed_rows(self):
+        done_at = timezone.now() - timedelta(days=1)
+        done = DriverTrainingProgress.objects.create(
+            driver=self.driver, module=self.modules[0], current_points=7, is_completed=True, completed_at=done_at
+        )
+        DriverTrainingProgress.objects.create(driver=self.driver, module=self.modules[1])
+
+        # One row updated, one inserted, the completed one left alone
+        self.assertEqual(complete_training_for([self.driver.id_driver]), 2)
+        done.refresh_from_db()
+        self.assertEqual((done.current_points, done.completed_at), (7, done_at))
+        self.assertEqual(complete_training_for([self.driver.id_driver]), 0)
+
+
+class TokenCacheTest(TestCase):
+    """Cached tokens must not outlive their user"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='driver@test.com', email='driver@test.com', password='secret')
+        self.token = Token.objects.create(user=self.user)
+        self.auth = DriverTokenAuthentication()
+        # First call caches the token
+        self.assertEqual(self.auth.authenticate_credentials(self.token.key)[0], self.user)
+
+    def test_deactivated_user_is_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+    def test_deleted_user_is_rejected(self):
+        User.objects.filter(pk=self.user.pk).delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.auth.authenticate_credentials(self.token.key)
+
+
+class RequestDriverTest(TestCase):
+    """Only the driver ID is cached, writes work on a fresh row"""
+
+    def setUp(self):
+        cache.clear()
+        self.driver = create_driver(status='rejected', alasan_penolakan='Dokumen tidak jelas/tidak sesuai: KTP')
+        user = User.objects.create_user(username=self.driver.email, email=self.driver.email, password='secret')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        # Caches the driver ID
+        self.assertEqual(self.client.get('/api/drivers/status/').status_code, 200)
+
+    def test_status_change_is_seen_right_away(self):
+        Driver.objects.filter(pk=self.driver.pk).update(status='suspended')
+        response = self.client.post('/api/drivers/complete-documents/')
+        self.assertEqual(response.status_code, 400)
+
+    def test_complete_documents_keeps_other_changes(self):
+        Driver.objects.filter(pk=self.driver.pk).update(nama='Nama Baru')
+        response = self.client.post('/api/drivers/complete-documents/')
+        self.assertEqual(response.status_code, 200)
+        self.driver.refresh_from_db()
+        self.assertEqual((self.driver.status, self.driver.nama), ('pending', 'Nama Baru'))
+
+
+class EmptyWaveBroadcastTest(TestCase):
+    """Orders without ranked candidates still reach the kota"""
+
+    def test_broadcast_once_per_cooldown(self):
+        order = Order.objects.create(
+            order_id='order_nobody', barang='Barang', pickup='A',
+            tujuan='B', kota='Kota Kosong', status='menunggu_driver'
+        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(offer_next_wave(order), [])
+        self.assertEqual(len(callbacks), 1)
+        order.refresh_from_db()
+        self.assertIsNotNone(order.broadcast_at)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            offer_next_wave(order)
+        self.assertEqual(callbacks, [])
+
+
+class RequestPathWaveTest(TestCase):
+    """Order board polls time out stale offers without run_dispatcher"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_poll_advances_expired_wave(self):
+        driver = create_driver(kota='Kota Poll')
+        order = Order.objects.create(
+            order_id='order_poll', barang='Barang', pickup='A',
+            tujuan='B', kota='Kota Poll', status='menunggu_driver'
+        )
+        offer = OrderOffer.objects.create(order=order, driver=driver, wave=1)
+        OrderOffer.objects.filter(pk=offer.pk).update(offered_at=timezone.now() - timedelta(minutes=5))
+
+        self.client.get('/api/orders/', {'kota': 'Kota Poll'})
+
+        offer.refresh_from_db()
+        self.assertEqual(offer.response, 'timeout')
+        # Nobody else is online, so the next wave is a broadcast
+        order.refresh_from_db()
+        self.assertIsNotNone(order.broadcast_at)
+
+
+class AnswerKeyTest(TestCase):
+    """Answers stay aligned with their quiz whatever the stored answer looks like"""
+
+    def test_blank_and_long_answers(self):
+        key = AnswerKey([(7, '', 5, 'a'), (8, 'AB', 10, 'b'), (9, 'C', 20, 'c')])
+        graded = key.grade({'7': 'A', 8: 'AB', '9': 'C'})
+        self.assertEqual(graded['results'], {'7': False, '8': True, '9': True})
+        self.assertEqual(graded['quiz_points'], 30)
+        self.assertEqual(graded['correct_answers'], 2)
+        self.assertEqual([item['quiz_id'] for item in key.feedback(graded['results'])], [7, 8, 9])
+
+    def test_quiz_edit_replaces_cached_key(self):
+        module = TrainingModule.objects.create(title='Modul', description='Modul', order=1)
+        quiz = TrainingQuiz.objects.create(
+            module=module, question='Q', option_a='a', option_b='b', option_c='c', option_d='d',
+            correct_answer='A', points=10
+        )
+        self.assertEqual(get_answer_key(module.id).correct, ('A',))
+        # An edit in another process only reaches this one through the database
+        TrainingQuiz.objects.filter(pk=quiz.pk).update(correct_answer='B')
+        TrainingCatalogVersion.bump()
+        self.assertEqual(get_answer_key(module.id).correct, ('B',))
+
+
+class WorkerLeaseTest(TestCase):
+    """Live processes never share an order ID worker number"""
+
+    def test_leases_are_exclusive(self):
+        first = WorkerLease('host-a:1')
+        second = WorkerLease('host-a:129')
+        self.assertNotEqual(first.get(), second.get())
+        # Renewing keeps the number
+        self.assertEqual(WorkerLease('host-a:1').get(), first.worker_id)
+
+
+class RatingSummaryEditTest(TestCase):
+    """Edited ratings move the summary by the difference"""
+
+    def setUp(self):
+        self.driver = create_driver()
+        self.other = create_driver(email='other@test.com', nik='6543210987654321')
+        self.pelanggan = Pelanggan.objects.create(nama='P', no_hp='0812', email='p@test.com', alamat='Jakarta')
+
+    def rate(self, driver, rating):
+        return RatingDriver.objects.create(id_driver=driver, id_pelanggan=self.pelanggan, rating=rating, ulasan='ok')
+
+    def test_edit_rating(self):
+        self.rate(self.driver, 5)
+        rating = self.rate(self.driver, 2)
+        rating.rating = 4
+        rating.save()
+
+        summary = DriverRatingSummary.objects.get(driver=self.driver)
+        self.assertEqual((summary.rating_count, summary.rating_sum), (2, 9))
+        self.assertEqual(summary.get_histogram(), {1: 0, 2: 0, 3: 0, 4: 1, 5: 1})
+
+    def test_move_rating_to_other_driver(self):
+        rating = self.rate(self.driver, 3)
+        rating.id_driver = self.other
+        rating.save()
+
+        self.assertEqual(DriverRatingSummary.objects.get(driver=self.driver).rating_count, 0)
+        other = DriverRatingSummary.objects.get(driver=self.other)
+        self.assertEqual((other.rating_count, other.rating_sum, other.count_3), (1, 3, 1))
+
+    def test_bulk_and_cascade_deletes(self):
+        self.rate(self.driver, 5)
+        low = self.rate(self.driver, 1)
+        RatingDriver.objects.filter(pk=low.pk).delete()
+        summary = DriverRatingSummary.objects.get(driver=self.driver)
+        self.assertEqual((summary.rating_count, summary.rating_sum, summary.count_1), (1, 5, 0))
+
+        # Deleting the customer cascades to the ratings
+        self.pelanggan.delete()
+        summary.refresh_from_db()
+        self.assertEqual((summary.rating_count, summary.rating_sum, summary.count_5), (0, 0, 0))
+
+
+class BlobContentTypeTest(TestCase):
+    """Photos keep the content type they were uploaded with"""
+
+    PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 16
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = BlobStore(tmp.name)
+
+    def test_data_url_type_is_stored(self):
+        value = 'data:image/webp;base64,' + base64.b64encode(b'not really webp').decode()
+        ref = self.store.put_base64(value)
+        self.assertEqual(self.store.content_type(ref), 'image/webp')
+        self.assertEqual(self.store.get_data_url(ref), value)
+
+    def test_png_without_prefix_is_sniffed(self):
+        ref = self.store.put_base64(base64.b64encode(self.PNG).decode())
+        self.assertEqual(self.store.content_type(ref), 'image/png')
+        self.assertTrue(self.store.get_data_url(ref).startswith('data:image/png;base64,'))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'presence': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'presence-test'},
+})
+class CachePresenceRegistryTest(TestCase):
+    """Per-driver presence entries with a per-kota index"""
+
+    def setUp(self):
+        self.registry = CachePresenceRegistry('presence', ttl=20)
+        self.registry.cache.clear()
+
+    def online_ids(self, kota=None, status=None):
+        return sorted(entry['driver_id'] for entry in self.registry.online(kota=kota, status=status))
+
+    def test_heartbeats_by_kota_and_status(self):
+        self.registry.heartbeat(1, 'Jakarta')
+        self.registry.heartbeat(2, 'Jakarta', 'busy')
+        self.registry.heartbeat(3, 'Bandung')
+        self.assertEqual(self.online_ids('Jakarta'), [1, 2])
+        self.assertEqual(self.online_ids(status='online'), [1, 3])
+        self.assertEqual(self.registry.get(2)['status'], 'busy')
+
+    def test_moved_and_removed_drivers(self):
+        self.registry.heartbeat(1, 'Jakarta')
+        self.registry.heartbeat(2, 'Jakarta')
+        self.registry.heartbeat(1, 'Bandung')
+        self.registry.remove(2)
+        self.assertEqual(self.online_ids('Jakarta'), [])
+        self.assertEqual(self.online_ids('Bandung'), [1])
+        # The next join prunes the Jakarta index
+        self.registry.heartbeat(3, 'Jakarta')
+        self.assertEqual(self.registry.cache.get(self.registry.kota_key('Jakarta')), {3})
+
+
+class FlakyDispatchClient(DispatchClient):
+    """driver-service stand-in that is down for /down and up for the rest"""
+
+    def __init__(self, **kwargs):
+        super().__init__('http://driver-service.test', breaker=CircuitBreaker(reset_timeout=0), **kwargs)
+        self.sent = []
+
+    def post(self, path, payload):
+        if path == '/down':
+            raise DispatchError(f'{path} unreachable')
+        self.sent.append(payload)
+        return True
+
+
+class DispatchOutboxTest(TestCase):
+    """A message that keeps failing neither blocks the outbox nor stays forever.
+
+    The outbox is an in-memory deque, a new client (as after a restart)
+    starts empty.
+    """
+
+    def test_failing_message_moves_back_and_is_dropped(self):
+        client = FlakyDispatchClient(outbox_max_attempts=2)
+        for path, payload in [('/down', 'a'), ('/up', 'b')]:
+            client.outbox.append(QueuedMessage(path, payload))
+
+        self.assertFalse(client._deliver_next())
+        self.assertEqual([message.payload for message in client.outbox], ['b', 'a'])
+        self.assertTrue(client._deliver_next())
+        self.assertEqual(client.sent, ['b'])
+        # Second failure drops it
+        self.assertTrue(client._deliver_next())
+        self.assertEqual(len(client.outbox), 0)
+        self.assertEqual(len(FlakyDispatchClient().outbox), 0)
+
+
+class FakeFuture:
+    def __init__(self, error):
+        self.error = error
+
+    def get(self, timeout=None):
+        if self.error:
+            raise self.error
+
+
+class FakeProducer:
+    """Kafka producer stand-in, topics in down_topics are not acknowledged"""
+
+    def __init__(self, down_topics=()):
+        self.down_topics = set(down_topics)
+        self.sent = []
+        self.atomic_depth = len(connection.savepoint_ids)
+
+    def send(self, topic, key=None, value=None):
+        self.sent.append(value)
+        return FakeFuture(RuntimeError('broker down') if topic in self.down_topics else None)
+
+    def flush(self, timeout=None):
+        # No transaction of the relay may be open while waiting for the broker
+        assert len(connection.savepoint_ids) == self.atomic_depth
+
+
+class RelayBatchTest(TestCase):
+    """Failed messages are retried a limited number of times"""
+
+    def setUp(self):
+        self.good = OutboxMessage.objects.create(topic='good', payload={'n': 1})
+        self.bad = OutboxMessage.objects.create(topic='bad', payload={'n': 2})
+
+    def test_failed_message_is_given_up(self):
+        producer = FakeProducer(down_topics=['bad'])
+        self.assertEqual(relay_batch(producer, max_attempts=2, retry_delay=0), (1, 1))
+        self.assertEqual(relay_batch(producer, max_attempts=2, retry_delay=0), (0, 1))
+        # Given up, no longer claimed
+        self.assertEqual(relay_batch(producer, max_attempts=2, retry_delay=0), (0, 0))
+
+        self.bad.refresh_from_db()
+        self.assertEqual(self.bad.attempts, 2)
+        self.assertIsNotNone(self.bad.failed_at)
+        self.assertIsNone(self.bad.published_at)
+        self.good.refresh_from_db()
+        self.assertIsNotNone(self.good.published_at)
+
+    def test_failed_message_waits_for_retry_delay(self):
+        producer = FakeProducer(down_topics=['bad'])
+        relay_batch(producer, retry_delay=60)
+        self.assertEqual(relay_batch(producer, retry_delay=60), (0, 0))
+
+
+class MissedEventsTest(TestCase):
+    """Replay limits count only the events the client asked for"""
+
+    def test_filters_before_limit(self):
+        first = OutboxMessage.objects.create(topic=ORDER_EVENTS_TOPIC, payload={'kota': 'A', 'order_id': 'o0'})
+        OutboxMessage.objects.bulk_create([
+            OutboxMessage(topic=ORDER_EVENTS_TOPIC, payload={'kota': 'A', 'order_id': f'o{i}'})
+            for i in range(1, REPLAY_LIMIT + 5)
+        ])
+        wanted = OutboxMessage.objects.create(topic=ORDER_EVENTS_TOPIC, payload={'kota': 'B', 'order_id': 'x1'})
+
+        self.assertEqual([event['id'] for event in missed_events(first.id, kota='B')], [wanted.id])
+        self.assertEqual([event['id'] for event in missed_events(first.id, order_ids={'x1'})], [wanted.id])
+
+
+class OrderUpdatesOverlapTest(TestCase):
+    """Polls repeat recent changes that may have committed late"""
+
+    def test_late_commit_is_listed_again(self):
+        order = Order.objects.create(
+            order_id='order_late', barang='Barang', pickup='A',
+            tujuan='B', kota='Kota Late', status='menunggu_driver'
+        )
+        stamped = timezone.now() - timedelta(seconds=30)
+        Order.objects.filter(pk=order.pk).update(updated_at=stamped)
+
+        # A poll that already moved 3 seconds past the stamp still lists it
+        since = (stamped + timedelta(seconds=3)).isoformat()
+        data = self.client.get('/api/orders/', {'kota': 'Kota Late', 'updated_since': since}).json()
+        self.assertEqual([o['order_id'] for o in data['orders']], ['order_late'])
+        self.assertGreater(data['updated_until'], since)
+
+        # Outside the overlap window it is not
+        since = (stamped + timedelta(seconds=60)).isoformat()
+        data = self.client.get('/api/orders/', {'kota': 'Kota Late', 'updated_since': since}).json()
+        self.assertEqual(data['orders'], [])
+
+
+class DriverStatsCacheTest(TestCase):
+    """Cached statistics follow bulk changes and deletes, photos are not cached"""
+
+    def setUp(self):
+        cache.clear()
+        self.driver = create_driver()
+        user = User.objects.create_user(username=self.driver.email, email=self.driver.email, password='secret')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        pelanggan = Pelanggan.objects.create(nama='P', no_hp='0812', email='p@test.com', alamat='Jakarta')
+        self.sales_order = SalesOrder.objects.create(
+            id_pelanggan=pelanggan, tanggal_order=timezone.now(), total_harga_order=1000,
+            alamat_pengiriman='Jakarta', status='selesai'
+        )
+        self.armada = Armada.objects.create(
+            nomor_polisi='B 1 AB', jenis_armada='Truk', kapasitas_muatan=1000, warna_armada='Merah',
+            id_stnk='STNK', tahun_pembuatan=timezone.now(), id_bpkb='BPKB'
+        )
+
+    def trip(self, status='completed'):
+        return DeliveryOrder.objects.create(
+            id_sales_order=self.sales_order, id_armada=self.armada, id_driver=self.driver,
+            tanggal_kirim=timezone.now(), gps_log=[], status=status
+        )
+
+    def total_trips(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get('/api/drivers/statistics/')
+        return response.json()['total_trips']
+
+    def test_bulk_update_and_delete(self):
+        trip = self.trip(status='pending')
+        self.assertEqual(self.total_trips(), 0)
+        self.assertNotIn('foto_profil', get_driver_stats(self.driver.id_driver))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DeliveryOrder.objects.filter(pk=trip.pk).update(status='completed')
+        self.assertEqual(self.total_trips(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DeliveryOrder.objects.filter(pk=trip.pk).delete()
+        self.assertEqual(self.total_trips(), 0)
+
+
+class DriverListPaginationTest(TestCase):
+    """Keyset pages of the driver listing and ?fields= projection"""
+
+    def setUp(self):
+        admin = User.objects.create_user(username='admin', email='admin@test.com', password='secret', is_staff=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=admin).key}')
+        drivers = [create_driver(email=f'driver{i}@test.com', nik=f'{i:016d}') for i in range(5)]
+        # Ties on wkt_daftar across a page boundary are decided by id_driver
+        same_time = timezone.now() - timedelta(days=1)
+        Driver.objects.filter(pk__in=[d.pk for d in drivers[1:4]]).update(wkt_daftar=same_time)
+
+    def test_pages_cover_every_driver_once(self):
+        ids = []
+        url = '/api/drivers/?page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data['results']), 2)
+            ids.extend(row['id_driver'] for row in data['results'])
+            url = data['next']
+        expected = list(Driver.objects.order_by('-wkt_daftar', '-id_driver').values_list('id_driver', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_plain_list_without_pagination_params(self):
+        data = self.client.get('/api/drivers/').json()
+        self.assertEqual(len(data), 5)
+        self.assertNotIn('foto_ktp', data[0])
+
+    def test_fields_projection(self):
+        data = self.client.get('/api/drivers/?page_size=10&fields=id_driver,nama').json()
+        self.assertEqual(set(data['results'][0]), {'id_driver', 'nama'})
+        self.assertEqual(self.client.get('/api/drivers/?fields=id_driver,password').status_code, 400)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/drivers/?cursor=bm90LWEtY3Vyc29y').status_code, 404)
+
+
+class DashboardPhotoTest(TestCase):
+    """Dashboard pages without photos, photos served one by one with an ETag"""
+
+    PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 16
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(blobstore, '_default_store', BlobStore(tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        admin = User.objects.create_superuser(username='admin', email='admin@test.com', password='secret')
+        self.client.force_login(admin)
+        self.driver = create_driver(foto_ktp=base64.b64encode(self.PNG).decode())
+        create_driver(email='other@test.com', nik='2234567890123456', status='pending')
+
+    def test_dashboard_filters_and_defers_photos(self):
+        response = self.client.get('/dashboard/?status=active')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_drivers'], 1)
+        listed = response.context['page'].object_list[0]
+        self.assertTrue(set(Driver.PHOTO_FIELDS) <= listed.get_deferred_fields())
+
+    def test_photo_etag_and_not_modified(self):
+        url = f'/dashboard/drivers/{self.driver.id_driver}/photo/foto_ktp/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(b''.join(response), self.PNG)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_missing_and_unknown_photo(self):
+        base = f'/dashboard/drivers/{self.driver.id_driver}/photo/'
+        self.assertEqual(self.client.get(base + 'foto_sim/').status_code, 404)
+        self.assertEqual(self.client.get(base + 'password/').status_code, 404)
+
+
+class DriverTripsTest(TestCase):
+    """Trip history as keyset pages or as a streamed NDJSON export"""
+
+    def setUp(self):
+        self.driver = create_driver()
+        user = User.objects.create_user(username=self.driver.email, email=self.driver.email, password='secret')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        pelanggan = Pelanggan.objects.create(nama='Pelanggan', no_hp='0812', email='p@test.com', alamat='Jakarta')
+        sales_order = SalesOrder.objects.create(
+            id_pelanggan=pelanggan, tanggal_order=timezone.now(), total_harga_order=1000,
+            alamat_pengiriman='Jakarta', status='selesai'
+        )
+        armada = Armada.objects.create(
+            nomor_polisi='B 1 AB', jenis_armada='Truk', kapasitas_muatan=1000, warna_armada='Merah',
+            id_stnk='STNK', tahun_pembuatan=timezone.now(), id_bpkb='BPKB'
+        )
+        same_time = timezone.now() - timedelta(days=1)
+        for i, status in enumerate(['completed', 'completed', 'completed', 'completed', 'pending']):
+            DeliveryOrder.objects.create(
+                id_sales_order=sales_order, id_armada=armada, id_driver=self.driver,
+                tanggal_kirim=same_time if i < 3 else timezone.now(), gps_log=[], status=status
+            )
+        self.expected = list(
+            DeliveryOrder.objects.filter(status__in=COMPLETED_TRIP_STATUSES)
+            .order_by('-tanggal_kirim', '-id_delivery_order').values_list('id_delivery_order', flat=True)
+        )
+
+    def test_pages_follow_the_cursor(self):
+        ids = []
+        url = '/api/drivers/trips/?page_size=2'
+        while url:
+            data = self.client.get(url).json()
+            ids.extend(trip['id_delivery_order'] for trip in data['results'])
+            url = data['next']
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(data['results'][-1]['pelanggan'], 'Pelanggan')
+
+    def test_plain_list(self):
+        data = self.client.get('/api/drivers/trips/').json()
+        self.assertEqual([trip['id_delivery_order'] for trip in data], self.expected)
+
+    def test_ndjson_export(self):
+        response = self.client.get('/api/drivers/trips/?export=ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id_delivery_order'] for line in lines], self.expected)
+
+
+class OrphanedUsersTest(TestCase):
+    """Users without drivers and drivers without users, found in the database"""
+
+    def setUp(self):
+        admin = User.objects.create_user(username='admin', email='admin@test.com', password='secret', is_staff=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=admin).key}')
+        driver = create_driver()
+        User.objects.create_user(username=driver.email, email=driver.email, password='secret')
+        create_driver(email='nouser@test.com', nik='2234567890123456')
+        self.orphans = [
+            User.objects.create_user(username=f'orphan{i}', email=f'orphan{i}@test.com', password='secret')
+            for i in range(3)
+        ]
+        Token.objects.create(user=self.orphans[0])
+
+    def test_check_sync_counts_and_pages(self):
+        data = self.client.get('/api/admin/check-sync/?page=2&page_size=2').json()
+        self.assertEqual(data['orphaned_users_count'], 3)
+        self.assertEqual([row['email'] for row in data['orphaned_users']], ['orphan2@test.com'])
+        self.assertEqual(data['drivers_without_users_count'], 1)
+        self.assertEqual(data['drivers_without_users'], [])
+        self.assertFalse(data['is_synchronized'])
+
+    def test_cleanup_in_batches(self):
+        deleted_count, sample = delete_orphaned_users(batch_size=2, sample_size=2)
+        self.assertEqual((deleted_count, sample), (3, ['orphan0@test.com', 'orphan1@test.com']))
+        self.assertFalse(User.objects.filter(username__startswith='orphan').exists())
+        self.assertFalse(Token.objects.filter(user_id=self.orphans[0].pk).exists())
+        # Staff users and users with a driver are kept
+        self.assertEqual(User.objects.count(), 2)
+
+
+class BulkDriverStatusTest(TestCase):
+    """Bulk status changes run chunk by chunk and publish one event"""
+
+    def setUp(self):
+        admin = User.objects.create_user(username='admin', email='admin@test.com', password='secret', is_staff=True)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=admin).key}')
+        statuses = ['pending', 'pending', 'active', 'training', 'pending']
+        self.drivers = [
+            create_driver(email=f'driver{i}@test.com', nik=f'{i:016d}', status=status)
+            for i, status in enumerate(statuses)
+        ]
+        self.ids = [driver.id_driver for driver in self.drivers]
+
+    def test_chunks_and_changed_rows(self):
+        with self.assertNumQueries(3):
+            changed = Driver.bulk_set_status(self.ids + self.ids[:1], 'active', chunk_size=2)
+        # The driver that was already active is not returned
+        self.assertEqual(sorted(changed), sorted((d.id_driver, d.email) for d in self.drivers if d.status != 'active'))
+        self.assertEqual(set(Driver.objects.values_list('status', flat=True)), {'active'})
+
+    def test_from_status(self):
+        changed = Driver.bulk_set_status(self.ids, 'pending', from_status='training', chunk_size=2)
+        self.assertEqual(changed, [(self.drivers[3].id_driver, self.drivers[3].email)])
+
+    def test_bulk_action_sends_one_event(self):
+        response = self.client.post('/api/drivers/bulk_suspend/', {'driver_ids': self.ids[:3]}, format='json')
+        self.assertEqual(sorted(response.json()['driver_ids']), self.ids[:3])
+        events = list(OutboxMessage.objects.filter(topic='driver_events'))
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0].payload['event_type'], 'drivers_suspended')
+        self.assertEqual(sorted(events[0].payload['driver_ids']), self.ids[:3])
+
+        response = self.client.post('/api/drivers/bulk_suspend/', {'driver_ids': self.ids[:3]}, format='json')
+        self.assertEqual(response.json()['driver_ids'], [])
+        self.assertEqual(OutboxMessage.objects.filter(topic='driver_events').count(), 1)
+
+    def test_invalid_driver_ids(self):
+        response = self.client.post('/api/drivers/bulk_suspend/', {'driver_ids': 'all'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class GeoIndexTest(TestCase):
+    """Ring search returns the same drivers as scanning every position"""
+
+    def setUp(self):
+        rng = random.Random(16)
+        self.index = GeoIndex(ttl=60)
+        self.positions = {}
+        for driver_id in range(300):
+            lat, lng = -6.2 + rng.uniform(-0.2, 0.2), 106.8 + rng.uniform(-0.2, 0.2)
+            self.index.update(driver_id, lat, lng)
+            self.positions[driver_id] = (lat, lng)
+        self.point = (-6.21, 106.83)
+
+    def brute_force(self, k, max_km=None, allowed_ids=None):
+        pairs = sorted(
+            (haversine_km(*self.point, lat, lng), driver_id)
+            for driver_id, (lat, lng) in self.positions.items()
+            if allowed_ids is None or driver_id in allowed_ids
+        )
+        return [pair for pair in pairs if max_km is None or pair[0] <= max_km][:k]
+
+    def test_nearest_matches_brute_force(self):
+        self.assertEqual(self.index.nearest(*self.point, k=10), self.brute_force(10))
+        self.assertEqual(self.index.nearest(*self.point, k=500), self.brute_force(500))
+        self.assertEqual(self.index.nearest(*self.point, k=50, max_km=3), self.brute_force(50, max_km=3))
+        allowed = set(range(0, 300, 7))
+        self.assertEqual(
+            self.index.nearest(*self.point, k=5, allowed_ids=allowed), self.brute_force(5, allowed_ids=allowed)
+        )
+
+    def test_moved_removed_and_stale_drivers(self):
+        self.index.update(1, *self.point)
+        self.assertEqual(self.index.nearest(*self.point, k=1), [(0.0, 1)])
+        self.index.update(1, 0.0, 0.0, updated_at=1)  # older update is ignored
+        self.assertEqual(self.index.get(1), self.point)
+
+        self.index.remove(1)
+        self.assertNotIn(1, [driver_id for _, driver_id in self.index.nearest(*self.point, k=300)])
+
+        # Positions older than the TTL are not returned
+        self.index.update(1000, *self.point, updated_at=1)
+        self.assertIsNone(self.index.get(1000))
+        self.assertNotIn(1000, [driver_id for _, driver_id in self.index.nearest(*self.point, k=300)])
+
+
+class TrainingModuleSummaryTest(TestCase):
+    """Module point totals follow content and quiz edits"""
+
+    def setUp(self):
+        self.first = TrainingModule.objects.create(title='Modul 1', description='Modul', order=1)
+        self.second = TrainingModule.objects.create(title='Modul 2', description='Modul', order=2)
+        self.content = TrainingContent.objects.create(module=self.first, title='Materi', content_type='narration', points=10)
+        TrainingContent.objects.create(module=self.first, title='Materi 2', content_type='narration', points=5)
+        self.quiz = TrainingQuiz.objects.create(
+            module=self.first, question='?', option_a='A', option_b='B', option_c='C', option_d='D',
+            correct_answer='A', points=20
+        )
+
+    def totals(self, module):
+        summary = TrainingModuleSummary.objects.get(module=module)
+        return summary.content_count, summary.content_points, summary.quiz_count, summary.quiz_points
+
+    def test_create_and_edit(self):
+        self.assertEqual(self.totals(self.first), (2, 15, 1, 20))
+        self.content.points = 30
+        self.content.save()
+        self.assertEqual(self.totals(self.first), (2, 35, 1, 20))
+
+    def test_move_between_modules(self):
+        self.content.module = self.second
+        self.content.save()
+        self.quiz.module = self.second
+        self.quiz.save()
+        self.assertEqual(self.totals(self.first), (1, 5, 0, 0))
+        self.assertEqual(self.totals(self.second), (1, 10, 1, 20))
+
+    def test_delete(self):
+        self.quiz.delete()
+        self.content.delete()
+        self.assertEqual(self.totals(self.first), (1, 5, 0, 0))
+        self.assertEqual(self.first.get_summary().get_total_points(), 5)
+
+
+class TrainingCatalogTest(TestCase):
+    """The catalog is served with an ETag and changes version on edits"""
+
+    def setUp(self):
+        # Versions restart in every test, drop catalogs built by earlier ones
+        cache.clear()
+        patcher = mock.patch.object(training_catalog, '_local_catalog', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.module = TrainingModule.objects.create(title='Modul 1', description='Modul', order=1)
+        TrainingQuiz.objects.create(
+            module=self.module, question='?', option_a='A', option_b='B', option_c='C', option_d='D',
+            correct_answer='A', explanation='Karena A', points=20
+        )
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get('/api/training/catalog/')
+        self.assertEqual(response.status_code, 200)
+        quiz = response.json()['modules'][0]['quizzes'][0]
+        self.assertNotIn('correct_answer', quiz)
+        self.assertNotIn('explanation', quiz)
+        etag = response['ETag']
+
+        response = self.client.get('/api/training/catalog/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        self.module.title = 'Modul baru'
+        self.module.save()
+        response = self.client.get('/api/training/catalog/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['modules'][0]['title'], 'Modul baru')
+
+    def test_gzip(self):
+        plain = self.client.get('/api/training/catalog/')
+        response = self.client.get('/api/training/catalog/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+        # Either ETag is accepted, whichever encoding the client cached
+        response = self.client.get('/api/training/catalog/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=plain['ETag'])
+        self.assertEqual(response.status_code, 304)
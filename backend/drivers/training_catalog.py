@@ -0,0 +1,92 @@
+import gzip
+import hashlib
+import json
+import threading
+
+from django.db.models import Prefetch
+
+from .cache import get_cached_training_catalog, set_cached_training_catalog
+from .models import TrainingCatalogVersion, TrainingModule, TrainingContent, TrainingQuiz
+from .serializers import TrainingContentSerializer, TrainingModuleSerializer, TrainingQuizSerializer
+
+# Shown to drivers only after grading, see submit_quiz
+HIDDEN_QUIZ_FIELDS = ['correct_answer', 'explanation']
+
+
+class TrainingCatalog:
+    """Prebuilt catalog: the JSON body, its gzip version and their ETags"""
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        # Different bytes need a different strong ETag
+        self.gzip_etag = f'"{digest}-gzip"'
+
+    def matches(self, if_none_match):
+        """True when If-None-Match names either representation"""
+        if not if_none_match:
+            return False
+        tags = {tag.strip() for tag in if_none_match.split(',')}
+        return '*' in tags or bool(tags & {self.etag, self.gzip_etag})
+
+
+def build_catalog_data():
+    """Active modules with their contents and quizzes, without the answers"""
+    modules = (
+        TrainingModule.objects.filter(is_active=True)
+        .order_by('order', 'created_at')
+        .prefetch_related(
+            Prefetch('contents', queryset=TrainingContent.objects.order_by('created_at')),
+            Prefetch('quizzes', queryset=TrainingQuiz.objects.order_by('created_at')),
+        )
+    )
+    catalog = []
+    for module in modules:
+        quizzes = TrainingQuizSerializer(module.quizzes.all(), many=True).data
+        for quiz in quizzes:
+            for field in HIDDEN_QUIZ_FIELDS:
+                quiz.pop(field, None)
+        catalog.append({
+            **TrainingModuleSerializer(module).data,
+            'contents': TrainingContentSerializer(module.contents.all(), many=True).data,
+            'quizzes': quizzes,
+        })
+    return {'modules': catalog}
+
+
+def build_catalog(version):
+    data = build_catalog_data()
+    data['version'] = str(version)
+    body = json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+    return TrainingCatalog(version, body)
+
+
+_local_catalog = None
+_lock = threading.Lock()
+
+
+def get_training_catalog():
+    """Catalog of the current version.
+
+    Lookup order: this process, the shared cache, a fresh build. A request
+    for an unchanged catalog costs one primary key read for the version.
+    """
+    global _local_catalog
+    version = TrainingCatalogVersion.current()
+    catalog = _local_catalog
+    if catalog is not None and catalog.version == version:
+        return catalog
+
+    with _lock:
+        catalog = _local_catalog
+        if catalog is not None and catalog.version == version:
+            return catalog
+        catalog = get_cached_training_catalog(version)
+        if catalog is None:
+            catalog = build_catalog(version)
+            set_cached_training_catalog(version, catalog)
+        _local_catalog = catalog
+    return catalog
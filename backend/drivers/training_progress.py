@@ -0,0 +1,102 @@
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Driver, DriverTrainingProgress, TrainingModule, TrainingModuleSummary
+from .outbox import send_driver_event
+
+UPSERT_BATCH_SIZE = 1000
+
+
+def module_point_totals(module_ids):
+    """{module_id: total points} from the precomputed summaries"""
+    totals = dict(
+        (summary.module_id, summary.get_total_points())
+        for summary in TrainingModuleSummary.objects.filter(module_id__in=module_ids)
+    )
+    missing = set(module_ids) - set(totals)
+    if missing:
+        TrainingModuleSummary.refresh(missing)
+        for summary in TrainingModuleSummary.objects.filter(module_id__in=missing):
+            totals[summary.module_id] = summary.get_total_points()
+    return totals
+
+
+def complete_training_for(driver_ids, batch_size=UPSERT_BATCH_SIZE):
+    """Mark every active module as completed for the given drivers.
+
+    One INSERT ... ON CONFLICT DO UPDATE ... WHERE NOT is_completed per batch
+    inserts missing progress rows and completes unfinished ones with full
+    points from the module summaries. Rows that are already completed, also
+    by a finish_training() running at the same time, keep their points and
+    completion time. Returns the number of rows written.
+    """
+    driver_ids = list(dict.fromkeys(driver_ids))
+    module_ids = list(TrainingModule.objects.filter(is_active=True).values_list('id', flat=True))
+    if not driver_ids or not module_ids:
+        return 0
+
+    qn = connection.ops.quote_name
+    meta = DriverTrainingProgress._meta
+    table = qn(meta.db_table)
+    columns = [
+        'driver', 'module', 'completed_contents', 'quiz_answers', 'quiz_results',
+        'current_points', 'total_points', 'is_completed', 'completed_at', 'started_at',
+    ]
+    column_names = [qn(meta.get_field(name).column) for name in columns]
+    driver_column, module_column = column_names[:2]
+    updated = column_names[5:9]  # points, is_completed, completed_at
+    is_completed = qn(meta.get_field('is_completed').column)
+    sql_prefix = f"INSERT INTO {table} ({', '.join(column_names)}) VALUES "
+    sql_suffix = (
+        f" ON CONFLICT ({driver_column}, {module_column}) DO UPDATE SET "
+        + ', '.join(f'{column} = EXCLUDED.{column}' for column in updated)
+        + f" WHERE NOT {table}.{is_completed} RETURNING {qn(meta.pk.column)}"
+    )
+    row_sql = f"({', '.join(['%s'] * len(columns))})"
+
+    totals = module_point_totals(module_ids)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    pairs = [(driver_id, module_id) for driver_id in driver_ids for module_id in module_ids]
+    written = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(pairs), batch_size):
+            chunk = pairs[start:start + batch_size]
+            params = []
+            for driver_id, module_id in chunk:
+                total = totals.get(module_id, 0)
+                params.extend([driver_id, module_id, '[]', '{}', '{}', total, total, True, now, now])
+            cursor.execute(sql_prefix + ', '.join([row_sql] * len(chunk)) + sql_suffix, params)
+            written += len(cursor.fetchall())
+    return written
+
+
+def incomplete_modules(driver_id):
+    """Active modules without a completed progress row of the driver"""
+    return TrainingModule.objects.filter(is_active=True).filter(
+        ~Exists(DriverTrainingProgress.objects.filter(
+            driver_id=driver_id, module=OuterRef('pk'), is_completed=True
+        ))
+    )
+
+
+def has_completed_training(driver_id):
+    """One NOT EXISTS query instead of counting modules and progress rows"""
+    return not incomplete_modules(driver_id).exists()
+
+
+def finish_training(driver):
+    """Move a training driver to pending once every active module is completed.
+
+    The check and the status change are a single conditional UPDATE, so
+    concurrent calls change the driver once and a driver that is not done
+    (or already moved) costs no write. Returns True if the status changed.
+    """
+    updated = Driver.objects.filter(
+        pk=driver.pk, status='training'
+    ).filter(~Exists(incomplete_modules(driver.pk))).update(status='pending')
+    if not updated:
+        return False
+    driver.status = 'pending'
+    send_driver_event('training_completed', driver.id_driver)
+    return True
@@ -0,0 +1,44 @@
+from django.db.models import Count, Sum
+
+
+def module_totals(content_model, quiz_model, module_ids=None):
+    """{module_id: totals} from two aggregate queries, modules without rows are missing"""
+    totals = {}
+    for model, prefix in ((content_model, 'content'), (quiz_model, 'quiz')):
+        rows = model.objects.all()
+        if module_ids is not None:
+            rows = rows.filter(module_id__in=module_ids)
+        for row in rows.values('module_id').annotate(count=Count('id'), points=Sum('points')).order_by():
+            entry = totals.setdefault(row['module_id'], {})
+            entry[f'{prefix}_count'] = row['count']
+            entry[f'{prefix}_points'] = row['points'] or 0
+    return totals
+
+
+def rebuild_training_summaries(module_model, content_model, quiz_model, summary_model, module_ids=None):
+    """Recompute TrainingModuleSummary rows from contents and quizzes.
+
+    Takes the model classes as arguments so migrations can pass historical models.
+    Returns the number of summaries written.
+    """
+    modules = module_model.objects.all()
+    if module_ids is not None:
+        modules = modules.filter(id__in=module_ids)
+
+    module_ids = list(modules.values_list('id', flat=True))
+    totals = module_totals(content_model, quiz_model, module_ids)
+    new_summaries = [
+        summary_model(module_id=module_id, **totals.get(module_id, {}))
+        for module_id in module_ids
+    ]
+
+    # Upsert instead of delete + insert, concurrent refreshes of one module
+    # (two admin saves) would otherwise clash on the module key
+    summary_model.objects.bulk_create(
+        new_summaries,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['module'],
+        update_fields=['content_count', 'content_points', 'quiz_count', 'quiz_points', 'updated_at'],
+    )
+    return len(new_summaries)
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DriverViewSet, VehicleViewSet, ArmadaViewSet, SalesOrderViewSet, DeliveryOrderViewSet, RiwayatPerjalananViewSet, PembayaranFeeViewSet, ArmadaDeliveryorderViewSet, DriverArmadaViewSet, UserProfileView, register_driver, login_driver, check_driver_status, TrainingModuleViewSet, TrainingContentViewSet, TrainingQuizViewSet, DriverTrainingProgressViewSet, complete_training, create_driver_account, update_rejected_documents, complete_rejected_documents, cleanup_orphaned_users, check_database_sync, get_driver_statistics, get_driver_trips
+from .views import DriverViewSet, VehicleViewSet, ArmadaViewSet, SalesOrderViewSet, DeliveryOrderViewSet, RiwayatPerjalananViewSet, PembayaranFeeViewSet, ArmadaDeliveryorderViewSet, DriverArmadaViewSet, UserProfileView, register_driver, login_driver, logout_driver, driver_heartbeat, get_online_drivers, check_driver_status, TrainingModuleViewSet, TrainingContentViewSet, TrainingQuizViewSet, DriverTrainingProgressViewSet, complete_training, training_catalog, create_driver_account, update_rejected_documents, complete_rejected_documents, cleanup_orphaned_users, check_database_sync, get_driver_statistics, get_driver_trips
 from .authentication import CustomAuthToken, AdminAuthToken
 import driver_api
 router = DefaultRouter()
@@ -27,10 +27,14 @@ urlpatterns = [
     # Driver registration and status endpoints
     path('drivers/register/', register_driver, name='register_driver'),
     path('drivers/login/', login_driver, name='login_driver'),
+    path('drivers/logout/', logout_driver, name='logout_driver'),
+    path('drivers/heartbeat/', driver_heartbeat, name='driver_heartbeat'),
+    path('drivers/online/', get_online_drivers, name='get_online_drivers'),
     path('drivers/status/', check_driver_status, name='check_driver_status'),
     path('drivers/update-documents/', update_rejected_documents, name='update_rejected_documents'),
     path('drivers/complete-documents/', complete_rejected_documents, name='complete_rejected_documents'),
     path('training/complete/', complete_training, name='complete_training'),
+    path('training/catalog/', training_catalog, name='training_catalog'),
     path('auth/create-driver/', create_driver_account, name='create_driver_account'),
     path('drivers/statistics/', get_driver_statistics, name='get_driver_statistics'),
     path('drivers/trips/', get_driver_trips, name='get_driver_trips'),
@@ -44,6 +48,7 @@ urlpatterns = [
     path('order/confirmed/', driver_api.order_confirmed, name='order_confirmed'),
     path('order/response/', driver_api.order_response, name='order_response'),
     path('orders/', driver_api.get_orders, name='get_orders'),
+    path('orders/stream/', driver_api.order_stream, name='order_stream'),
     
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -4,21 +4,37 @@ from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ValidationError, NotFound
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from datetime import datetime
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from datetime import datetime, timezone as dt_timezone
+import json
 from django.utils import timezone
-from .models import Driver, Vehicle, Armada, SalesOrder, DeliveryOrder, RiwayatPerjalanan, PembayaranFee, ArmadaDeliveryorder, DriverArmada, TrainingModule, TrainingContent, TrainingQuiz, DriverTrainingProgress, RatingDriver
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+from .training_catalog import get_training_catalog
+from .quiz_grading import get_answer_key
+from .training_progress import complete_training_for, finish_training, has_completed_training, incomplete_modules
+from .models import Driver, Vehicle, Armada, SalesOrder, DeliveryOrder, RiwayatPerjalanan, PembayaranFee, ArmadaDeliveryorder, DriverArmada, TrainingModule, TrainingContent, TrainingQuiz, TrainingModuleSummary, DriverTrainingProgress, RatingDriver, DriverRatingSummary, COMPLETED_TRIP_STATUSES
 from .serializers import DriverSerializer, VehicleSerializer, ArmadaSerializer, SalesOrderSerializer, DeliveryOrderSerializer, RiwayatPerjalananSerializer, PembayaranFeeSerializer, ArmadaDeliveryorderSerializer, DriverArmadaSerializer, TrainingModuleSerializer, TrainingContentSerializer, TrainingQuizSerializer, DriverTrainingProgressSerializer
 from .permissions import IsAdminOrDriverOwner, IsAdminOnly
-def send_driver_event(event_type, driver_id):
-    print(f"Event: {event_type} for driver {driver_id}")
+from .pagination import DriverKeysetPagination, TripKeysetPagination
+from .blobstore import get_blob_store
+from .cache import get_driver_stats, set_driver_stats
+from .auth_backends import get_request_driver, get_request_driver_id, revoke_tokens
+from .outbox import send_driver_event, send_driver_batch_event
+from .presence import get_presence_registry, presence_ttl, PRESENCE_STATUSES
+from .geo import record_location
+from .sync import orphaned_users, drivers_without_users, delete_orphaned_users, SYNC_SAMPLE_PAGE_SIZE, SYNC_SAMPLE_MAX_PAGE_SIZE
 
 class DriverViewSet(viewsets.ModelViewSet):
     queryset = Driver.objects.all()
     serializer_class = DriverSerializer
     permission_classes = [IsAdminOrDriverOwner]
+    pagination_class = DriverKeysetPagination
     
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -43,8 +59,41 @@ class DriverViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         if self.request.user.is_staff:
-            return Driver.objects.all()
-        return Driver.objects.filter(email=self.request.user.email)
+            queryset = Driver.objects.all()
+        else:
+            queryset = Driver.objects.filter(email=self.request.user.email)
+        
+        fields = self.get_requested_fields()
+        if fields is not None:
+            # wkt_daftar is always loaded because the pagination cursor needs it
+            queryset = queryset.only(*(set(fields) | {'id_driver', 'wkt_daftar'}))
+        elif self.action == 'list':
+            # Photos are read from the blob store, list them only when asked
+            # for with ?fields=, otherwise use retrieve
+            queryset = queryset.defer(*Driver.PHOTO_FIELDS)
+        return queryset
+    
+    def get_requested_fields(self):
+        """Parse ?fields=id_driver,nama,status for list/retrieve"""
+        if self.action not in ['list', 'retrieve']:
+            return None
+        param = self.request.query_params.get('fields')
+        if not param:
+            return None
+        fields = [f.strip() for f in param.split(',') if f.strip()]
+        allowed = {f.name for f in Driver._meta.concrete_fields}
+        unknown = [f for f in fields if f not in allowed]
+        if unknown:
+            raise ValidationError({'fields': f'Unknown fields: {", ".join(unknown)}'})
+        return fields
+    
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        elif self.action == 'list':
+            kwargs.setdefault('exclude', Driver.PHOTO_FIELDS)
+        return super().get_serializer(*args, **kwargs)
     
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -60,6 +109,7 @@ class DriverViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.data)
     
+    @transaction.atomic
     def perform_create(self, serializer):
         # Create user account for new driver
         from django.contrib.auth.models import User
@@ -78,10 +128,12 @@ class DriverViewSet(viewsets.ModelViewSet):
         driver = serializer.save(status='pending')
         send_driver_event('driver_created', driver.id_driver)
     
+    @transaction.atomic
     def perform_update(self, serializer):
         driver = serializer.save()
         send_driver_event('driver_updated', driver.id_driver)
     
+    @transaction.atomic
     def perform_destroy(self, instance):
         driver_id = instance.id_driver
         driver_email = instance.email
@@ -94,7 +146,7 @@ class DriverViewSet(viewsets.ModelViewSet):
             user = User.objects.get(email=driver_email)
             print(f"Found user account for {driver_email}, deleting...")
             # Delete auth tokens first
-            tokens_deleted = Token.objects.filter(user=user).delete()
+            tokens_deleted = revoke_tokens(Token.objects.filter(user=user))
             print(f"Deleted {tokens_deleted[0]} tokens")
             # Then delete the user
             user.delete()
@@ -119,6 +171,7 @@ class DriverViewSet(viewsets.ModelViewSet):
         send_driver_event('driver_deleted', driver_id)
     
     @action(detail=True, methods=['post'], permission_classes=[IsAdminOnly])
+    @transaction.atomic
     def activate(self, request, pk=None):
         driver = self.get_object()
         driver.status = 'active'
@@ -127,6 +180,7 @@ class DriverViewSet(viewsets.ModelViewSet):
         return Response({'status': 'activated'})
     
     @action(detail=True, methods=['post'], permission_classes=[IsAdminOnly])
+    @transaction.atomic
     def suspend(self, request, pk=None):
         driver = self.get_object()
         driver.status = 'suspended'
@@ -135,6 +189,7 @@ class DriverViewSet(viewsets.ModelViewSet):
         return Response({'status': 'suspended'})
     
     @action(detail=True, methods=['post'], permission_classes=[IsAdminOnly])
+    @transaction.atomic
     def accept(self, request, pk=None):
         driver = self.get_object()
         if driver.status == 'pending':
@@ -144,31 +199,57 @@ class DriverViewSet(viewsets.ModelViewSet):
             return Response({'status': 'accepted and activated'})
         return Response({'error': 'Driver is not in pending status'}, status=400)
     
+    def get_bulk_driver_ids(self, request):
+        driver_ids = request.data.get('driver_ids', [])
+        if not isinstance(driver_ids, list):
+            raise ValidationError({'driver_ids': 'Must be a list of driver IDs'})
+        try:
+            return [int(driver_id) for driver_id in driver_ids]
+        except (TypeError, ValueError):
+            raise ValidationError({'driver_ids': 'Must be a list of driver IDs'})
+    
+    def apply_bulk_status(self, request, new_status, event_type, from_status=None):
+        """Change status for all requested drivers and publish one batch event"""
+        changed = Driver.bulk_set_status(self.get_bulk_driver_ids(request), new_status, from_status=from_status)
+        driver_ids = [driver_id for driver_id, email in changed]
+        if driver_ids:
+            send_driver_batch_event(event_type, driver_ids)
+        return driver_ids
+    
     @action(detail=False, methods=['post'], permission_classes=[IsAdminOnly])
+    @transaction.atomic
     def bulk_activate(self, request):
-        driver_ids = request.data.get('driver_ids', [])
-        updated = Driver.objects.filter(id_driver__in=driver_ids).update(status='active')
-        for driver_id in driver_ids:
-            send_driver_event('driver_activated', driver_id)
-        return Response({'message': f'{updated} drivers activated'})
+        driver_ids = self.apply_bulk_status(request, 'active', 'drivers_activated')
+        return Response({'message': f'{len(driver_ids)} drivers activated', 'driver_ids': driver_ids})
     
     @action(detail=False, methods=['post'], permission_classes=[IsAdminOnly])
+    @transaction.atomic
     def bulk_suspend(self, request):
-        driver_ids = request.data.get('driver_ids', [])
-        updated = Driver.objects.filter(id_driver__in=driver_ids).update(status='suspended')
-        for driver_id in driver_ids:
-            send_driver_event('driver_suspended', driver_id)
-        return Response({'message': f'{updated} drivers suspended'})
+        driver_ids = self.apply_bulk_status(request, 'suspended', 'drivers_suspended')
+        return Response({'message': f'{len(driver_ids)} drivers suspended', 'driver_ids': driver_ids})
     
     @action(detail=False, methods=['post'], permission_classes=[IsAdminOnly])
+    @transaction.atomic
     def bulk_accept(self, request):
-        driver_ids = request.data.get('driver_ids', [])
-        updated = Driver.objects.filter(id_driver__in=driver_ids, status='pending').update(status='active')
-        for driver_id in driver_ids:
-            send_driver_event('driver_accepted', driver_id)
-        return Response({'message': f'{updated} pending drivers accepted and activated'})
+        driver_ids = self.apply_bulk_status(request, 'active', 'drivers_accepted', from_status='pending')
+        return Response({'message': f'{len(driver_ids)} pending drivers accepted and activated', 'driver_ids': driver_ids})
     
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminOnly])
+    @transaction.atomic
+    def bulk_complete_training(self, request):
+        """Complete all active modules for the drivers, training drivers move to pending"""
+        requested_ids = self.get_bulk_driver_ids(request)
+        existing_ids = list(Driver.objects.filter(id_driver__in=requested_ids).values_list('id_driver', flat=True))
+        progress_count = complete_training_for(existing_ids)
+        driver_ids = self.apply_bulk_status(request, 'pending', 'drivers_training_completed', from_status='training')
+        return Response({
+            'message': f'{len(driver_ids)} drivers completed training',
+            'driver_ids': driver_ids,
+            'progress_updated': progress_count
+        })
+
     @action(detail=True, methods=['post'], permission_classes=[IsAdminOnly])
+    @transaction.atomic
     def update_status(self, request, pk=None):
         """Update driver status with optional rejection reason"""
         driver = self.get_object()
@@ -269,15 +350,14 @@ class DriverArmadaViewSet(viewsets.ModelViewSet):
         if self.request.user.is_staff:
             return DriverArmada.objects.all()
         try:
-            driver = Driver.objects.get(email=self.request.user.email)
-            return DriverArmada.objects.filter(id_driver=driver)
+            return DriverArmada.objects.filter(id_driver_id=get_request_driver_id(self.request))
         except Driver.DoesNotExist:
             return DriverArmada.objects.none()
     
     def create(self, request, *args, **kwargs):
         # Get driver from authenticated user
         try:
-            driver = Driver.objects.get(email=request.user.email)
+            driver = get_request_driver(request)
             
             # Check if driver already has an assignment for this vehicle
             armada_id = request.data.get('id_armada')
@@ -305,7 +385,7 @@ class DriverArmadaViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         # Get driver from authenticated user
         try:
-            driver = Driver.objects.get(email=self.request.user.email)
+            driver = get_request_driver(self.request)
             
             # Check if driver already has an assignment for this vehicle
             armada_id = serializer.validated_data.get('id_armada')
@@ -354,11 +434,14 @@ class UserProfileView(APIView):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@transaction.atomic
 def register_driver(request):
     """Register new driver - save data immediately after photo upload"""
     try:
         data = request.data
-        print(f"Registration data received: {data}")
+        # Photos are large base64 strings, keep them out of the log
+        log_data = {k: v for k, v in data.items() if k not in Driver.PHOTO_FIELDS}
+        print(f"Registration data received: {log_data}")
         email = data.get('email')
         
         # Check if driver already exists
@@ -491,27 +574,76 @@ def login_driver(request):
             'error': 'Invalid credentials'
         }, status=status.HTTP_401_UNAUTHORIZED)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_driver(request):
+    """Logout driver, the token stops working immediately"""
+    if isinstance(request.auth, Token):
+        revoke_tokens(Token.objects.filter(key=request.auth.key))
+    return Response({'message': 'Logout successful'})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def driver_heartbeat(request):
+    """Mark the driver as online, the app calls this every few seconds with its lat/lng"""
+    try:
+        driver = get_request_driver(request)
+        if driver.status != 'active':
+            return Response({'error': 'Akun driver belum aktif'}, status=403)
+        
+        kota = request.data.get('kota') or driver.kota
+        presence_status = request.data.get('status', 'online')
+        if not kota:
+            return Response({'error': 'kota required'}, status=400)
+        if presence_status not in PRESENCE_STATUSES:
+            return Response({'error': f'status must be one of {PRESENCE_STATUSES}'}, status=400)
+        
+        location = record_location(driver.id_driver, request.data)
+        get_presence_registry().heartbeat(driver.id_driver, kota, presence_status, location)
+        return Response({
+            'driver_id': driver.id_driver,
+            'kota': kota,
+            'status': presence_status,
+            'expires_in': presence_ttl()
+        })
+        
+    except Driver.DoesNotExist:
+        return Response({'error': 'Driver not found'}, status=404)
+    except Exception as e:
+        return Response({'error': str(e)}, status=400)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_online_drivers(request):
+    """Online drivers from the presence registry, no database query"""
+    try:
+        drivers = get_presence_registry().online(
+            kota=request.query_params.get('kota'),
+            status=request.query_params.get('status')
+        )
+        drivers.sort(key=lambda entry: entry['last_seen'], reverse=True)
+        return Response({
+            'count': len(drivers),
+            'drivers': [
+                {**entry, 'last_seen': datetime.fromtimestamp(entry['last_seen'], tz=dt_timezone.utc).isoformat()}
+                for entry in drivers
+            ]
+        })
+    except Exception as e:
+        return Response({'error': str(e)}, status=400)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def check_driver_status(request):
     """Check driver status"""
     try:
-        driver = Driver.objects.get(email=request.user.email)
+        driver = get_request_driver(request)
         
         # Check training completion if status is training
         training_completed = False
         if driver.status == 'training':
-            total_modules = TrainingModule.objects.filter(is_active=True).count()
-            completed_modules = DriverTrainingProgress.objects.filter(
-                driver=driver,
-                is_completed=True
-            ).count()
-            training_completed = completed_modules >= total_modules
-            
-            # Update status to pending if training is completed
-            if training_completed:
-                driver.status = 'pending'
-                driver.save()
+            # Moves the driver to pending only if all active modules are completed
+            training_completed = finish_training(driver)
         
         # Parse rejection reason for specific documents
         rejected_documents = []
@@ -556,6 +688,29 @@ class TrainingModuleViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated()]
         return [AllowAny()]
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def training_catalog(request):
+    """Active training modules with contents and quizzes, without answers.
+
+    Prebuilt per catalog version and served gzipped when the client accepts
+    it. Clients send If-None-Match and get 304 while nothing changed.
+    """
+    catalog = get_training_catalog()
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    etag = catalog.gzip_etag if use_gzip else catalog.etag
+    
+    if catalog.matches(request.headers.get('If-None-Match')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(catalog.gzip_body if use_gzip else catalog.body, content_type='application/json')
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = 'no-cache'
+    return response
+
 class TrainingContentViewSet(viewsets.ModelViewSet):
     queryset = TrainingContent.objects.all()
     serializer_class = TrainingContentSerializer
@@ -604,8 +759,7 @@ class DriverTrainingProgressViewSet(viewsets.ModelViewSet):
         if self.request.user.is_staff:
             return DriverTrainingProgress.objects.all()
         try:
-            driver = Driver.objects.get(email=self.request.user.email)
-            return DriverTrainingProgress.objects.filter(driver=driver)
+            return DriverTrainingProgress.objects.filter(driver_id=get_request_driver_id(self.request))
         except Driver.DoesNotExist:
             return DriverTrainingProgress.objects.none()
     
@@ -613,7 +767,7 @@ class DriverTrainingProgressViewSet(viewsets.ModelViewSet):
     def start_module(self, request):
         """Start a training module (authenticated)"""
         try:
-            driver = Driver.objects.get(email=request.user.email)
+            driver = get_request_driver(request)
             module_id = request.data.get('module_id')
             module = TrainingModule.objects.get(id=module_id)
             
@@ -649,10 +803,7 @@ class DriverTrainingProgressViewSet(viewsets.ModelViewSet):
             module_id = request.data.get('module_id')
             module = TrainingModule.objects.get(id=module_id)
             
-            # Calculate total points for the module
-            contents = TrainingContent.objects.filter(module=module)
-            quizzes = TrainingQuiz.objects.filter(module=module)
-            total_points = sum(c.points for c in contents) + sum(q.points for q in quizzes)
+            total_points = module.get_summary().get_total_points()
             
             return Response({
                 'message': 'Module data loaded',
@@ -668,7 +819,7 @@ class DriverTrainingProgressViewSet(viewsets.ModelViewSet):
     def complete_content(self, request):
         """Mark content as completed (authenticated)"""
         try:
-            driver = Driver.objects.get(email=request.user.email)
+            driver = get_request_driver(request)
             module_id = request.data.get('module_id')
             content_id = request.data.get('content_id')
             
@@ -706,13 +857,12 @@ class DriverTrainingProgressViewSet(viewsets.ModelViewSet):
                 completed_contents.append(content_id)
             
             # Calculate current points
-            contents = TrainingContent.objects.filter(id__in=completed_contents)
-            current_points = sum(c.points for c in contents)
+            current_points = TrainingContent.objects.filter(id__in=completed_contents).aggregate(
+                total=Coalesce(Sum('points'), 0)
+            )['total']
             
-            # Calculate total points
-            all_contents = TrainingContent.objects.filter(module_id=module_id)
-            quizzes = TrainingQuiz.objects.filter(module_id=module_id)
-            total_points = sum(c.points for c in all_contents) + sum(q.points for q in quizzes)
+            # Module totals are precomputed
+            total_points = TrainingModuleSummary.for_module(module_id).get_total_points()
             
             progress_percentage = (current_points / total_points * 100) if total_points > 0 else 0
             
@@ -730,7 +880,7 @@ class DriverTrainingProgressViewSet(viewsets.ModelViewSet):
     def submit_quiz(self, request):
         """Submit quiz answers (authenticated)"""
         try:
-            driver = Driver.objects.get(email=request.user.email)
+            driver = get_request_driver(request)
             module_id = request.data.get('module_id')
             answers = request.data.get('answers', {})  # {quiz_id: answer}
             
@@ -739,19 +889,14 @@ class DriverTrainingProgressViewSet(viewsets.ModelViewSet):
                 module_id=module_id
             )
             
-            # Calculate points from quiz
-            quizzes = TrainingQuiz.objects.filter(module_id=module_id)
-            quiz_points = 0
-            correct_answers = 0
-            total_questions = quizzes.count()
+            # Grade against the cached answer key of the module
+            answer_key = get_answer_key(module_id)
+            grade = answer_key.grade(answers)
+            quiz_points = grade['quiz_points']
             
-            for quiz in quizzes:
-                if str(quiz.id) in answers and answers[str(quiz.id)] == quiz.correct_answer:
-                    correct_answers += 1
-                    quiz_points += quiz.points
-            
-            # Update progress with quiz points
+            # Update progress with quiz points, per-question results are kept for analytics
             progress.quiz_answers = answers
+            progress.quiz_results = grade['results']
             progress.current_points += quiz_points
             
             # Check if 100% completion achieved
@@ -764,8 +909,9 @@ class DriverTrainingProgressViewSet(viewsets.ModelViewSet):
             
             return Response({
                 'quiz_points': quiz_points,
-                'correct_answers': correct_answers,
-                'total_questions': total_questions,
+                'correct_answers': grade['correct_answers'],
+                'total_questions': grade['total_questions'],
+                'results': answer_key.feedback(grade['results']),
                 'current_points': progress.current_points,
                 'total_points': progress.total_points,
                 'progress_percentage': progress_percentage,
@@ -783,32 +929,27 @@ class DriverTrainingProgressViewSet(viewsets.ModelViewSet):
             answers = request.data.get('answers', {})  # {quiz_id: answer}
             completed_contents = request.data.get('completed_contents', [])
             
-            # Calculate points from quiz
-            quizzes = TrainingQuiz.objects.filter(module_id=module_id)
-            quiz_points = 0
-            correct_answers = 0
-            total_questions = quizzes.count()
-            
-            for quiz in quizzes:
-                if str(quiz.id) in answers and answers[str(quiz.id)] == quiz.correct_answer:
-                    correct_answers += 1
-                    quiz_points += quiz.points
+            # Grade against the cached answer key of the module
+            answer_key = get_answer_key(module_id)
+            grade = answer_key.grade(answers)
+            quiz_points = grade['quiz_points']
             
             # Calculate total points
-            contents = TrainingContent.objects.filter(id__in=completed_contents)
-            content_points = sum(c.points for c in contents)
+            content_points = TrainingContent.objects.filter(id__in=completed_contents).aggregate(
+                total=Coalesce(Sum('points'), 0)
+            )['total']
             current_points = content_points + quiz_points
             
-            all_contents = TrainingContent.objects.filter(module_id=module_id)
-            all_quizzes = TrainingQuiz.objects.filter(module_id=module_id)
-            total_points = sum(c.points for c in all_contents) + sum(q.points for q in all_quizzes)
+            # Module totals are precomputed
+            total_points = TrainingModuleSummary.for_module(module_id).get_total_points()
             
             progress_percentage = (current_points / total_points * 100) if total_points > 0 else 0
             
             return Response({
                 'quiz_points': quiz_points,
-                'correct_answers': correct_answers,
-                'total_questions': total_questions,
+                'correct_answers': grade['correct_answers'],
+                'total_questions': grade['total_questions'],
+                'results': answer_key.feedback(grade['results']),
                 'current_points': current_points,
                 'total_points': total_points,
                 'progress_percentage': progress_percentage,
@@ -913,10 +1054,11 @@ def update_driver_status(request, driver_id):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@transaction.atomic
 def update_rejected_documents(request):
     """Update specific documents for rejected driver"""
     try:
-        driver = Driver.objects.get(email=request.user.email)
+        driver = get_request_driver(request, for_update=True)
         
         if driver.status != 'rejected':
             return Response({'error': 'Driver is not in rejected status'}, status=400)
@@ -964,7 +1106,11 @@ def update_rejected_documents(request):
             driver.tanggal_kedaluarsa_sertifikat = datetime.strptime(data['tanggal_kedaluarsa_sertifikat'], '%Y-%m-%d').date()
         
         # Don't change status - keep as rejected until all documents are fixed
-        driver.save()
+        changed = [field for field in Driver.PHOTO_FIELDS + [
+            'nik', 'nama', 'ttl', 'no_sim', 'jenis_sim', 'tanggal_kedaluarsa_sim', 'no_bpjs',
+            'tanggal_kedaluarsa_bpjs', 'no_sertifikat', 'tanggal_kedaluarsa_sertifikat',
+        ] if field in data]
+        driver.save(update_fields=changed)
         
         send_driver_event('driver_document_updated', driver.id_driver)
         
@@ -980,10 +1126,11 @@ def update_rejected_documents(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@transaction.atomic
 def complete_rejected_documents(request):
     """Complete all rejected document fixes and change status to pending"""
     try:
-        driver = Driver.objects.get(email=request.user.email)
+        driver = get_request_driver(request, for_update=True)
         
         if driver.status != 'rejected':
             return Response({'error': 'Driver is not in rejected status'}, status=400)
@@ -991,7 +1138,7 @@ def complete_rejected_documents(request):
         # Change status to pending and clear rejection reason
         driver.status = 'pending'
         driver.alasan_penolakan = None
-        driver.save()
+        driver.save(update_fields=['status', 'alasan_penolakan'])
         
         send_driver_event('driver_documents_completed', driver.id_driver)
         
@@ -1007,61 +1154,30 @@ def complete_rejected_documents(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@transaction.atomic
 def complete_training(request):
     """Mark training as completed and update driver status"""
     try:
         email = request.data.get('email')
         driver = Driver.objects.get(email=email)
         
-        # For guest users, create completed training progress records
+        # For guest users, upsert completed training progress records
         if driver.status == 'training':
-            modules = TrainingModule.objects.filter(is_active=True)
-            
-            for module in modules:
-                progress, created = DriverTrainingProgress.objects.get_or_create(
-                    driver=driver,
-                    module=module,
-                    defaults={
-                        'completed_contents': [],
-                        'quiz_answers': {},
-                        'current_points': 0,
-                        'total_points': 0,
-                        'is_completed': True,
-                        'completed_at': timezone.now()
-                    }
-                )
-                
-                if not progress.is_completed:
-                    # Calculate total points and mark as completed
-                    progress.total_points = progress.calculate_total_points()
-                    progress.current_points = progress.total_points
-                    progress.is_completed = True
-                    progress.completed_at = timezone.now()
-                    progress.save()
-        
-        # Check if all modules are completed
-        total_modules = TrainingModule.objects.filter(is_active=True).count()
-        completed_modules = DriverTrainingProgress.objects.filter(
-            driver=driver,
-            is_completed=True
-        ).count()
+            complete_training_for([driver.id_driver])
         
-        if completed_modules >= total_modules:
-            driver.status = 'pending'
-            driver.save()
-            
-            send_driver_event('training_completed', driver.id_driver)
-            
+        # Training drivers move to pending, drivers that were moved already keep their status
+        if finish_training(driver) or has_completed_training(driver.id_driver):
             return Response({
                 'message': 'Training completed successfully',
-                'status': 'pending'
+                'status': driver.status
             })
-        else:
-            return Response({
-                'error': 'Not all training modules completed',
-                'completed': completed_modules,
-                'total': total_modules
-            }, status=400)
+        
+        total_modules = TrainingModule.objects.filter(is_active=True).count()
+        return Response({
+            'error': 'Not all training modules completed',
+            'completed': total_modules - incomplete_modules(driver.id_driver).count(),
+            'total': total_modules
+        }, status=400)
             
     except Driver.DoesNotExist:
         return Response({'error': 'Driver not found'}, status=404)
@@ -1073,31 +1189,16 @@ def complete_training(request):
 def cleanup_orphaned_users(request):
     """Clean up user accounts that don't have corresponding driver records"""
     try:
-        # Get all users except admin
-        all_users = User.objects.exclude(is_staff=True)
-        
-        # Get all driver emails
-        driver_emails = set(Driver.objects.values_list('email', flat=True))
-        
-        orphaned_users = []
-        for user in all_users:
-            if user.email not in driver_emails:
-                orphaned_users.append(user)
-        
-        if orphaned_users:
-            deleted_count = 0
-            deleted_emails = []
-            for user in orphaned_users:
-                deleted_emails.append(user.email)
-                # Delete auth tokens first
-                Token.objects.filter(user=user).delete()
-                # Then delete the user
-                user.delete()
-                deleted_count += 1
-            
-            print(f"Cleaned up {deleted_count} orphaned users: {deleted_emails}")
+        deleted_count, deleted_emails = delete_orphaned_users()
+        
+        if deleted_count:
+            print(f"Cleaned up {deleted_count} orphaned users, first: {deleted_emails}")
+            more = deleted_count - len(deleted_emails)
+            message = f'Cleaned up {deleted_count} orphaned user accounts: {", ".join(deleted_emails)}'
+            if more > 0:
+                message += f' and {more} more'
             return Response({
-                'message': f'Cleaned up {deleted_count} orphaned user accounts: {", ".join(deleted_emails)}',
+                'message': message,
                 'deleted_count': deleted_count,
                 'deleted_emails': deleted_emails
             })
@@ -1116,15 +1217,26 @@ def cleanup_orphaned_users(request):
 def get_driver_statistics(request):
     """Get driver statistics for profile display"""
     try:
-        driver = Driver.objects.get(email=request.user.email)
+        driver_id = get_request_driver_id(request)
+        
+        cached = get_driver_stats(driver_id)
+        if cached is not None:
+            # The photo is not cached, it is read from the blob store each time
+            foto_profil = Driver.objects.filter(id_driver=driver_id).values_list('foto_profil', flat=True).first()
+            return Response({**cached, 'foto_profil': get_blob_store().get_base64(foto_profil)})
         
-        # Get statistics
-        avg_rating = driver.get_average_rating()
-        total_trips = driver.get_total_trips()
-        experience_years = driver.get_experience_years()
+        # Driver, rating summary and trip count in one query
+        driver = Driver.objects.select_related('rating_summary').annotate(
+            total_trips=Count('deliveryorder', filter=Q(deliveryorder__status__in=COMPLETED_TRIP_STATUSES))
+        ).get(id_driver=driver_id)
+        
+        try:
+            summary = driver.rating_summary
+        except DriverRatingSummary.DoesNotExist:
+            summary = DriverRatingSummary(driver=driver)
         
         # Get recent ratings
-        recent_ratings = RatingDriver.objects.filter(id_driver=driver).order_by('-timestamp')[:5]
+        recent_ratings = RatingDriver.objects.filter(id_driver=driver_id).select_related('id_pelanggan').order_by('-timestamp')[:5]
         ratings_data = []
         for rating in recent_ratings:
             ratings_data.append({
@@ -1134,102 +1246,126 @@ def get_driver_statistics(request):
                 'pelanggan': rating.id_pelanggan.nama
             })
         
-        return Response({
+        data = {
             'id_driver': driver.id_driver,
             'nama': driver.nama,
             'kota': driver.kota,
-            'foto_profil': driver.foto_profil,
-            'average_rating': avg_rating,
-            'total_trips': total_trips,
-            'experience_years': experience_years,
+            'average_rating': summary.get_average(),
+            'total_ratings': summary.rating_count,
+            'rating_histogram': summary.get_histogram(),
+            'total_trips': driver.total_trips,
+            'experience_years': driver.get_experience_years(),
             'recent_ratings': ratings_data,
             'wkt_daftar': driver.wkt_daftar
-        })
+        }
+        set_driver_stats(driver_id, data)
+        return Response({**data, 'foto_profil': driver.get_photo('foto_profil')})
         
     except Driver.DoesNotExist:
         return Response({'error': 'Driver not found'}, status=404)
     except Exception as e:
         return Response({'error': str(e)}, status=400)
 
+def serialize_trip(trip):
+    sales_order = trip.id_sales_order
+    return {
+        'id_delivery_order': trip.id_delivery_order,
+        'tanggal_kirim': trip.tanggal_kirim,
+        'status': trip.status,
+        'alamat_pengiriman': sales_order.alamat_pengiriman if sales_order else 'Alamat tidak tersedia',
+        'total_harga': float(sales_order.total_harga_order) if sales_order else 0,
+        'armada': {
+            'nomor_polisi': trip.id_armada.nomor_polisi,
+            'jenis_armada': trip.id_armada.jenis_armada
+        } if trip.id_armada else None,
+        'pelanggan': sales_order.id_pelanggan.nama if sales_order and sales_order.id_pelanggan else 'Pelanggan tidak diketahui'
+    }
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_driver_trips(request):
-    """Get trip history for authenticated driver"""
+    """Get trip history for authenticated driver.
+    
+    ?page_size=&cursor= returns {next, results} pages ordered by tanggal_kirim,
+    ?export=ndjson streams the full history as one JSON object per line.
+    """
     try:
-        driver = Driver.objects.get(email=request.user.email)
+        driver_id = get_request_driver_id(request)
         
         # Get completed delivery orders for this driver
         trips = DeliveryOrder.objects.filter(
-            id_driver=driver,
-            status__in=['completed', 'delivered', 'selesai']
-        ).select_related('id_sales_order', 'id_armada').order_by('-tanggal_kirim')
-        
-        trips_data = []
-        for trip in trips:
-            # Get sales order details
-            sales_order = trip.id_sales_order
+            id_driver=driver_id,
+            status__in=COMPLETED_TRIP_STATUSES
+        ).select_related('id_sales_order__id_pelanggan', 'id_armada').only(
+            'id_delivery_order', 'tanggal_kirim', 'status', 'id_sales_order', 'id_armada',
+            'id_sales_order__alamat_pengiriman', 'id_sales_order__id_pelanggan', 'id_sales_order__total_harga_order',
+            'id_sales_order__id_pelanggan__nama',
+            'id_armada__nomor_polisi', 'id_armada__jenis_armada',
+        ).order_by('-tanggal_kirim', '-id_delivery_order')
+        
+        if request.query_params.get('export') == 'ndjson':
+            def stream():
+                for trip in trips.iterator(chunk_size=500):
+                    yield json.dumps(serialize_trip(trip), cls=DjangoJSONEncoder) + '\n'
             
-            trips_data.append({
-                'id_delivery_order': trip.id_delivery_order,
-                'tanggal_kirim': trip.tanggal_kirim,
-                'status': trip.status,
-                'alamat_pengiriman': sales_order.alamat_pengiriman if sales_order else 'Alamat tidak tersedia',
-                'total_harga': float(sales_order.total_harga_order) if sales_order else 0,
-                'armada': {
-                    'nomor_polisi': trip.id_armada.nomor_polisi,
-                    'jenis_armada': trip.id_armada.jenis_armada
-                } if trip.id_armada else None,
-                'pelanggan': sales_order.id_pelanggan.nama if sales_order and sales_order.id_pelanggan else 'Pelanggan tidak diketahui'
-            })
+            response = StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+            response['Content-Disposition'] = f'attachment; filename="trips_{driver_id}.ndjson"'
+            return response
         
-        return Response(trips_data)
+        paginator = TripKeysetPagination()
+        page = paginator.paginate_queryset(trips, request)
+        if page is not None:
+            return paginator.get_paginated_response([serialize_trip(trip) for trip in page])
+        
+        return Response([serialize_trip(trip) for trip in trips])
         
     except Driver.DoesNotExist:
         return Response({'error': 'Driver not found'}, status=404)
+    except NotFound:
+        raise
     except Exception as e:
         return Response({'error': str(e)}, status=400)
 
 @api_view(['GET'])
 @permission_classes([IsAdminOnly])
 def check_database_sync(request):
-    """Check database synchronization status"""
+    """Check database synchronization status.
+    
+    Orphans are found with NOT EXISTS in the database, only counts and one
+    page of each list (?page=, ?page_size=) are returned.
+    """
     try:
-        # Get all users and drivers
-        all_users = User.objects.exclude(is_staff=True)
-        all_drivers = Driver.objects.all()
-        
-        # Get driver emails
-        driver_emails = set(Driver.objects.values_list('email', flat=True))
-        
-        # Find orphaned users
-        orphaned_users = []
-        for user in all_users:
-            if user.email not in driver_emails:
-                orphaned_users.append({
-                    'id': user.id,
-                    'username': user.username,
-                    'email': user.email
-                })
-        
-        # Find drivers without users
-        user_emails = set(User.objects.values_list('email', flat=True))
-        drivers_without_users = []
-        for driver in all_drivers:
-            if driver.email not in user_emails:
-                drivers_without_users.append({
-                    'id': driver.id_driver,
-                    'email': driver.email,
-                    'nama': driver.nama
-                })
+        try:
+            page_number = max(1, int(request.query_params.get('page', 1)))
+            page_size = int(request.query_params.get('page_size', SYNC_SAMPLE_PAGE_SIZE))
+        except ValueError:
+            return Response({'error': 'page and page_size must be numbers'}, status=400)
+        page_size = max(1, min(page_size, SYNC_SAMPLE_MAX_PAGE_SIZE))
+        offset = (page_number - 1) * page_size
+        
+        orphaned = orphaned_users()
+        without_users = drivers_without_users()
+        orphaned_users_count = orphaned.count()
+        drivers_without_users_count = without_users.count()
+        
+        orphaned_page = list(
+            orphaned.order_by('id').values('id', 'username', 'email')[offset:offset + page_size]
+        )
+        drivers_page = [
+            {'id': row['id_driver'], 'email': row['email'], 'nama': row['nama']}
+            for row in without_users.order_by('id_driver').values('id_driver', 'email', 'nama')[offset:offset + page_size]
+        ]
         
         return Response({
-            'total_users': all_users.count(),
-            'total_drivers': all_drivers.count(),
-            'orphaned_users_count': len(orphaned_users),
-            'orphaned_users': orphaned_users,
-            'drivers_without_users_count': len(drivers_without_users),
-            'drivers_without_users': drivers_without_users,
-            'is_synchronized': len(orphaned_users) == 0 and len(drivers_without_users) == 0
+            'total_users': User.objects.filter(is_staff=False).count(),
+            'total_drivers': Driver.objects.count(),
+            'orphaned_users_count': orphaned_users_count,
+            'orphaned_users': orphaned_page,
+            'drivers_without_users_count': drivers_without_users_count,
+            'drivers_without_users': drivers_page,
+            'page': page_number,
+            'page_size': page_size,
+            'is_synchronized': orphaned_users_count == 0 and drivers_without_users_count == 0
         })
         
     except Exception as e:
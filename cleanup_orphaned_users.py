@@ -8,34 +8,28 @@ sys.path.append('/app')
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'driver_management_backend.settings')
 django.setup()
 
-from django.contrib.auth.models import User
-from drivers.models import Driver
+from drivers.sync import orphaned_users, delete_orphaned_users
+
+SAMPLE_SIZE = 20
 
 def cleanup_orphaned_users():
     """Remove User accounts that don't have corresponding Driver records"""
     
-    # Get all users except admin
-    all_users = User.objects.exclude(is_staff=True)
-    
-    # Get all driver emails
-    driver_emails = set(Driver.objects.values_list('email', flat=True))
-    
-    orphaned_users = []
-    for user in all_users:
-        if user.email not in driver_emails:
-            orphaned_users.append(user)
+    # Detection runs in the database, only a sample is loaded
+    orphaned = orphaned_users()
+    count = orphaned.count()
     
-    print(f"Found {len(orphaned_users)} orphaned user accounts:")
-    for user in orphaned_users:
-        print(f"  - {user.username} ({user.email})")
+    print(f"Found {count} orphaned user accounts:")
+    for username, email in orphaned.order_by('id').values_list('username', 'email')[:SAMPLE_SIZE]:
+        print(f"  - {username} ({email})")
+    if count > SAMPLE_SIZE:
+        print(f"  ... and {count - SAMPLE_SIZE} more")
     
-    if orphaned_users:
+    if count:
         confirm = input("Delete these orphaned users? (y/N): ")
         if confirm.lower() == 'y':
-            for user in orphaned_users:
-                print(f"Deleting user: {user.username}")
-                user.delete()
-            print(f"Deleted {len(orphaned_users)} orphaned users")
+            deleted_count, _ = delete_orphaned_users()
+            print(f"Deleted {deleted_count} orphaned users")
         else:
             print("Cleanup cancelled")
     else:
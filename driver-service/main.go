@@ -19,11 +19,13 @@ type DriverStatus struct {
 }
 
 type OrderRequest struct {
-	OrderID string `json:"order_id"`
-	Pickup  string `json:"pickup"`
-	Tujuan  string `json:"tujuan"`
-	Ongkos  int    `json:"ongkos"`
-	Kota    string `json:"kota"`
+	OrderID   string   `json:"order_id"`
+	Pickup    string   `json:"pickup"`
+	Tujuan    string   `json:"tujuan"`
+	Ongkos    int      `json:"ongkos"`
+	Kota      string   `json:"kota"`
+	DriverIDs []string `json:"driver_ids,omitempty"`
+	Wave      int      `json:"wave,omitempty"`
 }
 
 type OrderResponse struct {
@@ -144,14 +146,12 @@ func handleOrderRequest(w http.ResponseWriter, r *http.Request) {
 
 	log.Printf("Received order request: %+v", order)
 
-	// Send directly to online drivers in the same city
+	// Send directly to the selected drivers, or to every online driver in the city
 	sentCount := 0
-	for driverID, driverStatus := range onlineDrivers {
-		if driverStatus.Kota == order.Kota {
-			log.Printf("Sending order to driver %s in city %s", driverID, order.Kota)
-			sendOrderToDriver(driverID, order)
-			sentCount++
-		}
+	for _, driverID := range orderTargets(order) {
+		log.Printf("Sending order to driver %s in city %s", driverID, order.Kota)
+		sendOrderToDriver(driverID, order)
+		sentCount++
 	}
 
 	log.Printf("Order sent to %d drivers", sentCount)
@@ -161,6 +161,21 @@ func handleOrderRequest(w http.ResponseWriter, r *http.Request) {
 	w.WriteHeader(http.StatusOK)
 }
 
+// orderTargets returns the drivers picked by the backend dispatcher for this
+// wave, or every online driver in the city for orders without a driver list.
+func orderTargets(order OrderRequest) []string {
+	if len(order.DriverIDs) > 0 {
+		return order.DriverIDs
+	}
+	var targets []string
+	for driverID, driverStatus := range onlineDrivers {
+		if driverStatus.Kota == order.Kota {
+			targets = append(targets, driverID)
+		}
+	}
+	return targets
+}
+
 func publishDriverStatus(status DriverStatus) {
 	writer := kafka.NewWriter(kafka.WriterConfig{
 		Brokers: []string{kafkaBroker},
@@ -239,11 +254,8 @@ func consumeOrderRequests(broker string) {
 			continue
 		}
 
-		// Find online drivers in the same city
-		for driverID, driverStatus := range onlineDrivers {
-			if driverStatus.Kota == order.Kota {
-				sendOrderToDriver(driverID, order)
-			}
+		for _, driverID := range orderTargets(order) {
+			sendOrderToDriver(driverID, order)
 		}
 	}
 }
@@ -1,3 +1,4 @@
+import 'dart:async';
 import 'dart:convert';
 import 'package:web_socket_channel/web_socket_channel.dart';
 import 'package:http/http.dart' as http;
@@ -8,6 +9,13 @@ class DriverService {
   
   WebSocketChannel? _channel;
   String? _driverId;
+  Timer? _heartbeatTimer;
+  
+  // Login token (Authorization: Token ...), heartbeats are rejected without it
+  String? authToken;
+  
+  // Optional, returns {'lat': ..., 'lng': ...} so orders can go to the nearest drivers
+  Future<Map<String, double>?> Function()? getLocation;
   
   // Connect to WebSocket for real-time notifications
   void connectWebSocket(String driverId) {
@@ -48,6 +56,7 @@ class DriverService {
       
       if (response.statusCode == 200) {
         connectWebSocket(driverId);
+        _startHeartbeat(kota);
         return true;
       }
       return false;
@@ -57,6 +66,33 @@ class DriverService {
     }
   }
   
+  // Keep the driver marked online, the backend forgets drivers after 20 seconds.
+  // The driver is taken from the token, not from the request body.
+  void _startHeartbeat(String kota) {
+    _heartbeatTimer?.cancel();
+    _sendHeartbeat(kota);
+    _heartbeatTimer = Timer.periodic(Duration(seconds: 10), (_) => _sendHeartbeat(kota));
+  }
+  
+  Future<void> _sendHeartbeat(String kota) async {
+    try {
+      final location = getLocation != null ? await getLocation!() : null;
+      await http.post(
+        Uri.parse('$baseUrl/drivers/heartbeat/'),
+        headers: {
+          'Content-Type': 'application/json',
+          if (authToken != null) 'Authorization': 'Token $authToken',
+        },
+        body: jsonEncode({
+          'kota': kota,
+          ...?location,
+        }),
+      );
+    } catch (e) {
+      print('Heartbeat error: $e');
+    }
+  }
+  
   // Set driver offline
   Future<bool> setDriverOffline(String driverId) async {
     try {
@@ -69,6 +105,7 @@ class DriverService {
       );
       
       if (response.statusCode == 200) {
+        _heartbeatTimer?.cancel();
         disconnect();
         return true;
       }
@@ -278,61 +278,59 @@ class ApiService {
   }
 
   // Training API methods
-  Future<List<dynamic>> getTrainingModules() async {
+  // The whole catalog comes in one request and is kept in memory, the
+  // backend answers 304 while it did not change.
+  static Map<String, dynamic>? _trainingCatalog;
+  static String? _trainingCatalogEtag;
+
+  Future<Map<String, dynamic>> getTrainingCatalog() async {
     try {
       final url = await _baseUrl;
+      final headers = {'Content-Type': 'application/json'};
+      if (_trainingCatalog != null && _trainingCatalogEtag != null) {
+        headers['If-None-Match'] = _trainingCatalogEtag!;
+      }
       final response = await http.get(
-        Uri.parse('$url/training-modules/'),
-        headers: {'Content-Type': 'application/json'},
+        Uri.parse('$url/training/catalog/'),
+        headers: headers,
       );
 
-      if (response.statusCode == 200) {
-        return json.decode(response.body);
+      if (response.statusCode == 304 && _trainingCatalog != null) {
+        return _trainingCatalog!;
+      } else if (response.statusCode == 200) {
+        _trainingCatalog = json.decode(utf8.decode(response.bodyBytes));
+        _trainingCatalogEtag = response.headers['etag'];
+        return _trainingCatalog!;
       } else {
-        throw Exception('Failed to load training modules');
+        throw Exception('Failed to load training catalog');
       }
     } catch (e) {
-      print('API: Error getting training modules: $e');
+      print('API: Error getting training catalog: $e');
       throw e;
     }
   }
 
-  Future<List<dynamic>> getTrainingContents(int moduleId) async {
-    try {
-      final url = await _baseUrl;
-      final response = await http.get(
-        Uri.parse('$url/training-contents/?module_id=$moduleId'),
-        headers: {'Content-Type': 'application/json'},
-      );
-
-      if (response.statusCode == 200) {
-        return json.decode(response.body);
-      } else {
-        throw Exception('Failed to load training contents');
-      }
-    } catch (e) {
-      print('API: Error getting training contents: $e');
-      throw e;
+  Future<Map<String, dynamic>?> _catalogModule(int moduleId) async {
+    final catalog = await getTrainingCatalog();
+    for (final module in catalog['modules']) {
+      if (module['id'] == moduleId) return module;
     }
+    return null;
   }
 
-  Future<List<dynamic>> getTrainingQuizzes(int moduleId) async {
-    try {
-      final url = await _baseUrl;
-      final response = await http.get(
-        Uri.parse('$url/training-quizzes/?module_id=$moduleId'),
-        headers: {'Content-Type': 'application/json'},
-      );
+  Future<List<dynamic>> getTrainingModules() async {
+    final catalog = await getTrainingCatalog();
+    return catalog['modules'];
+  }
 
-      if (response.statusCode == 200) {
-        return json.decode(response.body);
-      } else {
-        throw Exception('Failed to load training quizzes');
-      }
-    } catch (e) {
-      print('API: Error getting training quizzes: $e');
-      throw e;
-    }
+  Future<List<dynamic>> getTrainingContents(int moduleId) async {
+    final module = await _catalogModule(moduleId);
+    return module?['contents'] ?? [];
+  }
+
+  Future<List<dynamic>> getTrainingQuizzes(int moduleId) async {
+    final module = await _catalogModule(moduleId);
+    return module?['quizzes'] ?? [];
   }
 
   Future<Map<String, dynamic>> startTrainingModule(int moduleId, {bool isGuest = false}) async {
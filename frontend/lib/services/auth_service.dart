@@ -99,6 +99,20 @@ class AuthService extends ChangeNotifier {
   }
 
   Future<void> logout() async {
+    // Revoke the token on the server, local logout still happens if this fails
+    final token = _currentUser?.token;
+    if (token != null) {
+      try {
+        final apiUrl = await baseUrl;
+        await http.post(
+          Uri.parse('$apiUrl/drivers/logout/'),
+          headers: {'Authorization': 'Token $token'},
+        ).timeout(Duration(seconds: 5));
+      } catch (e) {
+        print('Logout request error: $e');
+      }
+    }
+    
     _currentUser = null;
     final prefs = await SharedPreferences.getInstance();
     await prefs.remove('token');